@@ -8,6 +8,7 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.contrib.auth.models import User
+from project_ecommerce.streaming import pide_streaming, respuesta_exportacion, respuesta_streaming
 
 
 class ClienteViewSet(viewsets.ModelViewSet):
@@ -25,8 +26,10 @@ class ClienteViewSet(viewsets.ModelViewSet):
         return ClienteSerializer
     
     def list(self, request, *args, **kwargs):
-        """Listar todos los clientes con información de usuario"""
+        """Listar todos los clientes con información de usuario (?stream=true para listados grandes)"""
         queryset = self.get_queryset().order_by('-fecha_creacion')
+        if pide_streaming(request):
+            return respuesta_streaming(queryset, self.get_serializer(), 'clientes')
         serializer = self.get_serializer(queryset, many=True)
         
         return Response({
@@ -165,6 +168,22 @@ class ClienteViewSet(viewsets.ModelViewSet):
             'count': clientes_inactivos.count(),
             'clientes': serializer.data
         })
+    
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def exportar(self, request):
+        """Exportar clientes con los datos de su usuario (?formato=csv|jsonl, ?gzip=true)"""
+        return respuesta_exportacion(request, self.queryset.order_by('id'), {
+            'id': 'id',
+            'usuario_id': 'usuario_id',
+            'username': 'usuario__username',
+            'email': 'usuario__email',
+            'first_name': 'usuario__first_name',
+            'last_name': 'usuario__last_name',
+            'activo': 'usuario__is_active',
+            'telefono': 'telefono',
+            'fecha_nacimiento': 'fecha_nacimiento',
+            'fecha_creacion': 'fecha_creacion',
+        }, 'clientes')
 
 
 class Metodo_PagoViewSet(viewsets.ModelViewSet):
@@ -1,3 +1,24 @@
+from datetime import date
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from rest_framework.authtoken.models import Token
+
+from .models import Cliente
+
+
+class StreamingClientesTest(TestCase):
+    """El listado en streaming (?stream=true) es el mismo JSON que el listado normal"""
+
+    def setUp(self):
+        for i in range(3):
+            usuario = User.objects.create_user(username=f'cliente{i}', password='clave-segura-123', first_name='José')
+            Cliente.objects.create(telefono=f'12{i}', fecha_nacimiento=date(1990, 1, i + 1), usuario=usuario)
+        self.auth = {'HTTP_AUTHORIZATION': f'Token {Token.objects.create(user=usuario).key}'}
 
-# Create your tests here.
+    def test_stream_igual_al_listado(self):
+        url = '/api/clientes/clientes/'
+        normal = self.client.get(url, **self.auth)
+        streaming = self.client.get(url + '?stream=true', **self.auth)
+        self.assertTrue(streaming.streaming)
+        self.assertEqual(b''.join(streaming.streaming_content), normal.content)
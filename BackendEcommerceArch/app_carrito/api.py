@@ -3,14 +3,17 @@ from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
+from django.db.models import prefetch_related_objects
 from .models import Carrito, ItemCarrito
 from .serializers import (
     CarritoSerializer, 
     ItemCarritoSerializer, 
-    AgregarItemCarritoSerializer
+    AgregarItemCarritoSerializer,
+    serializar_carrito
 )
 from app_productos.models import ProductoCategoria
 from app_Cliente.models import Cliente
+from project_ecommerce.serializers import Seleccion
 
 class CarritoViewSet(viewsets.ModelViewSet):
     """ViewSet para gestionar carritos"""
@@ -20,7 +23,7 @@ class CarritoViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Solo devuelve el carrito del cliente autenticado"""
         try:
-            cliente = Cliente.objects.get(user=self.request.user)
+            cliente = Cliente.objects.get(usuario=self.request.user)
             return Carrito.objects.filter(cliente=cliente)
         except Cliente.DoesNotExist:
             return Carrito.objects.none()
@@ -28,7 +31,7 @@ class CarritoViewSet(viewsets.ModelViewSet):
     def get_or_create_carrito(self):
         """Obtiene o crea un carrito para el cliente autenticado"""
         try:
-            cliente = Cliente.objects.get(user=self.request.user)
+            cliente = Cliente.objects.get(usuario=self.request.user)
             carrito, created = Carrito.objects.get_or_create(cliente=cliente)
             return carrito
         except Cliente.DoesNotExist:
@@ -44,10 +47,15 @@ class CarritoViewSet(viewsets.ModelViewSet):
                 'message': 'Cliente no encontrado'
             }, status=status.HTTP_404_NOT_FOUND)
         
-        serializer = self.get_serializer(carrito)
+        # Items, variantes e imágenes en consultas fijas
+        prefetch_related_objects([carrito], CarritoSerializer.prefetch_items())
+        if Seleccion.desde_request(request).completa:
+            data = serializar_carrito(carrito)
+        else:
+            data = self.get_serializer(carrito).data
         return Response({
             'success': True,
-            'carrito': serializer.data
+            'carrito': data
         })
     
     @action(detail=False, methods=['post'])
@@ -1,7 +1,10 @@
 from rest_framework import serializers
+from django.db.models import Prefetch
 from .models import Carrito, ItemCarrito
 from app_productos.models import Producto, ProductoCategoria, Imagen_Producto
 from app_Cliente.models import Cliente
+from project_ecommerce.media import url_archivo
+from project_ecommerce.serializers import CamposDinamicosMixin, formato_decimal, formato_fecha_hora
 
 class ProductoBasicoSerializer(serializers.ModelSerializer):
     """Serializer básico para mostrar info del producto en el carrito"""
@@ -38,7 +41,7 @@ class ProductoCategoriaBasicoSerializer(serializers.ModelSerializer):
         imagenes = Imagen_Producto.objects.filter(Producto_categoria=obj)
         result = []
         for img in imagenes:
-            url = img.imagen.url if img.imagen else None
+            url = url_archivo(img.imagen.name)
             if url:
                 result.append({
                     'id': img.id,
@@ -56,18 +59,18 @@ class ProductoCategoriaBasicoSerializer(serializers.ModelSerializer):
                 es_principal=True
             ).first()
             if imagen and imagen.imagen:
-                return imagen.imagen.url
+                return url_archivo(imagen.imagen.name)
             else:
                 # Si no hay imagen principal, tomar la primera disponible
                 imagen = Imagen_Producto.objects.filter(
                     Producto_categoria=obj
                 ).first()
-                return imagen.imagen.url if imagen and imagen.imagen else None
+                return url_archivo(imagen.imagen.name) if imagen else None
         except:
             return None
 
-class ItemCarritoSerializer(serializers.ModelSerializer):
-    """Serializer completo para items del carrito con toda la info del producto"""
+class ItemCarritoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    """Serializer completo para items del carrito con toda la info del producto (admite ?fields= y ?expand=)"""
     variante_info = ProductoCategoriaBasicoSerializer(source='producto_variante', read_only=True)
     subtotal = serializers.SerializerMethodField()
     
@@ -75,6 +78,7 @@ class ItemCarritoSerializer(serializers.ModelSerializer):
         model = ItemCarrito
         fields = ['id', 'carrito', 'producto_variante', 'cantidad', 'variante_info', 'subtotal']
         read_only_fields = ['carrito']
+        expandibles = ['variante_info']
     
     def get_subtotal(self, obj):
         """Calcula el subtotal del item"""
@@ -92,8 +96,8 @@ class ItemCarritoSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Producto sin stock disponible")
         return value
 
-class CarritoSerializer(serializers.ModelSerializer):
-    """Serializer completo del carrito con todos sus items"""
+class CarritoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    """Serializer completo del carrito con todos sus items (?fields=items.cantidad,total_precio...)"""
     items = ItemCarritoSerializer(many=True, read_only=True)
     total_items = serializers.SerializerMethodField()
     total_precio = serializers.SerializerMethodField()
@@ -103,6 +107,16 @@ class CarritoSerializer(serializers.ModelSerializer):
         fields = ['id', 'cliente', 'fecha_creacion', 'fecha_modificacion', 'items', 'total_items', 'total_precio']
         read_only_fields = ['cliente', 'fecha_creacion', 'fecha_modificacion']
     
+    @staticmethod
+    def prefetch_items():
+        """Items con variante, producto, categoría e imágenes en consultas fijas"""
+        return Prefetch(
+            'items',
+            queryset=ItemCarrito.objects.select_related(
+                'producto_variante__producto', 'producto_variante__categoria'
+            ).prefetch_related('producto_variante__imagen_producto_set')
+        )
+    
     def get_total_items(self, obj):
         """Cuenta total de items en el carrito (suma de cantidades)"""
         total = sum(item.cantidad for item in obj.items.all())
@@ -115,6 +129,67 @@ class CarritoSerializer(serializers.ModelSerializer):
             total += float(item.cantidad * item.producto_variante.precio_unitario)
         return float(total)
 
+def _variante_rapida(variante):
+    """Mismo dict que ProductoCategoriaBasicoSerializer, con las imágenes ya prefetcheadas"""
+    imagenes = sorted(variante.imagen_producto_set.all(), key=lambda imagen: imagen.id)
+    principal = next((imagen for imagen in imagenes if imagen.es_principal), None)
+    if not (principal and principal.imagen):
+        principal = imagenes[0] if imagenes else None
+    producto = variante.producto
+    return {
+        'id': variante.id,
+        'producto': variante.producto_id,
+        'categoria': variante.categoria_id,
+        'color': variante.color,
+        'talla': variante.talla,
+        'capacidad': variante.capacidad,
+        'precio_unitario': formato_decimal(variante.precio_unitario),
+        'stock': variante.stock,
+        'producto_info': {
+            'id': producto.id,
+            'nombre': producto.nombre,
+            'descripcion': producto.descripcion,
+            'peso': formato_decimal(producto.peso),
+        },
+        'categoria_info': {'id': variante.categoria.id, 'nombre': variante.categoria.nombre},
+        'imagenes': [
+            {'id': imagen.id, 'url': url_archivo(imagen.imagen.name), 'texto': imagen.texto, 'es_principal': imagen.es_principal}
+            for imagen in imagenes if imagen.imagen
+        ],
+        'imagen_principal': url_archivo(principal.imagen.name) if principal else None,
+    }
+
+def serializar_carrito(carrito):
+    """
+    Camino rápido de CarritoSerializer(carrito).data: mismo JSON byte a byte.
+    El carrito debe traer los items con `CarritoSerializer.prefetch_items()`.
+    """
+    items = []
+    total_items = 0
+    total_precio = 0
+    for item in carrito.items.all():
+        variante = item.producto_variante
+        subtotal = float(item.cantidad * variante.precio_unitario)
+        items.append({
+            'id': item.id,
+            'carrito': item.carrito_id,
+            'producto_variante': item.producto_variante_id,
+            'cantidad': item.cantidad,
+            'variante_info': _variante_rapida(variante),
+            'subtotal': subtotal,
+        })
+        total_items += item.cantidad
+        total_precio += subtotal
+    return {
+        'id': carrito.id,
+        'cliente': carrito.cliente_id,
+        'fecha_creacion': formato_fecha_hora(carrito.fecha_creacion),
+        'fecha_modificacion': formato_fecha_hora(carrito.fecha_modificacion),
+        'items': items,
+        'total_items': total_items,
+        'total_precio': float(total_precio),
+    }
+
 class AgregarItemCarritoSerializer(serializers.Serializer):
     """Serializer para agregar items al carrito"""
     producto_variante_id = serializers.IntegerField()
@@ -1,3 +1,46 @@
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.db.models import prefetch_related_objects
 from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+
+from app_Cliente.models import Cliente
+from app_productos.models import Producto, Categoria, ProductoCategoria, Imagen_Producto
+from .models import Carrito, ItemCarrito
+from .serializers import CarritoSerializer, serializar_carrito
+
+
+class CarritoRapidoTest(TestCase):
+    """serializar_carrito debe producir exactamente el mismo JSON que CarritoSerializer"""
+
+    def setUp(self):
+        usuario = User.objects.create_user(username='cliente', password='clave-segura-123')
+        cliente = Cliente.objects.create(telefono='123', fecha_nacimiento=date(1990, 1, 1), usuario=usuario)
+        categoria = Categoria.objects.create(nombre='Ropa', descripcion='')
+        producto = Producto.objects.create(nombre='Camiseta', descripcion='', peso=1)
+        self.carrito = Carrito.objects.create(cliente=cliente)
+        for i, precio in enumerate(['19.99', '7.50']):
+            variante = ProductoCategoria.objects.create(
+                producto=producto, categoria=categoria, color=f'Color {i}', talla='M',
+                precio_variante=0, precio_unitario=precio, stock=4
+            )
+            Imagen_Producto.objects.create(imagen=f'productos/{i}.jpg', texto='', Producto_categoria=variante)
+            ItemCarrito.objects.create(carrito=self.carrito, producto_variante=variante, cantidad=i + 2)
+        self.usuario = usuario
+
+    def test_mismo_json(self):
+        prefetch_related_objects([self.carrito], CarritoSerializer.prefetch_items())
+        renderer = JSONRenderer()
+        with self.assertNumQueries(0):
+            rapido = serializar_carrito(self.carrito)
+        self.assertEqual(renderer.render(rapido), renderer.render(CarritoSerializer(self.carrito).data))
 
-# Create your tests here.
+    def test_mi_carrito(self):
+        token = Token.objects.create(user=self.usuario)
+        datos = self.client.get(
+            '/api/carrito/carritos/mi_carrito/', HTTP_AUTHORIZATION=f'Token {token.key}'
+        ).json()
+        self.assertEqual(datos['carrito']['total_items'], 5)
+        self.assertEqual(datos['carrito']['total_precio'], 19.99 * 2 + 7.5 * 3)
@@ -2,8 +2,10 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from .models import Pedido
-from .serializers import PedidoSerializer, PedidoCreateSerializer
+from .serializers import PedidoSerializer, PedidoCreateSerializer, serializar_pedidos
 from app_Cliente.models import Cliente
+from project_ecommerce.serializers import Seleccion
+from project_ecommerce.streaming import pide_streaming, respuesta_exportacion, respuesta_streaming
 
 class PedidoViewSet(viewsets.ModelViewSet):
     """
@@ -22,7 +24,7 @@ class PedidoViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Filtrar pedidos según parámetros opcionales"""
-        queryset = Pedido.objects.select_related('cliente', 'direccion_envio').order_by('-fecha_pedido')
+        queryset = self.cargar_relaciones(Pedido.objects.all()).order_by('-fecha_pedido')
         
         # Filtro por cliente si se proporciona
         cliente_id = self.request.query_params.get('cliente', None)
@@ -36,15 +38,30 @@ class PedidoViewSet(viewsets.ModelViewSet):
         
         return queryset
     
+    def cargar_relaciones(self, queryset):
+        """select_related solo de las relaciones que se van a mostrar (?fields= / ?expand=)"""
+        seleccion = Seleccion.desde_request(self.request)
+        relacionados = [
+            relacion for relacion, campo in (('cliente', 'cliente_info'), ('direccion_envio', 'direccion_info'))
+            if seleccion.incluye(campo, expandible=True)
+        ]
+        return queryset.select_related(*relacionados) if relacionados else queryset
+    
+    def datos_pedidos(self, pedidos):
+        """Serializar con el camino rápido, salvo que se pidan campos concretos (?fields= / ?expand=)"""
+        if Seleccion.desde_request(self.request).completa:
+            return serializar_pedidos(pedidos)
+        return PedidoSerializer(pedidos, many=True, context={'request': self.request}).data
+    
     def list(self, request, *args, **kwargs):
-        """Listar todos los pedidos con información completa"""
+        """Listar todos los pedidos con información completa (?stream=true para listados grandes)"""
         queryset = self.get_queryset()
-        serializer = PedidoSerializer(queryset, many=True)
-        
+        if pide_streaming(request):
+            return respuesta_streaming(queryset, PedidoSerializer(context={'request': request}), 'pedidos')
         return Response({
             'success': True,
             'count': queryset.count(),
-            'pedidos': serializer.data
+            'pedidos': self.datos_pedidos(queryset)
         })
     
     def create(self, request, *args, **kwargs):
@@ -72,7 +89,7 @@ class PedidoViewSet(viewsets.ModelViewSet):
     def retrieve(self, request, *args, **kwargs):
         """Obtener un pedido específico"""
         pedido = self.get_object()
-        serializer = PedidoSerializer(pedido)
+        serializer = PedidoSerializer(pedido, context={'request': request})
         
         return Response({
             'success': True,
@@ -139,17 +156,32 @@ class PedidoViewSet(viewsets.ModelViewSet):
     def por_estado(self, request):
         """Filtrar pedidos por estado específico"""
         estado = request.query_params.get('estado', 'pendiente')
-        pedidos_filtrados = self.queryset.filter(estado__icontains=estado).order_by('-fecha_pedido')
-        
-        serializer = PedidoSerializer(pedidos_filtrados, many=True)
+        pedidos_filtrados = self.cargar_relaciones(self.queryset.filter(estado__icontains=estado)).order_by('-fecha_pedido')
         
         return Response({
             'success': True,
             'estado': estado,
             'count': pedidos_filtrados.count(),
-            'pedidos': serializer.data
+            'pedidos': self.datos_pedidos(pedidos_filtrados)
         })
     
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def exportar(self, request):
+        """Exportar pedidos (?formato=csv|jsonl, ?gzip=true; admite ?cliente y ?estado)"""
+        return respuesta_exportacion(request, self.get_queryset().order_by('id'), {
+            'id': 'id',
+            'cliente_id': 'cliente_id',
+            'cliente_usuario': 'cliente__usuario__username',
+            'fecha_pedido': 'fecha_pedido',
+            'monto_total': 'monto_total',
+            'estado': 'estado',
+            'calle': 'direccion_envio__calle',
+            'ciudad': 'direccion_envio__ciudad',
+            'estado_direccion': 'direccion_envio__estado',
+            'codigo_postal': 'direccion_envio__codigo_postal',
+            'pais': 'direccion_envio__Pais',
+        }, 'pedidos')
+    
     @action(detail=False, methods=['get'])
     def por_cliente(self, request):
         """Obtener pedidos de un cliente específico"""
@@ -163,9 +195,7 @@ class PedidoViewSet(viewsets.ModelViewSet):
         
         try:
             cliente = Cliente.objects.get(id=cliente_id)
-            pedidos_cliente = self.queryset.filter(cliente=cliente).order_by('-fecha_pedido')
-            
-            serializer = PedidoSerializer(pedidos_cliente, many=True)
+            pedidos_cliente = self.cargar_relaciones(self.queryset.filter(cliente=cliente)).order_by('-fecha_pedido')
             
             return Response({
                 'success': True,
@@ -175,7 +205,7 @@ class PedidoViewSet(viewsets.ModelViewSet):
                     'fecha_creacion': cliente.fecha_creacion
                 },
                 'count': pedidos_cliente.count(),
-                'pedidos': serializer.data
+                'pedidos': self.datos_pedidos(pedidos_cliente)
             })
             
         except Cliente.DoesNotExist:
@@ -2,9 +2,10 @@ from rest_framework import serializers
 from .models import Pedido
 from app_Cliente.serializers import ClienteSerializer, Direccion_EnvioSerializer
 from app_Cliente.models import Cliente, Direccion_Envio
+from project_ecommerce.serializers import CamposDinamicosMixin, formato_decimal, formato_fecha
 
-class PedidoSerializer(serializers.ModelSerializer):
-    """Serializer completo para el modelo Pedido usando serializers existentes"""
+class PedidoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    """Serializer completo para el modelo Pedido usando serializers existentes (admite ?fields= y ?expand=)"""
     cliente_info = ClienteSerializer(source='cliente', read_only=True)
     direccion_info = Direccion_EnvioSerializer(source='direccion_envio', read_only=True)
     
@@ -15,6 +16,7 @@ class PedidoSerializer(serializers.ModelSerializer):
             'monto_total', 'estado', 'cliente_info', 'direccion_info'
         ]
         read_only_fields = ['fecha_pedido']  # La fecha se asigna automáticamente
+        expandibles = ['cliente_info', 'direccion_info']
     
     def validate_monto_total(self, value):
         """Validar que el monto sea positivo"""
@@ -44,6 +46,60 @@ class PedidoSerializer(serializers.ModelSerializer):
         
         return data
 
+def _campos_de(serializer):
+    """
+    (clave, atributo, formato) por cada campo de `serializer`, para armar su JSON sin
+    instanciarlo por fila. Las FK se leen por su id (`<campo>_id`), sin cargar la fila.
+    """
+    campos = []
+    for nombre, campo in serializer.fields.items():
+        if isinstance(campo, serializers.PrimaryKeyRelatedField):
+            campos.append((nombre, f'{campo.source}_id', None))
+        else:
+            campos.append((nombre, campo.source, campo.to_representation))
+    return tuple(campos)
+
+
+# Se calculan una vez: siguen a ClienteSerializer / Direccion_EnvioSerializer si cambian sus campos
+CAMPOS_CLIENTE = _campos_de(ClienteSerializer())
+CAMPOS_DIRECCION = _campos_de(Direccion_EnvioSerializer())
+
+
+def _representar(instancia, campos):
+    datos = {}
+    for clave, atributo, formato in campos:
+        valor = getattr(instancia, atributo)
+        datos[clave] = valor if formato is None or valor is None else formato(valor)
+    return datos
+
+
+def serializar_pedidos(pedidos):
+    """
+    Camino rápido de PedidoSerializer(pedidos, many=True).data: mismo JSON byte a byte.
+    Los pedidos deben traer select_related('cliente', 'direccion_envio').
+    """
+    clientes = {}
+    direcciones = {}
+    resultado = []
+    for pedido in pedidos:
+        cliente = pedido.cliente
+        if cliente.id not in clientes:
+            clientes[cliente.id] = _representar(cliente, CAMPOS_CLIENTE)
+        direccion = pedido.direccion_envio
+        if direccion.id not in direcciones:
+            direcciones[direccion.id] = _representar(direccion, CAMPOS_DIRECCION)
+        resultado.append({
+            'id': pedido.id,
+            'cliente': pedido.cliente_id,
+            'direccion_envio': pedido.direccion_envio_id,
+            'fecha_pedido': formato_fecha(pedido.fecha_pedido),
+            'monto_total': formato_decimal(pedido.monto_total),
+            'estado': pedido.estado,
+            'cliente_info': clientes[cliente.id],
+            'direccion_info': direcciones[direccion.id],
+        })
+    return resultado
+
 class PedidoCreateSerializer(serializers.ModelSerializer):
     """Serializer simplificado para crear/actualizar pedidos"""
     
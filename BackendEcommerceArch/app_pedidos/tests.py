@@ -1,3 +1,91 @@
+import csv
+import gzip
+import io
+import json
+from datetime import date
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+
+from app_Cliente.models import Cliente, Direccion_Envio
+from app_Cliente.serializers import ClienteSerializer, Direccion_EnvioSerializer
+from .models import Pedido
+from .serializers import PedidoSerializer, serializar_pedidos
+
+
+class PedidoRapidoTest(TestCase):
+    """serializar_pedidos debe producir exactamente el mismo JSON que PedidoSerializer"""
+
+    def setUp(self):
+        for i, (telefono, montos) in enumerate([('123', ['10.50', '7']), ('456', ['1234.5'])]):
+            usuario = User.objects.create_user(username=f'cliente{i}', password='clave-segura-123')
+            cliente = Cliente.objects.create(telefono=telefono, fecha_nacimiento=date(1990, 1, i + 1), usuario=usuario)
+            for ciudad in ['La Paz', 'Sucre']:
+                direccion = Direccion_Envio.objects.create(
+                    calle='Calle 1', ciudad=ciudad, estado='LP', codigo_postal='0000', Pais='Bolivia', Cliente=cliente
+                )
+                for monto in montos:
+                    Pedido.objects.create(cliente=cliente, direccion_envio=direccion, monto_total=monto, estado='pendiente')
+
+    def test_mismo_json(self):
+        pedidos = Pedido.objects.select_related('cliente', 'direccion_envio').order_by('-id')
+        renderer = JSONRenderer()
+        with self.assertNumQueries(1):
+            rapido = serializar_pedidos(pedidos)
+        self.assertEqual(len(rapido), 6)
+        self.assertEqual(renderer.render(rapido), renderer.render(PedidoSerializer(pedidos, many=True).data))
+
+    def test_claves_de_los_serializers(self):
+        # Las claves anidadas salen de los serializers: un campo nuevo aparece sin tocar serializar_pedidos
+        pedido = serializar_pedidos(Pedido.objects.select_related('cliente', 'direccion_envio')[:1])[0]
+        self.assertEqual(list(pedido['cliente_info']), list(ClienteSerializer().fields))
+        self.assertEqual(list(pedido['direccion_info']), list(Direccion_EnvioSerializer().fields))
+
+
+class ExportarPedidosTest(TestCase):
+    """Exportación de pedidos en streaming (CSV / JSONL, con o sin gzip)"""
+
+    url = '/api/pedidos/pedidos/exportar/'
+
+    def setUp(self):
+        usuario = User.objects.create_user(username='cliente', password='clave-segura-123')
+        cliente = Cliente.objects.create(telefono='123', fecha_nacimiento=date(1990, 1, 1), usuario=usuario)
+        direccion = Direccion_Envio.objects.create(
+            calle='Calle 1', ciudad='La Paz', estado='LP', codigo_postal='0000', Pais='Bolivia', Cliente=cliente
+        )
+        for monto, estado in [('10.50', 'pendiente'), ('99.00', 'enviado'), ('5.00', 'pendiente')]:
+            Pedido.objects.create(cliente=cliente, direccion_envio=direccion, monto_total=monto, estado=estado)
+        admin = User.objects.create_user(username='admin', password='clave-segura-123', is_staff=True)
+        self.auth = {'HTTP_AUTHORIZATION': f'Token {Token.objects.create(user=admin).key}'}
+
+    def descargar(self, parametros=''):
+        respuesta = self.client.get(self.url + parametros, **self.auth)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta, b''.join(respuesta.streaming_content)
+
+    def test_csv(self):
+        respuesta, contenido = self.descargar('?estado=pendiente')
+        self.assertIn('attachment; filename="pedidos-', respuesta['Content-Disposition'])
+        filas = list(csv.DictReader(io.StringIO(contenido.decode())))
+        self.assertEqual([fila['monto_total'] for fila in filas], ['10.50', '5.00'])
+        self.assertEqual((filas[0]['cliente_usuario'], filas[0]['ciudad']), ('cliente', 'La Paz'))
+
+    def test_jsonl_gzip(self):
+        respuesta, contenido = self.descargar('?formato=jsonl&gzip=true')
+        self.assertEqual(respuesta['Content-Type'], 'application/gzip')
+        filas = [json.loads(linea) for linea in gzip.decompress(contenido).decode().splitlines()]
+        self.assertEqual([fila['estado'] for fila in filas], ['pendiente', 'enviado', 'pendiente'])
+        self.assertEqual(filas[1]['monto_total'], '99.00')
+
+    def test_stream_igual_al_listado(self):
+        url = '/api/pedidos/pedidos/'
+        normal = self.client.get(url, **self.auth)
+        streaming = self.client.get(url + '?stream=true', **self.auth)
+        self.assertTrue(streaming.streaming)
+        self.assertEqual(b''.join(streaming.streaming_content), normal.content)
 
-# Create your tests here.
+    def test_permisos_y_formato(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.assertEqual(self.client.get(self.url + '?formato=xml', **self.auth).status_code, 400)
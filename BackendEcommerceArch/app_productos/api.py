@@ -1,18 +1,61 @@
+import logging
+
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q, Avg, F
+from rest_framework.exceptions import ValidationError
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+from django.db import connection, transaction
+from django.db.models import Q, F
+from django.db.models.functions import Floor, Greatest
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, TrigramSimilarity, TrigramWordSimilarity
+)
 from .models import (
     Producto, Categoria, ProductoCategoria, reseña, 
-    Imagen_Producto, item_pedido, item_compras, Inventario
+    Imagen_Producto, item_pedido, item_compras, Inventario, CatalogoProducto,
+    CalificacionVariante, CalificacionProducto, PuntajeProducto, MovimientoStock,
+    MovimientoInventario
 )
 from .serializers import (
     ProductoBasicoSerializer, ProductoCompletoSerializer,
     CategoriaSerializer, ProductoCategoriaSerializer, ProductoCategoriaCreateSerializer,
     ReseñaSerializer, ReseñaCreateSerializer, ImagenProductoSerializer,
-    ItemPedidoSerializer, ItemComprasSerializer, InventarioSerializer
+    ItemPedidoSerializer, ItemComprasSerializer, InventarioSerializer,
+    CatalogoProductoSerializer, ProductoCategoriaMasivoSerializer, MovimientoStockSerializer,
+    MovimientoInventarioSerializer,
+    serializar_variantes
+)
+from .pagination import CatalogoCursorPagination
+from .signals import programar_actualizacion
+from .stock import (
+    StockInsuficiente, ajustar_entradas, ajustar_stock, ajustar_stocks, registrar_altas,
+    registrar_altas_inventario, registrar_movimiento, registrar_movimiento_inventario, stock_en_fecha
+)
+from project_ecommerce.serializers import Seleccion
+from project_ecommerce.streaming import pide_streaming, respuesta_exportacion, respuesta_streaming
+from .cache import (
+    cachear_catalogo, respuesta_condicional,
+    ultima_modificacion_producto, ultima_modificacion_variante
 )
 
+logger = logging.getLogger(__name__)
+
+MAX_VARIANTES_MASIVO = 500
+
+def usuario_de(request):
+    """Usuario autenticado de la petición, o None (para registrar quién movió el stock)"""
+    return request.user if request.user.is_authenticated else None
+
+def datos_variantes(variantes, request):
+    """Serializar variantes con el camino rápido, salvo que se pidan campos concretos (?fields= / ?expand=)"""
+    if Seleccion.desde_request(request).completa:
+        return serializar_variantes(variantes)
+    return ProductoCategoriaSerializer(variantes, many=True, context={'request': request}).data
+
 class ProductoViewSet(viewsets.ModelViewSet):
     """
     ViewSet para productos - PÚBLICO (sin autenticación para ver catálogo)
@@ -20,6 +63,8 @@ class ProductoViewSet(viewsets.ModelViewSet):
     queryset = Producto.objects.filter(activo=True)
     serializer_class = ProductoCompletoSerializer
     permission_classes = [permissions.AllowAny]  # Público para ver catálogo
+    pagination_class = CatalogoCursorPagination
+    cursor_ordering = ('-fecha_creacion', '-producto')  # El listado pagina sobre CatalogoProducto
     
     def get_queryset(self):
         """Filtrar productos con parámetros opcionales"""
@@ -35,38 +80,60 @@ class ProductoViewSet(viewsets.ModelViewSet):
         if categoria:
             queryset = queryset.filter(productocategoria__categoria_id=categoria).distinct()
         
+        # Árbol completo (variantes, categorías e imágenes) en consultas fijas
+        if self.action == 'retrieve':
+            queryset = ProductoCompletoSerializer.preparar_queryset(
+                queryset, Seleccion.desde_request(self.request)
+            )
+        
         return queryset.order_by('-fecha_creacion')
     
-    def list(self, request, *args, **kwargs):
-        """Listar productos del catálogo"""
-        print("🔍 API: Iniciando listado de productos...")
+    def get_catalogo_queryset(self):
+        """Filas del catálogo desnormalizado con los mismos filtros que get_queryset"""
+        queryset = CatalogoProducto.objects.filter(activo=True)
         
-        queryset = self.get_queryset()
-        print(f"📦 API: Productos en queryset: {queryset.count()}")
-        
-        # Debug: Mostrar productos activos
-        total_productos = Producto.objects.count()
-        productos_activos = Producto.objects.filter(activo=True).count()
-        print(f"📊 API: Total productos en DB: {total_productos}")
-        print(f"✅ API: Productos activos en DB: {productos_activos}")
+        nombre = self.request.query_params.get('nombre', None)
+        if nombre:
+            queryset = queryset.filter(nombre__icontains=nombre)
         
-        # Mostrar algunos productos para debug
-        for producto in queryset[:3]:  # Solo primeros 3
-            print(f"   - {producto.nombre} (ID: {producto.id}, Activo: {producto.activo})")
-            variantes = producto.productocategoria_set.count()
-            print(f"     Variantes: {variantes}")
+        categoria = self.request.query_params.get('categoria', None)
+        if categoria:
+            if not categoria.isdigit():
+                return queryset.none()
+            queryset = queryset.filter(categorias__contains=[{'id': int(categoria)}])
         
-        serializer = ProductoCompletoSerializer(queryset, many=True)  # Vista completa con variantes e imágenes
+        return self.diferir_columnas(queryset).order_by('-fecha_creacion')
+    
+    def diferir_columnas(self, queryset):
+        """No leer las columnas grandes (JSON, descripción) que ?fields= / ?expand= dejan fuera"""
+        seleccion = Seleccion.desde_request(self.request)
+        expandibles = CatalogoProductoSerializer.Meta.expandibles
+        columnas = [
+            columna for columna in ('variantes', 'categorias', 'descripcion')
+            if not seleccion.incluye(columna, columna in expandibles)
+        ]
+        return queryset.defer(*columnas) if columnas else queryset
+    
+    @cachear_catalogo
+    def list(self, request, *args, **kwargs):
+        """Listar productos del catálogo (una fila precalculada por producto)"""
+        queryset = self.get_catalogo_queryset()
+        if pide_streaming(request) and request.user.is_staff:
+            # Catálogo completo sin paginar para administración
+            serializer = CatalogoProductoSerializer(context={'request': request})
+            return respuesta_streaming(queryset, serializer, 'productos')
+        page = self.paginate_queryset(queryset)
+        serializer = CatalogoProductoSerializer(page, many=True, context={'request': request})
         data = serializer.data
         
-        print(f"📤 API: Datos serializados: {len(data)} productos")
-        
-        return Response({
-            'success': True,
-            'count': queryset.count(),
-            'productos': data
+        logger.debug('Listado de productos', extra={
+            'productos': len(data), 'filtros': request.query_params.dict()
         })
+        
+        return self.paginator.get_paginated_response(data, 'productos')
     
+    @respuesta_condicional(ultima_modificacion_producto)
+    @cachear_catalogo
     def retrieve(self, request, *args, **kwargs):
         """Obtener producto completo con todas sus variantes"""
         producto = self.get_object()
@@ -87,29 +154,90 @@ class ProductoViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
     
     @action(detail=False, methods=['get'])
+    @cachear_catalogo
     def destacados(self, request):
-        """Productos destacados (los más recientes o con mejor rating)"""
-        productos_destacados = self.queryset.order_by('-fecha_creacion')[:6]
+        """
+        Productos destacados: los primeros por puntaje de popularidad (ventas
+        recientes, calificación y antigüedad), ya calculado por
+        `python manage.py actualizar_destacados`. Aquí solo se lee el índice.
+        """
+        try:
+            limite = min(max(int(request.query_params.get('limite', 6)), 1), 24)
+        except ValueError:
+            raise ValidationError({'limite': 'Debe ser un número entero'})
+        
+        puntajes = PuntajeProducto.objects.filter(producto__activo=True).select_related('producto')
+        productos_destacados = [puntaje.producto for puntaje in puntajes.order_by('-puntaje', 'producto')[:limite]]
+        if len(productos_destacados) < limite:
+            # Sin puntajes todavía (o productos nuevos sin calcular): se completa con los más recientes
+            productos_destacados += self.queryset.exclude(
+                id__in=[producto.id for producto in productos_destacados]
+            ).order_by('-fecha_creacion')[:limite - len(productos_destacados)]
         serializer = ProductoBasicoSerializer(productos_destacados, many=True)
         
         return Response({
             'success': True,
-            'count': productos_destacados.count(),
+            'count': len(productos_destacados),
             'productos_destacados': serializer.data
         })
     
+    @action(detail=False, methods=['get'])
+    @cachear_catalogo
+    def buscar(self, request):
+        """
+        Búsqueda ordenada por relevancia sobre nombre + descripción.
+        Usa el tsvector indexado (GIN) y similitud de trigramas en el nombre
+        para tolerar errores de escritura.
+        """
+        texto = request.query_params.get('q', '').strip()
+        if not texto:
+            return Response({
+                'success': False,
+                'message': 'El parámetro q es requerido'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            limite = min(int(request.query_params.get('limite', 20)), 100)
+        except ValueError:
+            limite = 20
+        
+        consulta = SearchQuery(texto, config='spanish', search_type='websearch')
+        resultados = self.diferir_columnas(CatalogoProducto.objects.filter(activo=True)).filter(
+            Q(producto__busqueda=consulta) |
+            Q(producto__nombre__trigram_similar=texto) |
+            Q(producto__nombre__trigram_word_similar=texto)
+        ).annotate(
+            relevancia=SearchRank(F('producto__busqueda'), consulta),
+            similitud=Greatest(
+                TrigramSimilarity('producto__nombre', texto),
+                TrigramWordSimilarity(texto, 'producto__nombre')
+            )
+        ).order_by('-relevancia', '-similitud', '-producto')[:limite]
+        
+        serializer = CatalogoProductoSerializer(resultados, many=True, context={'request': request})
+        
+        return Response({
+            'success': True,
+            'q': texto,
+            'count': len(serializer.data),
+            'productos': serializer.data
+        })
+    
     @action(detail=True, methods=['get'])
+    @cachear_catalogo
     def variantes(self, request, pk=None):
         """Obtener todas las variantes de un producto específico"""
         producto = self.get_object()
-        variantes = ProductoCategoria.objects.filter(producto=producto)
-        serializer = ProductoCategoriaSerializer(variantes, many=True)
+        variantes = ProductoCategoriaSerializer.preparar_queryset(
+            ProductoCategoria.objects.filter(producto=producto), Seleccion.desde_request(request)
+        )
+        data = datos_variantes(variantes, request)
         
         return Response({
             'success': True,
             'producto': producto.nombre,
-            'count': variantes.count(),
-            'variantes': serializer.data
+            'count': len(data),
+            'variantes': data
         })
 
 class CategoriaViewSet(viewsets.ModelViewSet):
@@ -118,6 +246,7 @@ class CategoriaViewSet(viewsets.ModelViewSet):
     """
     queryset = Categoria.objects.filter(activo=True)
     serializer_class = CategoriaSerializer
+    pagination_class = CatalogoCursorPagination
     
     def get_permissions(self):
         """Permisos dinámicos: solo lectura pública, escritura autenticada"""
@@ -128,41 +257,81 @@ class CategoriaViewSet(viewsets.ModelViewSet):
         
         return [permission() for permission in permission_classes]
     
+    @cachear_catalogo
     def list(self, request, *args, **kwargs):
-        """Listar categorías principales (sin padre)"""
-        categorias_principales = self.queryset.filter(id_padre__isnull=True)
-        serializer = self.get_serializer(categorias_principales, many=True)
+        """Listar categorías principales (sin padre) con todo su árbol anidado en una consulta"""
+        hijos = CategoriaSerializer.agrupar_hijos(self.get_queryset())
+        categorias_principales = hijos.get(None, [])
+        serializer = CategoriaSerializer(categorias_principales, many=True, context={'hijos': hijos})
         
         return Response({
             'success': True,
-            'count': categorias_principales.count(),
+            'count': len(categorias_principales),
             'categorias': serializer.data
         })
     
+    @cachear_catalogo
+    def retrieve(self, request, *args, **kwargs):
+        """Obtener una categoría con su subárbol completo (filtro por prefijo de ruta)"""
+        categoria = self.get_object()
+        hijos = CategoriaSerializer.agrupar_hijos(
+            self.get_queryset().filter(ruta__startswith=categoria.ruta).exclude(pk=categoria.pk)
+        )
+        serializer = CategoriaSerializer(categoria, context={'hijos': hijos})
+        return Response(serializer.data)
+    
     @action(detail=True, methods=['get'])
+    @cachear_catalogo
     def productos(self, request, pk=None):
-        """Obtener productos de una categoría específica"""
+        """Obtener productos de una categoría y de todas sus subcategorías"""
         categoria = self.get_object()
         productos = Producto.objects.filter(
-            productocategoria__categoria=categoria,
+            productocategoria__categoria__ruta__startswith=categoria.ruta,
             activo=True
         ).distinct()
         
-        serializer = ProductoBasicoSerializer(productos, many=True)
+        page = self.paginate_queryset(productos)
+        serializer = ProductoBasicoSerializer(page, many=True)
         
-        return Response({
-            'success': True,
-            'categoria': categoria.nombre,
-            'count': productos.count(),
-            'productos': serializer.data
-        })
+        respuesta = self.paginator.get_paginated_response(serializer.data, 'productos')
+        respuesta.data['categoria'] = categoria.nombre
+        return respuesta
 
-class ProductoCategoriaViewSet(viewsets.ModelViewSet):
+class LibroMovimientosMixin:
+    """Listado paginado de un libro de movimientos (stock de variantes, inventario)"""
+    
+    def _fecha_param(self, nombre, fin_del_dia=False):
+        """Fecha y hora de un parámetro; una fecha sola es el inicio del día (o el final, con fin_del_dia)"""
+        valor = self.request.query_params.get(nombre)
+        try:
+            dia = parse_date(valor)
+            fecha_hora = parse_datetime(valor) if dia is None else datetime.combine(dia, time.max if fin_del_dia else time.min)
+        except ValueError:
+            fecha_hora = None
+        if fecha_hora is None:
+            raise ValidationError({nombre: 'Fecha no válida (usar YYYY-MM-DD o ISO 8601)'})
+        if timezone.is_naive(fecha_hora):
+            fecha_hora = timezone.make_aware(fecha_hora)
+        return fecha_hora
+    
+    def paginar_movimientos(self, movimientos, serializer_class):
+        """Movimientos del más reciente al más antiguo por páginas de cursor (?desde= / ?hasta= para acotar)"""
+        for parametro, lookup in (('desde', 'fecha__gte'), ('hasta', 'fecha__lte')):
+            if self.request.query_params.get(parametro):
+                movimientos = movimientos.filter(**{lookup: self._fecha_param(parametro, fin_del_dia=parametro == 'hasta')})
+        # Paginador propio: el orden no es el del listado de la vista
+        paginador = CatalogoCursorPagination()
+        paginador.ordering = ('-fecha', '-id')
+        pagina = paginador.paginate_queryset(movimientos, self.request)
+        return paginador.get_paginated_response(serializer_class(pagina, many=True).data, 'movimientos')
+
+class ProductoCategoriaViewSet(LibroMovimientosMixin, viewsets.ModelViewSet):
     """
     ViewSet para variantes de productos - PÚBLICO para ver, AUTENTICADO para modificar
     """
     queryset = ProductoCategoria.objects.all()
     serializer_class = ProductoCategoriaSerializer
+    pagination_class = CatalogoCursorPagination
     
     def get_serializer_class(self):
         """Usar diferentes serializers según la acción"""
@@ -172,7 +341,9 @@ class ProductoCategoriaViewSet(viewsets.ModelViewSet):
     
     def get_permissions(self):
         """Permisos dinámicos"""
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['masivo', 'exportar', 'movimientos', 'stock_en_fecha']:
+            permission_classes = [permissions.IsAdminUser]
+        elif self.action in ['create', 'update', 'partial_update', 'destroy']:
             permission_classes = [permissions.AllowAny]
         else:
             permission_classes = [permissions.AllowAny]
@@ -181,35 +352,328 @@ class ProductoCategoriaViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Filtrar variantes con parámetros"""
-        queryset = ProductoCategoria.objects.select_related('producto', 'categoria')
+        queryset = ProductoCategoriaSerializer.preparar_queryset(
+            ProductoCategoria.objects.all(), Seleccion.desde_request(self.request)
+        )
+        return self.filtrar_variantes(queryset).order_by('-fecha_creacion')
+
+    @cachear_catalogo
+    def list(self, request, *args, **kwargs):
+        """Listar variantes (respuesta cacheada por versión del catálogo)"""
+        page = self.paginate_queryset(self.get_queryset())
+        return self.get_paginated_response(datos_variantes(page, request))
+
+    @respuesta_condicional(ultima_modificacion_variante)
+    @cachear_catalogo
+    def retrieve(self, request, *args, **kwargs):
+        """Obtener una variante (respuesta cacheada por versión del catálogo)"""
+        return super().retrieve(request, *args, **kwargs)
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            variante = serializer.save()
+            registrar_altas([variante], usuario=usuario_de(self.request))
+    
+    def perform_update(self, serializer):
+        """
+        El stock enviado se registra como ajuste (la diferencia con el actual, con
+        la fila bloqueada); el resto de campos se guarda como siempre.
+        """
+        stock = serializer.validated_data.pop('stock', None)
+        with transaction.atomic():
+            variante = serializer.instance
+            # Con la fila bloqueada, save() reescribe el stock vigente y no el leído al inicio de la petición
+            variante.stock = ProductoCategoria.objects.select_for_update().values_list('stock', flat=True).get(pk=variante.pk)
+            serializer.save()
+            if stock is not None:
+                ajustar_stock(variante, stock, 'Edición de la variante', usuario_de(self.request))
+    
+    @action(detail=True, methods=['get', 'post'])
+    def movimientos(self, request, pk=None):
+        """
+        GET: movimientos de stock de la variante, del más reciente al más antiguo,
+        por páginas (?desde= / ?hasta= para acotar por fecha).
+        POST: registrar un movimiento {"tipo": "entrada|venta|devolucion|ajuste", "cantidad": 5, "motivo": "..."};
+        el stock se actualiza con UPDATE ... SET stock = stock + cantidad.
+        """
+        variante = self.get_object()
+        if request.method == 'POST':
+            serializer = MovimientoStockSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            try:
+                movimiento = registrar_movimiento(
+                    variante.id, usuario=usuario_de(request), **serializer.validated_data
+                )
+            except StockInsuficiente as e:
+                return Response({'success': False, 'message': str(e)}, status=status.HTTP_409_CONFLICT)
+            return Response({
+                'success': True,
+                'message': 'Movimiento registrado',
+                'movimiento': MovimientoStockSerializer(movimiento).data
+            }, status=status.HTTP_201_CREATED)
+        
+        return self.paginar_movimientos(MovimientoStock.objects.filter(variante=variante), MovimientoStockSerializer)
+    
+    @action(detail=True, methods=['get'])
+    def stock_en_fecha(self, request, pk=None):
+        """Stock de la variante al final de ?fecha= (YYYY-MM-DD o fecha y hora ISO 8601)"""
+        variante = self.get_object()
+        if not request.query_params.get('fecha'):
+            raise ValidationError({'fecha': 'Este parámetro es requerido'})
+        fecha = self._fecha_param('fecha', fin_del_dia=True)
+        return Response({
+            'success': True,
+            'variante': variante.id,
+            'fecha': fecha,
+            'stock': stock_en_fecha(variante.id, fecha)
+        })
+    
+    @action(detail=False, methods=['post'])
+    def masivo(self, request):
+        """
+        Crear y actualizar variantes en lote: {"variantes": [{...}, {"id": 5, ...}]}.
+        Las filas con `id` actualizan esa variante (solo los campos enviados); el resto
+        se crean. Se valida todo el lote con las reglas de ProductoCategoriaCreateSerializer
+        y, si alguna fila falla, no se guarda nada y se devuelven los errores por fila.
+        """
+        filas = request.data.get('variantes') if isinstance(request.data, dict) else request.data
+        if not isinstance(filas, list) or not filas:
+            return Response({
+                'success': False,
+                'message': 'Se espera una lista no vacía en "variantes"'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if len(filas) > MAX_VARIANTES_MASIVO:
+            return Response({
+                'success': False,
+                'message': f'Máximo {MAX_VARIANTES_MASIVO} variantes por petición'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if not all(isinstance(fila, dict) for fila in filas):
+            return Response({
+                'success': False,
+                'message': 'Cada variante debe ser un objeto'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        precargados = ProductoCategoriaMasivoSerializer.precargar(filas)
+        existentes = precargados[ProductoCategoria]
+        contexto = {'request': request, 'precargados': precargados}
+        
+        errores = []
+        serializers_validos = []
+        vistos = set()
+        for indice, fila in enumerate(filas):
+            instancia = None
+            if fila.get('id') is not None:
+                try:
+                    instancia = existentes.get(int(fila['id']))
+                except (TypeError, ValueError):
+                    pass
+                if instancia is None or instancia.id in vistos:
+                    motivo = 'No existe una variante con este id' if instancia is None else 'id repetido en el lote'
+                    errores.append({'fila': indice, 'errores': {'id': [motivo]}})
+                    continue
+                vistos.add(instancia.id)
+            serializer = ProductoCategoriaMasivoSerializer(
+                instancia, data=fila, partial=instancia is not None, context=contexto
+            )
+            if serializer.is_valid():
+                serializers_validos.append(serializer)
+            else:
+                errores.append({'fila': indice, 'errores': serializer.errors})
+        
+        if errores:
+            return Response({
+                'success': False,
+                'message': f'{len(errores)} variante(s) con errores; no se guardó ninguna',
+                'errores': errores
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        nuevas, actualizadas, campos = [], [], {'fecha_actualizacion'}
+        stocks = {}
+        productos = set()
+        ahora = timezone.now()
+        for serializer in serializers_validos:
+            variante = serializer.instance
+            if variante is None:
+                variante = ProductoCategoria(**serializer.validated_data)
+                nuevas.append(variante)
+            else:
+                productos.add(variante.producto_id)  # el anterior, por si cambia de producto
+                datos = dict(serializer.validated_data)
+                if 'stock' in datos:
+                    # El stock no va en el bulk_update: se ajusta con las filas bloqueadas
+                    stocks[variante.id] = datos.pop('stock')
+                for campo, valor in datos.items():
+                    setattr(variante, campo, valor)
+                variante.fecha_actualizacion = ahora  # bulk_update no aplica auto_now
+                campos.update(datos)
+                actualizadas.append(variante)
+            productos.add(variante.producto_id)
+        
+        usuario = usuario_de(request)
+        with transaction.atomic():
+            ProductoCategoria.objects.bulk_create(nuevas, batch_size=500)
+            registrar_altas(nuevas, usuario=usuario)
+            if actualizadas:
+                ProductoCategoria.objects.bulk_update(actualizadas, sorted(campos), batch_size=500)
+            ajustar_stocks(stocks, 'Actualización masiva', usuario)
+            # bulk_create / bulk_update no emiten señales: catálogo y caché a mano
+            programar_actualizacion(productos=productos)
+        
+        return Response({
+            'success': True,
+            'message': f'{len(nuevas)} variante(s) creada(s), {len(actualizadas)} actualizada(s)',
+            'creadas': [variante.id for variante in nuevas],
+            'actualizadas': [variante.id for variante in actualizadas]
+        }, status=status.HTTP_201_CREATED if nuevas else status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        """Exportar variantes con su producto y categoría (?formato=csv|jsonl, ?gzip=true; admite los filtros del listado)"""
+        queryset = self.filtrar_variantes(ProductoCategoria.objects.all()).order_by('id')
+        return respuesta_exportacion(request, queryset, {
+            'id': 'id',
+            'producto_id': 'producto_id',
+            'producto': 'producto__nombre',
+            'producto_activo': 'producto__activo',
+            'categoria_id': 'categoria_id',
+            'categoria': 'categoria__nombre',
+            'color': 'color',
+            'talla': 'talla',
+            'capacidad': 'capacidad',
+            'precio_variante': 'precio_variante',
+            'precio_unitario': 'precio_unitario',
+            'stock': 'stock',
+            'fecha_creacion': 'fecha_creacion',
+        }, 'variantes')
+
+    def filtrar_variantes(self, queryset):
+        """Aplicar los filtros de la tienda (?producto, ?categoria, ?color, ?precio_min...)"""
+        params = self.request.query_params
         
         # Filtro por producto
-        producto_id = self.request.query_params.get('producto', None)
+        producto_id = params.get('producto', None)
         if producto_id:
             queryset = queryset.filter(producto_id=producto_id)
         
         # Filtro por categoría
-        categoria_id = self.request.query_params.get('categoria', None)
+        categoria_id = params.get('categoria', None)
         if categoria_id:
             queryset = queryset.filter(categoria_id=categoria_id)
         
+        # Filtros por atributos de la variante
+        for campo in ['color', 'talla', 'capacidad']:
+            valor = params.get(campo, None)
+            if valor:
+                queryset = queryset.filter(**{campo: valor})
+        
+        # Filtro por rango de precio
+        precio_min = self._decimal_param('precio_min')
+        if precio_min is not None:
+            queryset = queryset.filter(precio_unitario__gte=precio_min)
+        precio_max = self._decimal_param('precio_max')
+        if precio_max is not None:
+            queryset = queryset.filter(precio_unitario__lte=precio_max)
+        
         # Filtro por disponibilidad
-        disponible = self.request.query_params.get('disponible', None)
+        disponible = params.get('disponible', None)
         if disponible == 'true':
             queryset = queryset.filter(stock__gt=0)
         
-        return queryset.order_by('-fecha_creacion')
+        return queryset
+    
+    def _decimal_param(self, nombre):
+        valor = self.request.query_params.get(nombre, None)
+        if not valor:
+            return None
+        try:
+            return Decimal(valor)
+        except InvalidOperation:
+            raise ValidationError({nombre: 'Debe ser un número'})
+    
+    @action(detail=False, methods=['get'])
+    @cachear_catalogo
+    def facetas(self, request):
+        """
+        Conteo de productos por color, talla, capacidad, categoría y rango de precio.
+        Todas las facetas salen de una sola consulta con GROUPING SETS sobre los filtros actuales.
+        """
+        intervalo = self._decimal_param('intervalo')
+        if intervalo is None:
+            intervalo = Decimal('50')
+        elif intervalo <= 0:
+            raise ValidationError({'intervalo': 'Debe ser mayor a 0'})
+        
+        base = self.filtrar_variantes(ProductoCategoria.objects.all()).values(
+            'producto_id', 'color', 'talla', 'capacidad', 'categoria_id', 'precio_unitario',
+            nombre_categoria=F('categoria__nombre'),
+            rango=Floor(F('precio_unitario') / intervalo) * intervalo
+        )
+        base_sql, params = base.query.sql_with_params()
+        
+        sql = f"""
+            SELECT GROUPING(color), GROUPING(talla), GROUPING(capacidad),
+                   GROUPING(categoria_id), GROUPING(rango),
+                   color, talla, capacidad, categoria_id, nombre_categoria, rango,
+                   COUNT(DISTINCT producto_id), MIN(precio_unitario), MAX(precio_unitario)
+            FROM ({base_sql}) AS variantes
+            GROUP BY GROUPING SETS (
+                (color), (talla), (capacidad), (categoria_id, nombre_categoria), (rango), ()
+            )
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            filas = cursor.fetchall()
+        
+        facetas = {'color': [], 'talla': [], 'capacidad': [], 'categoria': [], 'precio': []}
+        resumen = {'total_productos': 0, 'precio_min': None, 'precio_max': None}
+        for (g_color, g_talla, g_capacidad, g_categoria, g_rango,
+             color, talla, capacidad, categoria_id, nombre_categoria, rango,
+             total, minimo, maximo) in filas:
+            if not g_color:
+                facetas['color'].append({'valor': color, 'count': total})
+            elif not g_talla:
+                facetas['talla'].append({'valor': talla, 'count': total})
+            elif not g_capacidad:
+                if capacidad:
+                    facetas['capacidad'].append({'valor': capacidad, 'count': total})
+            elif not g_categoria:
+                facetas['categoria'].append({'id': categoria_id, 'nombre': nombre_categoria, 'count': total})
+            elif not g_rango:
+                facetas['precio'].append({
+                    'desde': str(rango), 'hasta': str(rango + intervalo), 'count': total
+                })
+            else:
+                resumen = {
+                    'total_productos': total,
+                    'precio_min': str(minimo) if minimo is not None else None,
+                    'precio_max': str(maximo) if maximo is not None else None
+                }
+        
+        # Valores más frecuentes primero; el histograma de precios en orden ascendente
+        for nombre in ['color', 'talla', 'capacidad']:
+            facetas[nombre].sort(key=lambda bucket: (-bucket['count'], bucket['valor']))
+        facetas['categoria'].sort(key=lambda bucket: (-bucket['count'], bucket['nombre']))
+        facetas['precio'].sort(key=lambda bucket: Decimal(bucket['desde']))
+        
+        return Response({
+            'success': True,
+            **resumen,
+            'facetas': facetas
+        })
     
     @action(detail=False, methods=['get'])
+    @cachear_catalogo
     def disponibles(self, request):
         """Variantes con stock disponible"""
-        variantes_disponibles = self.queryset.filter(stock__gt=0)
-        serializer = self.get_serializer(variantes_disponibles, many=True)
+        variantes_disponibles = ProductoCategoriaSerializer.preparar_queryset(
+            self.queryset.filter(stock__gt=0), Seleccion.desde_request(request)
+        )
+        data = datos_variantes(variantes_disponibles, request)
         
         return Response({
             'success': True,
-            'count': variantes_disponibles.count(),
-            'variantes': serializer.data
+            'count': len(data),
+            'variantes': data
         })
 
 class ReseñaViewSet(viewsets.ModelViewSet):
@@ -218,6 +682,8 @@ class ReseñaViewSet(viewsets.ModelViewSet):
     """
     queryset = reseña.objects.all()
     serializer_class = ReseñaSerializer
+    pagination_class = CatalogoCursorPagination
+    cursor_ordering = ('-fecha_reseña', '-id')
     
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -244,27 +710,49 @@ class ReseñaViewSet(viewsets.ModelViewSet):
         return queryset.order_by('-fecha_reseña')
     
     @action(detail=False, methods=['get'])
+    @cachear_catalogo
     def por_producto(self, request):
-        """Reseñas de una variante específica con estadísticas"""
+        """
+        Reseñas paginadas de una variante (?producto_variante_id=) o de todas las
+        variantes de un producto (?producto_id=). El promedio y el total salen del
+        resumen acumulado (una fila), sin recorrer las reseñas.
+        """
         producto_variante_id = request.query_params.get('producto_variante_id')
+        producto_id = request.query_params.get('producto_id')
         
-        if not producto_variante_id:
+        if not producto_variante_id and not producto_id:
             return Response({
                 'success': False,
-                'message': 'producto_variante_id es requerido'
+                'message': 'producto_variante_id o producto_id es requerido'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        reseñas_producto = self.queryset.filter(Producto_categoria_id=producto_variante_id)
-        serializer = self.get_serializer(reseñas_producto, many=True)
+        try:
+            if producto_variante_id:
+                filtro = {'Producto_categoria_id': int(producto_variante_id)}
+                resumen = CalificacionVariante.objects.filter(variante_id=filtro['Producto_categoria_id']).first()
+            else:
+                filtro = {'Producto_categoria__producto_id': int(producto_id)}
+                resumen = CalificacionProducto.objects.filter(producto_id=filtro['Producto_categoria__producto_id']).first()
+        except ValueError:
+            return Response({
+                'success': False,
+                'message': 'El id debe ser un número entero'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Calcular estadísticas
-        promedio = reseñas_producto.aggregate(Avg('calificacion'))['calificacion__avg'] or 0
+        reseñas_producto = self.paginate_queryset(self.get_queryset().filter(**filtro))
+        serializer = self.get_serializer(reseñas_producto, many=True)
         
+        clave, valor = (
+            ('producto_variante_id', producto_variante_id) if producto_variante_id else ('producto_id', producto_id)
+        )
         return Response({
             'success': True,
-            'producto_variante_id': producto_variante_id,
-            'total_reseñas': reseñas_producto.count(),
-            'calificacion_promedio': round(promedio, 2),
+            clave: valor,
+            'total_reseñas': resumen.total if resumen else 0,
+            'calificacion_promedio': float(resumen.promedio) if resumen else 0,
+            'count': resumen.total if resumen else 0,  # total de reseñas, sin otro COUNT
+            'next': self.paginator.get_next_link(),
+            'previous': self.paginator.get_previous_link(),
             'reseñas': serializer.data
         })
 
@@ -274,6 +762,8 @@ class ImagenProductoViewSet(viewsets.ModelViewSet):
     """
     queryset = Imagen_Producto.objects.all()
     serializer_class = ImagenProductoSerializer
+    pagination_class = CatalogoCursorPagination
+    cursor_ordering = ('-es_principal', 'id')  # La principal primero; las imágenes no guardan fecha de creación
     
     def get_permissions(self):
         if self.action in ['create', 'update', 'partial_update', 'destroy']:
@@ -309,7 +799,7 @@ class ItemComprasViewSet(viewsets.ModelViewSet):
     serializer_class = ItemComprasSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class InventarioViewSet(viewsets.ModelViewSet):
+class InventarioViewSet(LibroMovimientosMixin, viewsets.ModelViewSet):
     """
     ViewSet para inventario - CRUD completo para administración
     """
@@ -339,8 +829,10 @@ class InventarioViewSet(viewsets.ModelViewSet):
         return queryset.order_by('-ultima_actualizacion')
     
     def list(self, request, *args, **kwargs):
-        """Listar inventario con información del producto"""
+        """Listar inventario con información del producto (?stream=true para listados grandes)"""
         queryset = self.get_queryset()
+        if pide_streaming(request):
+            return respuesta_streaming(queryset, self.get_serializer(), 'inventario')
         serializer = self.get_serializer(queryset, many=True)
         
         return Response({
@@ -349,6 +841,20 @@ class InventarioViewSet(viewsets.ModelViewSet):
             'inventario': serializer.data
         })
     
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAdminUser])
+    def exportar(self, request):
+        """Exportar inventario (?formato=csv|jsonl, ?gzip=true; admite los filtros del listado)"""
+        return respuesta_exportacion(request, self.get_queryset().order_by('id'), {
+            'id': 'id',
+            'producto_id': 'Producto_id_id',
+            'producto': 'Producto_id__nombre',
+            'cantidad_entradas': 'cantidad_entradas',
+            'stock_minimo': 'stock_minimo',
+            'stock_maximo': 'stock_maximo',
+            'ubicacion_almacen': 'ubicacion_almacen',
+            'ultima_actualizacion': 'ultima_actualizacion',
+        }, 'inventario')
+    
     def create(self, request, *args, **kwargs):
         """Crear registro de inventario"""
         serializer = self.get_serializer(data=request.data)
@@ -375,6 +881,56 @@ class InventarioViewSet(viewsets.ModelViewSet):
             'inventario': serializer.data
         })
     
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            inventario = serializer.save()
+            registrar_altas_inventario([inventario], usuario=usuario_de(self.request))
+    
+    def perform_update(self, serializer):
+        """
+        La cantidad de entradas enviada se registra como ajuste (la diferencia con
+        la actual, con la fila bloqueada); el resto de campos se guarda como siempre.
+        """
+        cantidad = serializer.validated_data.pop('cantidad_entradas', None)
+        with transaction.atomic():
+            inventario = serializer.instance
+            # Con la fila bloqueada, save() reescribe la cantidad vigente y no la leída al inicio de la petición
+            inventario.cantidad_entradas = (
+                Inventario.objects.select_for_update().values_list('cantidad_entradas', flat=True).get(pk=inventario.pk)
+            )
+            serializer.save()
+            if cantidad is not None:
+                ajustar_entradas({inventario.id: cantidad}, 'Edición del inventario', usuario_de(self.request))
+                inventario.cantidad_entradas = cantidad
+    
+    @action(detail=True, methods=['get', 'post'])
+    def movimientos(self, request, pk=None):
+        """
+        GET: movimientos de la cantidad de entradas, del más reciente al más antiguo,
+        por páginas (?desde= / ?hasta= para acotar por fecha).
+        POST: registrar un movimiento {"tipo": "entrada|ajuste", "cantidad": 5, "motivo": "..."};
+        la cantidad se actualiza con UPDATE ... SET cantidad_entradas = cantidad_entradas + cantidad.
+        """
+        inventario = self.get_object()
+        if request.method == 'POST':
+            serializer = MovimientoInventarioSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            try:
+                movimiento = registrar_movimiento_inventario(
+                    inventario.id, usuario=usuario_de(request), **serializer.validated_data
+                )
+            except StockInsuficiente as e:
+                return Response({'success': False, 'message': str(e)}, status=status.HTTP_409_CONFLICT)
+            return Response({
+                'success': True,
+                'message': 'Movimiento registrado',
+                'movimiento': MovimientoInventarioSerializer(movimiento).data
+            }, status=status.HTTP_201_CREATED)
+        
+        return self.paginar_movimientos(
+            MovimientoInventario.objects.filter(inventario=inventario), MovimientoInventarioSerializer
+        )
+    
     def destroy(self, request, *args, **kwargs):
         """Eliminar registro de inventario"""
         instance = self.get_object()
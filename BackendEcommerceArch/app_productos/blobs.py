@@ -0,0 +1,96 @@
+"""
+Imágenes deduplicadas por contenido (ImagenBlob): cada contenido se guarda una
+sola vez con una clave derivada de su SHA-256, y las Imagen_Producto que lo usan
+se cuentan en `referencias` con UPDATE ... SET referencias = referencias + n
+(como los resúmenes de calificaciones), así dos subidas simultáneas no se pisan.
+"""
+import logging
+import mimetypes
+import os
+
+from django.db import transaction
+from django.db.models import F, ProtectedError
+
+from .models import ImagenBlob, Imagen_Producto
+
+logger = logging.getLogger(__name__)
+
+
+def _storage():
+    return Imagen_Producto._meta.get_field('imagen').storage
+
+
+def clave_contenido(sha256, extension):
+    """productos/ab/abcdef….png: el prefijo reparte las claves entre "carpetas" """
+    return f'productos/{sha256[:2]}/{sha256}{extension}'
+
+
+def sumar_referencias(sha256, referencias):
+    """True si el blob existía (y se sumaron las referencias)"""
+    return bool(ImagenBlob.objects.filter(pk=sha256).update(referencias=F('referencias') + referencias))
+
+
+def subir_contenido(archivo, metadatos):
+    """Guardar el archivo con la clave de su contenido; devuelve el nombre en el storage"""
+    extension = mimetypes.guess_extension(metadatos['content_type']) or os.path.splitext(archivo.name)[1]
+    archivo.seek(0)
+    return _storage().save(clave_contenido(metadatos['sha256'], extension), archivo)
+
+
+def registrar_archivo(nombre, metadatos, referencias=1):
+    """
+    Blob del contenido de un archivo que ya está en el storage (subida directa,
+    lote o imagen anterior a la deduplicación) con `referencias` más. Si el
+    contenido ya estaba registrado, el blob conserva su propio archivo.
+    """
+    sha256 = metadatos['sha256']
+    if sumar_referencias(sha256, referencias):
+        return ImagenBlob.objects.get(pk=sha256)
+    blob, creado = ImagenBlob.objects.get_or_create(
+        pk=sha256, defaults={'nombre': nombre, 'tamano': metadatos['tamano'], 'referencias': referencias}
+    )
+    if not creado:
+        # Otra subida del mismo contenido lo registró mientras tanto
+        sumar_referencias(sha256, referencias)
+        blob.refresh_from_db()
+    return blob
+
+
+def adquirir_blob(archivo, metadatos, referencias=1):
+    """
+    Blob del contenido de `archivo` (ya leído con leer_metadatos) con `referencias`
+    más. Si el contenido ya estaba guardado no se sube nada: solo se suma.
+    """
+    if sumar_referencias(metadatos['sha256'], referencias):
+        return ImagenBlob.objects.get(pk=metadatos['sha256'])
+    nombre = subir_contenido(archivo, metadatos)
+    blob = registrar_archivo(nombre, metadatos, referencias)
+    if blob.nombre != nombre:
+        _storage().delete(nombre)
+    return blob
+
+
+def liberar_blob(sha256, referencias=1):
+    """Restar referencias; sin ninguna se borra el blob y, al confirmar, sus archivos"""
+    ImagenBlob.objects.filter(pk=sha256).update(referencias=F('referencias') - referencias)
+    blob = ImagenBlob.objects.filter(pk=sha256, referencias__lte=0).first()
+    if blob is None:
+        return
+    try:
+        borrados, _ = ImagenBlob.objects.filter(pk=sha256, referencias__lte=0).delete()
+    except ProtectedError:
+        # Una imagen todavía lo usa: el contador quedó desfasado y se conservan los archivos
+        logger.warning('Blob sin referencias todavía en uso', extra={'sha256': sha256})
+        return
+    if borrados:
+        transaction.on_commit(lambda: borrar_archivos(blob))
+
+
+def borrar_archivos(blob):
+    """Borrar del storage el original y las versiones de un blob"""
+    storage = _storage()
+    claves = [blob.nombre] + [
+        valor for datos in blob.versiones.values() for valor in datos.values() if isinstance(valor, str)
+    ]
+    for clave in claves:
+        storage.delete(clave)
@@ -0,0 +1,151 @@
+"""
+Caché de respuestas del catálogo público, invalidada por versión,
+y validadores HTTP (ETag / Last-Modified) para GET condicionales
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Max
+from django.db.models.functions import Greatest
+from django.utils.cache import get_conditional_response, patch_vary_headers, quote_etag
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from project_ecommerce.streaming import pide_streaming
+
+from .models import Producto, ProductoCategoria
+
+CLAVE_VERSION = 'catalogo:version'
+
+
+def _cache():
+    return caches[getattr(settings, 'CATALOGO_CACHE_ALIAS', 'default')]
+
+
+def version_catalogo():
+    """Versión actual del catálogo (se crea si no existe o fue desalojada)"""
+    cache = _cache()
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        # Se parte de la hora actual: si la clave se pierde, la nueva versión
+        # siempre es mayor que cualquiera usada antes y no revive entradas viejas
+        cache.add(CLAVE_VERSION, int(time.time() * 1000), timeout=None)
+        version = cache.get(CLAVE_VERSION)
+    return version
+
+
+def invalidar_catalogo():
+    """Incrementar la versión; las respuestas anteriores quedan huérfanas y expiran solas"""
+    cache = _cache()
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        version_catalogo()
+
+
+def parametros_normalizados(request):
+    """Query string como lista ordenada de (parámetro, valor): el orden de los parámetros no importa"""
+    return sorted(
+        (clave, valor)
+        for clave, valores in request.query_params.lists()
+        for valor in valores
+    )
+
+
+def clave_respuesta(request, vista):
+    """Clave a partir de la vista, la URL y la query string normalizada (parámetros ordenados)"""
+    firma = repr((request.get_host(), request.path, parametros_normalizados(request))).encode()
+    return f'catalogo:{version_catalogo()}:{vista}:{hashlib.md5(firma).hexdigest()}'
+
+
+def cachear_catalogo(metodo):
+    """
+    Decorador para métodos GET públicos del catálogo: guarda response.data de
+    las respuestas 200 y las reutiliza mientras no cambie la versión del catálogo.
+    Las entradas desalojadas se vuelven a generar en la siguiente petición.
+    """
+    @wraps(metodo)
+    def envoltura(self, request, *args, **kwargs):
+        if pide_streaming(request):
+            # Las respuestas en streaming no se guardan (ni se sirven desde la caché)
+            return metodo(self, request, *args, **kwargs)
+        cache = _cache()
+        clave = clave_respuesta(request, f'{self.__class__.__name__}.{metodo.__name__}')
+        datos = cache.get(clave)
+        if datos is not None:
+            return Response(datos)
+
+        respuesta = metodo(self, request, *args, **kwargs)
+        if respuesta.status_code == 200 and isinstance(respuesta, Response):
+            cache.set(clave, respuesta.data, getattr(settings, 'CATALOGO_CACHE_TIMEOUT', 300))
+        return respuesta
+    return envoltura
+
+
+def ultima_modificacion_producto(pk):
+    """
+    Fecha del último cambio del producto, sus variantes, categorías, imágenes y
+    resumen de calificaciones (una consulta)
+    """
+    return Producto.objects.filter(pk=pk, activo=True).aggregate(ultima=Greatest(
+        Max('fecha_actualizacion'),
+        Max('calificacion__actualizado'),
+        Max('productocategoria__fecha_actualizacion'),
+        Max('productocategoria__categoria__fecha_actualizacion'),
+        Max('productocategoria__imagen_producto__fecha_actualizacion'),
+    ))['ultima']
+
+
+def ultima_modificacion_variante(pk):
+    """
+    Fecha del último cambio de la variante, su producto, su categoría, sus imágenes
+    y su resumen de calificaciones (una consulta)
+    """
+    return ProductoCategoria.objects.filter(pk=pk).aggregate(ultima=Greatest(
+        Max('fecha_actualizacion'),
+        Max('calificacion__actualizado'),
+        Max('producto__fecha_actualizacion'),
+        Max('categoria__fecha_actualizacion'),
+        Max('imagen_producto__fecha_actualizacion'),
+    ))['ultima']
+
+
+def respuesta_condicional(ultima_modificacion):
+    """
+    Decorador para retrieve: calcula ETag y Last-Modified con `ultima_modificacion(pk)`
+    y responde 304 a If-None-Match / If-Modified-Since sin serializar nada.
+    Si el objeto no existe se ejecuta la vista normal (404).
+
+    El ETag también depende de la query string normalizada (?fields= / ?expand=
+    cambian el cuerpo) y del formato negociado con Accept (Vary: Accept).
+    """
+    def decorador(metodo):
+        @wraps(metodo)
+        def envoltura(self, request, *args, **kwargs):
+            pk = kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+            ultima = ultima_modificacion(pk) if str(pk).isdigit() else None
+            if ultima is None:
+                return metodo(self, request, *args, **kwargs)
+
+            formato = getattr(getattr(request, 'accepted_renderer', None), 'format', '')
+            firma = repr((
+                self.__class__.__name__, str(pk), ultima.isoformat(), formato, parametros_normalizados(request)
+            )).encode()
+            etag = quote_etag(hashlib.md5(firma).hexdigest())
+            last_modified = int(ultima.timestamp())
+            no_modificado = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if no_modificado is not None:
+                patch_vary_headers(no_modificado, ['Accept'])
+                return no_modificado
+
+            respuesta = metodo(self, request, *args, **kwargs)
+            if respuesta.status_code == 200:
+                respuesta['ETag'] = etag
+                respuesta['Last-Modified'] = http_date(last_modified)
+                patch_vary_headers(respuesta, ['Accept'])
+            return respuesta
+        return envoltura
+    return decorador
@@ -0,0 +1,94 @@
+"""
+Mantenimiento del modelo de lectura del catálogo (CatalogoProducto)
+"""
+from .models import Producto, CatalogoProducto, CalificacionProducto
+from .serializers import ProductoCompletoSerializer
+
+CAMPOS_ACTUALIZABLES = [
+    'nombre', 'descripcion', 'activo', 'fecha_creacion', 'peso', 'variantes',
+    'categorias', 'imagen_principal', 'precio_min', 'precio_max', 'stock_total',
+    'calificacion_promedio', 'total_reseñas', 'actualizado'
+]
+
+
+def _url_tarjeta(imagen):
+    """Versión `card` (WebP) si ya se generó; si no, el original"""
+    tarjeta = imagen['versiones'].get('card')
+    return tarjeta['webp'] if tarjeta else imagen['imagen_url']
+
+
+def _imagen_principal(variantes):
+    """URL de la primera imagen principal, o de la primera imagen si no hay principal"""
+    for variante in variantes:
+        if variante['imagen_principal']:
+            return _url_tarjeta(variante['imagen_principal'])
+    for variante in variantes:
+        for imagen in variante['imagenes']:
+            if imagen['imagen_url']:
+                return _url_tarjeta(imagen)
+    return None
+
+
+def construir_filas(productos):
+    """Construir las filas de CatalogoProducto para una lista de productos ya prefetcheada"""
+    calificaciones = CalificacionProducto.objects.in_bulk([producto.id for producto in productos])
+
+    filas = []
+    for producto, data in zip(productos, ProductoCompletoSerializer(productos, many=True).data):
+        variantes = producto.productocategoria_set.all()
+        precios = [variante.precio_unitario for variante in variantes]
+        calificacion = calificaciones.get(producto.id)
+        filas.append(CatalogoProducto(
+            producto=producto,
+            nombre=producto.nombre,
+            descripcion=producto.descripcion,
+            activo=producto.activo,
+            fecha_creacion=producto.fecha_creacion,
+            peso=producto.peso,
+            variantes=data['variantes'],
+            categorias=data['categorias'],
+            imagen_principal=_imagen_principal(data['variantes']),
+            precio_min=min(precios, default=None),
+            precio_max=max(precios, default=None),
+            stock_total=sum(variante.stock for variante in variantes),
+            calificacion_promedio=calificacion.promedio if calificacion else 0,
+            total_reseñas=calificacion.total if calificacion else 0,
+        ))
+    return filas
+
+
+def guardar_filas(filas):
+    """Insertar o actualizar filas en una sola sentencia (INSERT ... ON CONFLICT)"""
+    CatalogoProducto.objects.bulk_create(
+        filas,
+        update_conflicts=True,
+        unique_fields=['producto'],
+        update_fields=CAMPOS_ACTUALIZABLES,
+    )
+
+
+def actualizar_catalogo(producto_ids):
+    """Recalcular las filas del catálogo de los productos indicados"""
+    producto_ids = set(producto_ids)
+    if not producto_ids:
+        return
+    productos = list(ProductoCompletoSerializer.preparar_queryset(
+        Producto.objects.filter(id__in=producto_ids)
+    ))
+    guardar_filas(construir_filas(productos))
+
+
+def reconstruir_catalogo(lote=500):
+    """Reconstruir todo el catálogo por lotes; devuelve el número de productos procesados"""
+    total = 0
+    ultimo_id = 0
+    while True:
+        productos = list(ProductoCompletoSerializer.preparar_queryset(
+            Producto.objects.filter(id__gt=ultimo_id).order_by('id')
+        )[:lote])
+        if not productos:
+            break
+        guardar_filas(construir_filas(productos))
+        total += len(productos)
+        ultimo_id = productos[-1].id
+    return total
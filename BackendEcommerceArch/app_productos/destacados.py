@@ -0,0 +1,108 @@
+"""
+Puntaje de popularidad de los productos (PuntajeProducto) para los destacados
+"""
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Max, Q, Sum
+from django.utils import timezone
+
+from .models import Producto, CatalogoProducto, CalificacionProducto, PuntajeProducto, item_pedido
+
+# Ventas que cuentan como recientes
+VENTANA_DIAS = getattr(settings, 'DESTACADOS_VENTANA_DIAS', 30)
+# Calificación bayesiana: cada producto parte de PRIOR_RESEÑAS reseñas de PRIOR_CALIFICACION,
+# así una sola reseña de 5 no pesa más que cincuenta de 4,5
+PRIOR_RESEÑAS = 5
+PRIOR_CALIFICACION = 3
+PESO_VENTAS = 1.0
+PESO_CALIFICACION = 0.5
+# Cada DIAS_POR_PUNTO días más nuevo suma un punto (lo mismo que ~2,7 veces más ventas).
+# La antigüedad cuenta desde una fecha fija, no desde hoy: el puntaje no envejece
+# y solo hay que recalcular los productos cuyas ventas o reseñas cambian.
+DIAS_POR_PUNTO = getattr(settings, 'DESTACADOS_DIAS_POR_PUNTO', 30)
+REFERENCIA = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def calificacion_bayesiana(resumen):
+    suma = resumen.suma if resumen else 0
+    total = resumen.total if resumen else 0
+    return (PRIOR_RESEÑAS * PRIOR_CALIFICACION + suma) / (PRIOR_RESEÑAS + total)
+
+
+def calcular_puntaje(ventas, calificacion, fecha_creacion):
+    dias = (fecha_creacion - REFERENCIA).total_seconds() / 86400
+    return PESO_VENTAS * math.log1p(ventas) + PESO_CALIFICACION * calificacion + dias / DIAS_POR_PUNTO
+
+
+def guardar_puntajes(producto_ids, inicio):
+    """Recalcular y guardar (INSERT ... ON CONFLICT) el puntaje de los productos indicados"""
+    desde = timezone.localdate(inicio) - timedelta(days=VENTANA_DIAS)
+    ventas = dict(
+        item_pedido.objects.filter(
+            Producto_variante__producto_id__in=producto_ids,
+            pedido__estado='confirmado',
+            pedido__fecha_compra__gt=desde,
+        ).values_list('Producto_variante__producto_id').annotate(total=Sum('cantidad')).order_by()
+    )
+    calificaciones = CalificacionProducto.objects.in_bulk(producto_ids)
+
+    filas = []
+    for producto_id, fecha_creacion in Producto.objects.filter(id__in=producto_ids).values_list('id', 'fecha_creacion'):
+        calificacion = calificacion_bayesiana(calificaciones.get(producto_id))
+        filas.append(PuntajeProducto(
+            producto_id=producto_id,
+            ventas_recientes=ventas.get(producto_id, 0),
+            calificacion=round(calificacion, 2),
+            puntaje=calcular_puntaje(ventas.get(producto_id, 0), calificacion, fecha_creacion),
+            actualizado=inicio,
+        ))
+    PuntajeProducto.objects.bulk_create(
+        filas,
+        update_conflicts=True,
+        unique_fields=['producto'],
+        update_fields=['ventas_recientes', 'calificacion', 'puntaje', 'actualizado'],
+    )
+    return len(filas)
+
+
+def productos_pendientes(ultima, inicio):
+    """
+    Productos cuyo puntaje pudo cambiar desde el cálculo de `ultima`:
+    modificados (producto, variantes o reseñas actualizan su fila del catálogo),
+    con ventas nuevas o con ventas que salieron de la ventana.
+    """
+    ventana = timedelta(days=VENTANA_DIAS)
+    ultima_fecha, hoy = timezone.localdate(ultima), timezone.localdate(inicio)
+    ids = set(CatalogoProducto.objects.filter(actualizado__gte=ultima).values_list('producto_id', flat=True))
+    ids.update(
+        item_pedido.objects.filter(
+            Q(pedido__fecha_compra__gte=ultima_fecha) |
+            Q(pedido__fecha_compra__gt=ultima_fecha - ventana, pedido__fecha_compra__lte=hoy - ventana)
+        ).values_list('Producto_variante__producto_id', flat=True).distinct()
+    )
+    return ids
+
+
+def actualizar_destacados(completo=False, lote=1000):
+    """
+    Recalcular los puntajes; devuelve el número de productos recalculados.
+    Sin `completo` solo se recalculan los productos pendientes desde el último
+    cálculo (el primero siempre es completo).
+    """
+    inicio = timezone.now()
+    ultima = None if completo else PuntajeProducto.objects.aggregate(ultima=Max('actualizado'))['ultima']
+    if ultima is not None:
+        ids = sorted(productos_pendientes(ultima, inicio))
+        return sum(guardar_puntajes(ids[i:i + lote], inicio) for i in range(0, len(ids), lote))
+
+    total = 0
+    ultimo_id = 0
+    while True:
+        ids = list(Producto.objects.filter(id__gt=ultimo_id).order_by('id').values_list('id', flat=True)[:lote])
+        if not ids:
+            break
+        total += guardar_puntajes(ids, inicio)
+        ultimo_id = ids[-1]
+    return total
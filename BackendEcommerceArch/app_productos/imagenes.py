@@ -0,0 +1,177 @@
+"""
+Versiones redimensionadas de las imágenes de productos (thumb, card, detail) en WebP y JPEG
+y metadatos del original (tamaño, tipo, dimensiones, SHA-256)
+"""
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import ExifTags, Image, ImageOps
+
+from .blobs import liberar_blob, registrar_archivo
+from .cache import invalidar_catalogo
+from .catalogo import actualizar_catalogo
+from .models import ImagenBlob, Imagen_Producto
+
+logger = logging.getLogger(__name__)
+
+# Lado mayor de cada versión en píxeles (nunca se amplía una imagen más chica)
+VERSIONES = {'thumb': 160, 'card': 480, 'detail': 1200}
+# formato -> (formato de Pillow, extensión, opciones de guardado)
+FORMATOS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+CARPETA = 'productos/versiones'
+
+_ejecutor = None
+_ejecutor_lock = threading.Lock()
+
+
+def _obtener_ejecutor():
+    global _ejecutor
+    with _ejecutor_lock:
+        if _ejecutor is None:
+            _ejecutor = ThreadPoolExecutor(max_workers=settings.IMAGENES_WORKERS, thread_name_prefix='versiones')
+        return _ejecutor
+
+
+def programar_versiones(imagen_id):
+    """
+    Generar las versiones cuando se confirme la transacción (la imagen ya está
+    guardada y visible para otra conexión). Con IMAGENES_VERSIONES_SINCRONAS se
+    generan en el mismo hilo.
+    """
+    if settings.IMAGENES_VERSIONES_SINCRONAS:
+        transaction.on_commit(lambda: generar_versiones(imagen_id))
+    else:
+        transaction.on_commit(lambda: _obtener_ejecutor().submit(generar_versiones_tarea, imagen_id))
+
+
+def generar_versiones_tarea(imagen_id, regenerar=False):
+    try:
+        return generar_versiones(imagen_id, regenerar)
+    except Exception:
+        logger.exception('Error al generar las versiones de la imagen', extra={'imagen': imagen_id})
+        return None
+    finally:
+        # Cada hilo del pool abre su propia conexión: se cierra al terminar la tarea
+        connection.close()
+
+
+def leer_metadatos(archivo):
+    """
+    Tamaño, tipo, dimensiones y SHA-256 de un archivo de imagen abierto, sin
+    decodificar los píxeles (Pillow solo lee la cabecera). El archivo queda
+    de nuevo al principio para poder guardarlo después.
+    """
+    archivo.seek(0)
+    sha256 = hashlib.sha256()
+    tamano = 0
+    for bloque in iter(lambda: archivo.read(64 * 1024), b''):
+        sha256.update(bloque)
+        tamano += len(bloque)
+    archivo.seek(0)
+    with Image.open(archivo) as imagen:
+        formato = imagen.format
+        ancho, alto = imagen.size
+        if imagen.getexif().get(ExifTags.Base.Orientation, 1) in (5, 6, 7, 8):
+            # Foto girada 90°: se informa el tamaño con el que se muestra (como las versiones)
+            ancho, alto = alto, ancho
+    archivo.seek(0)
+    return {
+        'tamano': tamano,
+        'content_type': Image.MIME.get(formato, getattr(archivo, 'content_type', '') or ''),
+        'ancho': ancho,
+        'alto': alto,
+        'sha256': sha256.hexdigest(),
+    }
+
+
+def _normalizar(imagen):
+    """RGB, o RGBA si la imagen tiene transparencia (se redimensiona sin paleta)"""
+    transparente = imagen.mode in ('RGBA', 'LA', 'PA') or 'transparency' in imagen.info
+    return imagen.convert('RGBA' if transparente else 'RGB')
+
+
+def _para_formato(imagen, formato):
+    """JPEG no admite transparencia: se compone sobre fondo blanco"""
+    if imagen.mode == 'RGBA' and formato == 'JPEG':
+        fondo = Image.new('RGB', imagen.size, (255, 255, 255))
+        fondo.paste(imagen, mask=imagen.getchannel('A'))
+        return fondo
+    return imagen
+
+
+def _guardar_versiones(original, sha256, storage):
+    """Claves fijas por contenido: regenerar sobrescribe en lugar de acumular copias"""
+    versiones = {}
+    for version, lado in VERSIONES.items():
+        copia = original.copy()
+        copia.thumbnail((lado, lado), Image.Resampling.LANCZOS)
+        datos = {'ancho': copia.width, 'alto': copia.height}
+        for formato, (formato_pil, extension, opciones) in FORMATOS.items():
+            salida = io.BytesIO()
+            _para_formato(copia, formato_pil).save(salida, formato_pil, **opciones)
+            clave = f'{CARPETA}/{sha256[:2]}/{sha256}_{version}.{extension}'
+            storage.delete(clave)
+            datos[formato] = storage.save(clave, ContentFile(salida.getvalue()))
+        versiones[version] = datos
+    return versiones
+
+
+def generar_versiones(imagen_id, regenerar=False):
+    """
+    Generar las versiones del contenido de la imagen (una vez por ImagenBlob: las
+    imágenes con el mismo archivo las comparten) y copiarlas a todas sus imágenes.
+    Una imagen sin blob (subida directa o anterior a la deduplicación) se registra
+    antes; si su contenido ya existía pasa a usar ese archivo y se borra la copia.
+    Devuelve las versiones, o None si la imagen ya no existe o cambió mientras se procesaba.
+    """
+    imagen = Imagen_Producto.objects.filter(pk=imagen_id).select_related('blob').first()
+    if imagen is None or not imagen.imagen:
+        return None
+    nombre = imagen.imagen.name
+    storage = imagen.imagen.storage
+    blob = imagen.blob
+
+    metadatos = None
+    if blob is None or regenerar or not blob.versiones:
+        with storage.open(nombre, 'rb') as archivo:
+            contenido = io.BytesIO(archivo.read())
+        metadatos = leer_metadatos(contenido)
+
+    if blob is None:
+        blob = registrar_archivo(nombre, metadatos)
+        # El filtro por nombre descarta el resultado si la imagen se reemplazó mientras tanto
+        if not Imagen_Producto.objects.filter(pk=imagen_id, imagen=nombre, blob=None).update(
+            blob=blob, imagen=blob.nombre
+        ):
+            liberar_blob(blob.pk)
+            return None
+        if blob.nombre != nombre and not Imagen_Producto.objects.filter(imagen=nombre).exists():
+            storage.delete(nombre)  # Contenido repetido: se conserva solo el archivo del blob
+
+    if regenerar or not blob.versiones:
+        blob.versiones = _guardar_versiones(
+            _normalizar(ImageOps.exif_transpose(Image.open(contenido))), blob.pk, storage
+        )
+        ImagenBlob.objects.filter(pk=blob.pk).update(versiones=blob.versiones)
+
+    if metadatos:
+        # Los metadatos se recalculan con el archivo real (en la subida directa solo se conocían tamaño y tipo)
+        Imagen_Producto.objects.filter(pk=imagen_id).update(**metadatos)
+    # update() no emite señales: catálogo y caché se actualizan aquí
+    imagenes = Imagen_Producto.objects.filter(blob=blob)
+    productos = set(imagenes.values_list('Producto_categoria__producto_id', flat=True))
+    imagenes.update(versiones=blob.versiones, fecha_actualizacion=timezone.now())
+    actualizar_catalogo(productos)
+    invalidar_catalogo()
+    logger.info('Versiones generadas', extra={'imagen': imagen_id, 'sha256': blob.pk})
+    return blob.versiones
@@ -0,0 +1,257 @@
+"""
+Importación masiva del catálogo (productos, variantes e inventario) desde CSV o JSONL
+"""
+import csv
+import json
+import logging
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .cache import invalidar_catalogo
+from .catalogo import actualizar_catalogo
+from .models import Producto, Categoria, ProductoCategoria, Inventario
+from .serializers import FilaImportacionSerializer
+from .stock import ajustar_entradas, ajustar_stocks, registrar_altas, registrar_altas_inventario
+
+logger = logging.getLogger(__name__)
+
+FORMATOS = ('csv', 'jsonl')
+TAMANO_LOTE = 2000
+# Se informan los primeros errores; del resto solo se cuentan
+MAX_ERRORES = 100
+MOTIVO = 'Importación de catálogo'  # de los movimientos de stock e inventario
+
+
+def leer_filas(archivo, formato):
+    """
+    Recorrer el archivo (texto) fila a fila, sin cargarlo entero: genera
+    (número de línea, dict), o (número de línea, None) si la línea no es un
+    objeto JSON. Las celdas vacías del CSV se omiten para que los campos
+    opcionales tomen su valor por defecto.
+    """
+    if formato == 'csv':
+        lector = csv.DictReader(archivo)
+        for fila in lector:
+            yield lector.line_num, {clave: valor for clave, valor in fila.items() if clave and valor not in ('', None)}
+    elif formato == 'jsonl':
+        for numero, linea in enumerate(archivo, start=1):
+            if not linea.strip():
+                continue
+            try:
+                fila = json.loads(linea)
+            except ValueError:
+                fila = None
+            yield numero, fila if isinstance(fila, dict) else None
+    else:
+        raise ValueError(f'Formato no soportado: {formato} (usar {", ".join(FORMATOS)})')
+
+
+class ImportacionCatalogo:
+    """
+    Carga por lotes: cada lote de filas se valida con FilaImportacionSerializer
+    y se escribe con bulk_create / bulk_update en su propia transacción, así la
+    memoria depende del tamaño del lote y no del archivo. Las filas con errores
+    se saltan y se informan con su número de línea.
+
+    Un producto se identifica por nombre; una variante, por producto, categoría,
+    color, talla y capacidad (si ya existe se actualizan precios y stock).
+    Como bulk_create no emite señales, el catálogo desnormalizado se recalcula
+    al final para los productos tocados y la caché se invalida una vez, también
+    si la importación se corta: los lotes anteriores ya están confirmados.
+    Después de un error, `resumen` cuenta solo lo guardado.
+    """
+
+    def __init__(self, tamano_lote=TAMANO_LOTE):
+        self.tamano_lote = tamano_lote
+        self.categorias = {}  # nombre -> id (pocas, se guardan durante toda la importación)
+        self.productos_tocados = set()
+        self.resumen = {
+            'filas': 0,
+            'productos_creados': 0,
+            'variantes_creadas': 0,
+            'variantes_actualizadas': 0,
+            'inventarios': 0,
+            'total_errores': 0,
+            'errores': [],
+        }
+
+    def error(self, linea, errores):
+        self.resumen['total_errores'] += 1
+        if len(self.resumen['errores']) < MAX_ERRORES:
+            self.resumen['errores'].append({'linea': linea, 'errores': errores})
+
+    def importar(self, archivo, formato):
+        filas = leer_filas(archivo, formato)
+        try:
+            while True:
+                lote = list(islice(filas, self.tamano_lote))
+                if not lote:
+                    break
+                self.guardar_lote(lote)
+                logger.info('Importación: %s filas procesadas', self.resumen['filas'])
+        finally:
+            self.actualizar_catalogo()
+        return self.resumen
+
+    def guardar_lote(self, lote):
+        """Validar y guardar un lote en su transacción; si falla, el resumen queda como antes del lote"""
+        anterior = dict(self.resumen, errores=list(self.resumen['errores']))
+        try:
+            self.resumen['filas'] += len(lote)
+            validas = self.validar(lote)
+            if validas:
+                with transaction.atomic():
+                    self.guardar(validas)
+        except Exception:
+            self.resumen.update(anterior)
+            raise
+
+    def validar(self, lote):
+        # Una sola instancia para todas las filas (como el `child` de un ListSerializer):
+        # construir un serializer por fila copia todos sus campos y domina el tiempo
+        serializer = FilaImportacionSerializer()
+        validas = []
+        for linea, fila in lote:
+            if fila is None:
+                self.error(linea, {'non_field_errors': ['La línea no es un objeto JSON']})
+                continue
+            try:
+                validas.append(serializer.run_validation(fila))
+            except serializers.ValidationError as e:
+                self.error(linea, e.detail)
+        return validas
+
+    def guardar(self, filas):
+        productos = self.guardar_productos(filas)
+        categorias = self.guardar_categorias(filas)
+        self.guardar_variantes(filas, productos, categorias)
+        self.guardar_inventarios(filas, productos)
+        self.productos_tocados.update(productos.values())
+
+    def guardar_productos(self, filas):
+        """nombre -> id; crea los que faltan y actualiza descripción y peso de los existentes"""
+        datos = {fila['producto']: fila for fila in filas}  # la última fila de cada producto manda
+        existentes = {}
+        for producto in Producto.objects.filter(nombre__in=datos).order_by('id'):
+            existentes.setdefault(producto.nombre, producto)
+
+        cambiados = []
+        for nombre, producto in existentes.items():
+            descripcion = datos[nombre]['descripcion'] or producto.descripcion
+            if (producto.descripcion, producto.peso) != (descripcion, datos[nombre]['peso']):
+                producto.descripcion = descripcion
+                producto.peso = datos[nombre]['peso']
+                producto.fecha_actualizacion = timezone.now()  # bulk_update no aplica auto_now
+                cambiados.append(producto)
+        Producto.objects.bulk_update(cambiados, ['descripcion', 'peso', 'fecha_actualizacion'], batch_size=500)
+
+        nuevos = Producto.objects.bulk_create([
+            Producto(nombre=nombre, descripcion=fila['descripcion'], peso=fila['peso'])
+            for nombre, fila in datos.items() if nombre not in existentes
+        ], batch_size=500)
+        self.resumen['productos_creados'] += len(nuevos)
+
+        ids = {nombre: producto.id for nombre, producto in existentes.items()}
+        ids.update((producto.nombre, producto.id) for producto in nuevos)
+        return ids
+
+    def guardar_categorias(self, filas):
+        """nombre -> id; las categorías que no existen se crean en la raíz"""
+        faltan = {fila['categoria'] for fila in filas} - set(self.categorias)
+        if faltan:
+            for categoria in Categoria.objects.filter(nombre__in=faltan).order_by('id'):
+                self.categorias.setdefault(categoria.nombre, categoria.id)
+            for nombre in sorted(faltan - set(self.categorias)):
+                # save() calcula la ruta materializada; son pocas
+                self.categorias[nombre] = Categoria.objects.create(nombre=nombre, descripcion='').id
+        return self.categorias
+
+    def guardar_variantes(self, filas, productos, categorias):
+        # Capacidad vacía y nula cuentan como la misma variante
+        existentes = {
+            (variante.producto_id, variante.categoria_id, variante.color, variante.talla, variante.capacidad or None): variante
+            for variante in ProductoCategoria.objects.filter(producto_id__in=productos.values())
+        }
+        ahora = timezone.now()
+        nuevas = {}
+        actualizadas = {}
+        stocks = {}
+        for fila in filas:
+            clave = (
+                productos[fila['producto']], categorias[fila['categoria']],
+                fila['color'], fila['talla'], fila['capacidad'] or None
+            )
+            variante = existentes.get(clave) or nuevas.get(clave)
+            if variante is None:
+                variante = nuevas[clave] = ProductoCategoria(
+                    producto_id=clave[0], categoria_id=clave[1],
+                    color=fila['color'], talla=fila['talla'], capacidad=clave[4]
+                )
+            elif clave in existentes:
+                actualizadas[clave] = variante
+                variante.fecha_actualizacion = ahora  # bulk_update no aplica auto_now
+            variante.precio_variante = fila['precio_variante']
+            variante.precio_unitario = fila['precio_unitario']
+            if clave in existentes:
+                # El stock de una variante existente se ajusta con la fila bloqueada y queda en el libro
+                stocks[variante.id] = fila['stock']
+            else:
+                variante.stock = fila['stock']
+
+        ProductoCategoria.objects.bulk_create(nuevas.values(), batch_size=500)
+        registrar_altas(nuevas.values(), MOTIVO)
+        ProductoCategoria.objects.bulk_update(
+            actualizadas.values(),
+            ['precio_variante', 'precio_unitario', 'fecha_actualizacion'],
+            batch_size=500
+        )
+        ajustar_stocks(stocks, MOTIVO)
+        self.resumen['variantes_creadas'] += len(nuevas)
+        self.resumen['variantes_actualizadas'] += len(actualizadas)
+
+    def guardar_inventarios(self, filas, productos):
+        """
+        Un registro de inventario por producto: se actualiza el primero o se crea.
+        La cantidad de entradas de los existentes se ajusta con la fila bloqueada
+        (ajustar_entradas) y queda en el libro de movimientos.
+        """
+        datos = {productos[fila['producto']]: fila for fila in filas if 'ubicacion_almacen' in fila}
+        if not datos:
+            return
+        existentes = {}
+        for inventario in Inventario.objects.filter(Producto_id__in=datos).order_by('id'):
+            existentes.setdefault(inventario.Producto_id_id, inventario)
+
+        campos = ['stock_minimo', 'stock_maximo', 'ubicacion_almacen']
+        ahora = timezone.now()
+        nuevos, cantidades = [], {}
+        for producto_id, fila in datos.items():
+            inventario = existentes.get(producto_id)
+            if inventario is None:
+                inventario = Inventario(Producto_id_id=producto_id, cantidad_entradas=fila['cantidad_entradas'])
+                nuevos.append(inventario)
+            else:
+                inventario.ultima_actualizacion = ahora  # bulk_update no aplica auto_now
+                cantidades[inventario.id] = fila['cantidad_entradas']
+            for campo in campos:
+                setattr(inventario, campo, fila[campo])
+        Inventario.objects.bulk_create(nuevos, batch_size=500)
+        registrar_altas_inventario(nuevos, MOTIVO)
+        Inventario.objects.bulk_update(existentes.values(), campos + ['ultima_actualizacion'], batch_size=500)
+        ajustar_entradas(cantidades, MOTIVO)
+        self.resumen['inventarios'] += len(datos)
+
+    def actualizar_catalogo(self, lote=500):
+        ids = sorted(self.productos_tocados)
+        for inicio in range(0, len(ids), lote):
+            actualizar_catalogo(ids[inicio:inicio + lote])
+        if ids:
+            invalidar_catalogo()
+
+
+def importar_catalogo(archivo, formato, tamano_lote=TAMANO_LOTE):
+    """Importar un archivo de texto abierto (CSV con cabecera o JSONL); devuelve el resumen"""
+    return ImportacionCatalogo(tamano_lote).importar(archivo, formato)
@@ -0,0 +1,74 @@
+"""
+Vista API para importar el catálogo desde un archivo CSV o JSONL (administradores)
+"""
+import io
+import logging
+
+from django.db import DatabaseError
+from rest_framework import status, permissions
+from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from app_productos.importacion import FORMATOS, ImportacionCatalogo
+
+logger = logging.getLogger(__name__)
+
+
+class ImportarCatalogoAPIView(APIView):
+    """
+    Importa productos, variantes e inventario desde un archivo subido.
+
+    Parámetros (multipart):
+    - archivo: CSV con cabecera o JSONL (una fila/objeto por variante)
+    - formato: csv | jsonl (opcional, por defecto según la extensión)
+
+    El archivo se procesa por lotes leyendo del archivo temporal de la subida,
+    sin cargarlo en memoria. Para archivos muy grandes conviene
+    `python manage.py importar_catalogo`, que no depende del tiempo límite de la petición.
+    """
+    parser_classes = (MultiPartParser, FormParser)
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        if 'archivo' not in request.FILES:
+            return Response({
+                'success': False,
+                'error': 'No se envió ningún archivo'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        archivo = request.FILES['archivo']
+        formato = (request.data.get('formato') or archivo.name.rsplit('.', 1)[-1]).lower()
+        if formato not in FORMATOS:
+            return Response({
+                'success': False,
+                'error': f'Formato no soportado. Formatos permitidos: {", ".join(FORMATOS)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        logger.info('Importación de catálogo iniciada', extra={'archivo': archivo.name, 'tamano': archivo.size})
+        texto = io.TextIOWrapper(archivo.file, encoding='utf-8-sig', newline='')
+        importacion = ImportacionCatalogo()
+        # Si se corta, los lotes anteriores ya quedaron guardados: se informa cuánto
+        try:
+            resumen = importacion.importar(texto, formato)
+        except UnicodeDecodeError:
+            return Response({
+                'success': False,
+                'error': 'El archivo debe estar codificado en UTF-8',
+                **importacion.resumen
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except DatabaseError as e:
+            logger.exception('Importación de catálogo interrumpida', extra={'archivo': archivo.name})
+            return Response({
+                'success': False,
+                'error': f'Error al guardar el catálogo: {str(e)}',
+                **importacion.resumen
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        finally:
+            texto.detach()
+
+        return Response({
+            'success': resumen['total_errores'] == 0,
+            'message': f"{resumen['filas']} filas procesadas, {resumen['total_errores']} con errores",
+            **resumen
+        })
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from app_productos.cache import invalidar_catalogo
+from app_productos.destacados import actualizar_destacados
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula el puntaje de popularidad de los productos (PuntajeProducto). '
+        'Pensado para ejecutarse periódicamente (cron); por defecto solo recalcula '
+        'los productos con cambios desde la última ejecución'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--completo', action='store_true', help='Recalcular todos los productos')
+        parser.add_argument('--lote', type=int, default=1000, help='Productos procesados por lote')
+
+    def handle(self, *args, **options):
+        total = actualizar_destacados(completo=options['completo'], lote=options['lote'])
+        if total:
+            invalidar_catalogo()
+        self.stdout.write(self.style.SUCCESS(f'Puntajes actualizados: {total} productos'))
@@ -0,0 +1,111 @@
+import time
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from rest_framework.renderers import JSONRenderer
+
+from app_carrito.models import Carrito, ItemCarrito
+from app_carrito.serializers import CarritoSerializer, serializar_carrito
+from app_Cliente.models import Cliente, Direccion_Envio
+from app_pedidos.models import Pedido
+from app_pedidos.serializers import PedidoSerializer, serializar_pedidos
+from app_productos.models import Producto, Categoria, ProductoCategoria, Imagen_Producto
+from app_productos.serializers import ProductoCategoriaSerializer, serializar_variantes
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara los serializers DRF con los caminos rápidos (variantes, carrito, pedidos) '
+        'sobre datos generados; los datos se descartan al terminar'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--variantes', type=int, default=2000, help='Variantes a generar')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Se informa el mejor tiempo')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            datos = self.generar(options['variantes'])
+            casos = [
+                ('variantes', datos['variantes'],
+                 lambda v: ProductoCategoriaSerializer(v, many=True).data, serializar_variantes),
+                ('carrito', datos['carrito'],
+                 lambda c: CarritoSerializer(c).data, serializar_carrito),
+                ('pedidos', datos['pedidos'],
+                 lambda p: PedidoSerializer(p, many=True).data, serializar_pedidos),
+            ]
+            for nombre, objetos, drf, rapido in casos:
+                self.comparar(nombre, objetos, drf, rapido, options['repeticiones'])
+            transaction.set_rollback(True)
+
+    def generar(self, total):
+        categorias = Categoria.objects.bulk_create([
+            Categoria(nombre=f'Benchmark {i}', descripcion='') for i in range(5)
+        ])
+        productos = Producto.objects.bulk_create([
+            Producto(nombre=f'Producto {i}', descripcion='Descripción de prueba', peso='0.50')
+            for i in range(max(total // 4, 1))
+        ])
+        variantes = ProductoCategoria.objects.bulk_create([
+            ProductoCategoria(
+                producto=productos[i % len(productos)], categoria=categorias[i % len(categorias)],
+                color=f'Color {i % 7}', talla='M', capacidad=None,
+                precio_variante='5.00', precio_unitario='19.90', stock=i % 30
+            )
+            for i in range(total)
+        ])
+        Imagen_Producto.objects.bulk_create([
+            Imagen_Producto(
+                imagen=f'productos/benchmark_{variante.id}_{j}.jpg', texto='',
+                es_principal=(j == 0), Producto_categoria=variante
+            )
+            for variante in variantes for j in range(2)
+        ])
+
+        usuario = User.objects.create_user(username='benchmark_serializers')
+        cliente = Cliente.objects.create(telefono='0', fecha_nacimiento=date(2000, 1, 1), usuario=usuario)
+        direccion = Direccion_Envio.objects.create(
+            calle='Calle', ciudad='Ciudad', estado='Estado', codigo_postal='0000', Pais='Pais', Cliente=cliente
+        )
+        carrito = Carrito.objects.create(cliente=cliente)
+        ItemCarrito.objects.bulk_create([
+            ItemCarrito(carrito=carrito, producto_variante=variante, cantidad=(i % 3) + 1)
+            for i, variante in enumerate(variantes[:100])
+        ])
+        Pedido.objects.bulk_create([
+            Pedido(cliente=cliente, direccion_envio=direccion, monto_total='99.90', estado='pendiente')
+            for _ in range(total)
+        ])
+
+        prefetch_related_objects([carrito], CarritoSerializer.prefetch_items())
+        return {
+            'variantes': list(ProductoCategoriaSerializer.preparar_queryset(
+                ProductoCategoria.objects.filter(categoria__in=categorias).order_by('id')
+            )),
+            'carrito': carrito,
+            'pedidos': list(Pedido.objects.filter(cliente=cliente).select_related('cliente', 'direccion_envio')),
+        }
+
+    def comparar(self, nombre, objetos, drf, rapido, repeticiones):
+        renderer = JSONRenderer()
+        tiempos = {}
+        salidas = {}
+        for camino, funcion in (('drf', drf), ('rapido', rapido)):
+            mejor = None
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                data = funcion(objetos)
+                transcurrido = time.perf_counter() - inicio
+                mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+            tiempos[camino] = mejor
+            salidas[camino] = renderer.render(data)
+
+        identico = salidas['drf'] == salidas['rapido']
+        estilo = self.style.SUCCESS if identico else self.style.ERROR
+        self.stdout.write(estilo(
+            f"{nombre}: DRF {tiempos['drf'] * 1000:.1f} ms, rápido {tiempos['rapido'] * 1000:.1f} ms "
+            f"(x{tiempos['drf'] / tiempos['rapido']:.1f}), JSON idéntico: {'sí' if identico else 'NO'}"
+        ))
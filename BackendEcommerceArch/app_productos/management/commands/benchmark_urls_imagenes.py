@@ -0,0 +1,95 @@
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from app_productos.imagenes import CARPETA, FORMATOS, VERSIONES
+from app_productos.models import Imagen_Producto
+from app_productos.serializers import ImagenProductoSerializer, urls_versiones
+from project_ecommerce.media import url_archivo
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara las URLs de imágenes pedidas al storage (FieldFile.url / storage.url) con las '
+        'armadas por url_archivo sobre un listado generado en memoria (original y sus versiones)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--imagenes', type=int, default=10000, help='Imágenes del listado')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Se informa el mejor tiempo')
+
+    def handle(self, *args, **options):
+        imagenes = [self.imagen(i) for i in range(options['imagenes'])]
+        caminos = (('storage', self.por_storage), ('texto', self.por_texto))
+        tiempos = {}
+        salidas = {}
+        for camino, funcion in caminos:
+            tiempos[camino], salidas[camino] = self.medir(funcion, imagenes, options['repeticiones'])
+
+        identico = salidas['storage'] == salidas['texto']
+        estilo = self.style.SUCCESS if identico else self.style.ERROR
+        total = sum(len(urls) for urls in salidas['texto'])
+        self.stdout.write(estilo(
+            f"{len(imagenes)} imágenes ({total} URLs, {default_storage.__class__.__name__}): "
+            f"storage {tiempos['storage'] * 1000:.1f} ms, texto {tiempos['texto'] * 1000:.1f} ms "
+            f"(x{tiempos['storage'] / tiempos['texto']:.1f}), URLs idénticas: {'sí' if identico else 'NO'}"
+        ))
+        serializer, _ = self.medir(
+            lambda lista: ImagenProductoSerializer(lista, many=True).data, imagenes, options['repeticiones']
+        )
+        self.stdout.write(f'ImagenProductoSerializer(many=True): {serializer * 1000:.1f} ms')
+
+    @staticmethod
+    def imagen(i):
+        sha256 = f'{i:064x}'
+        return Imagen_Producto(
+            id=i + 1, imagen=f'productos/{sha256[:2]}/{sha256}.jpg', texto='', es_principal=(i % 4 == 0),
+            Producto_categoria_id=i // 4 + 1, ancho=1600, alto=1200,
+            versiones={
+                version: {
+                    'ancho': lado, 'alto': lado * 3 // 4,
+                    **{
+                        formato: f'{CARPETA}/{sha256[:2]}/{sha256}_{version}.{extension}'
+                        for formato, (_, extension, _) in FORMATOS.items()
+                    },
+                }
+                for version, lado in VERSIONES.items()
+            },
+        )
+
+    @staticmethod
+    def por_storage(imagenes):
+        """Como antes: cada URL pasa por el storage"""
+        resultado = []
+        for imagen in imagenes:
+            storage = imagen.imagen.storage
+            urls = [imagen.imagen.url]
+            urls.extend(
+                storage.url(valor) for datos in imagen.versiones.values()
+                for valor in datos.values() if isinstance(valor, str)
+            )
+            resultado.append(urls)
+        return resultado
+
+    @staticmethod
+    def por_texto(imagenes):
+        resultado = []
+        for imagen in imagenes:
+            urls = [url_archivo(imagen.imagen.name)]
+            urls.extend(
+                valor for datos in urls_versiones(imagen).values()
+                for valor in datos.values() if isinstance(valor, str)
+            )
+            resultado.append(urls)
+        return resultado
+
+    @staticmethod
+    def medir(funcion, imagenes, repeticiones):
+        mejor = None
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            salida = funcion(imagenes)
+            transcurrido = time.perf_counter() - inicio
+            mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+        return mejor, salida
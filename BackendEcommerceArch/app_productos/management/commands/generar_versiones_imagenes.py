@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Min, Q
+
+from app_productos.imagenes import generar_versiones_tarea
+from app_productos.models import Imagen_Producto
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera las versiones redimensionadas (thumb, card, detail) y completa los metadatos '
+        '(tamaño, tipo, dimensiones, SHA-256) de las imágenes que aún no los tienen, '
+        'por ejemplo las subidas antes de existir el proceso. Las imágenes sin blob se registran '
+        'en ImagenBlob (los archivos repetidos se reemplazan por el ya guardado)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true', help='Regenerar también las que ya tienen versiones')
+        parser.add_argument('--hilos', type=int, default=settings.IMAGENES_WORKERS, help='Imágenes procesadas en paralelo')
+
+    def handle(self, *args, **options):
+        imagenes = Imagen_Producto.objects.exclude(imagen='').exclude(imagen__isnull=True)
+        if not options['todas']:
+            imagenes = imagenes.filter(Q(blob=None) | Q(versiones={}) | Q(sha256=''))
+        # Las imágenes con el mismo contenido comparten versiones: basta con una por blob
+        ids = sorted(
+            list(imagenes.filter(blob=None).values_list('id', flat=True))
+            + list(imagenes.exclude(blob=None).values('blob').annotate(primera=Min('id')).values_list('primera', flat=True))
+        )
+
+        regenerar = options['todas']
+        with ThreadPoolExecutor(max_workers=options['hilos']) as ejecutor:
+            resultados = ejecutor.map(lambda imagen_id: generar_versiones_tarea(imagen_id, regenerar), ids)
+            generadas = sum(1 for versiones in resultados if versiones is not None)
+
+        estilo = self.style.SUCCESS if generadas == len(ids) else self.style.WARNING
+        self.stdout.write(estilo(f'Versiones generadas: {generadas} de {len(ids)} imágenes'))
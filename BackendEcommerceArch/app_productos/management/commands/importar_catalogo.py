@@ -0,0 +1,36 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app_productos.importacion import FORMATOS, TAMANO_LOTE, importar_catalogo
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa productos, variantes e inventario desde un archivo CSV (con cabecera) '
+        'o JSONL, por lotes y sin cargar el archivo en memoria'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo (.csv o .jsonl)')
+        parser.add_argument('--formato', choices=FORMATOS, help='Por defecto, según la extensión')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Filas validadas y guardadas por lote')
+
+    def handle(self, *args, **options):
+        formato = options['formato'] or options['archivo'].rsplit('.', 1)[-1].lower()
+        if formato not in FORMATOS:
+            raise CommandError(f'No se reconoce el formato de {options["archivo"]}; usar --formato')
+        try:
+            with open(options['archivo'], encoding='utf-8-sig', newline='') as archivo:
+                resumen = importar_catalogo(archivo, formato, tamano_lote=options['lote'])
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for error in resumen['errores']:
+            self.stderr.write(f"Línea {error['linea']}: {json.dumps(error['errores'], ensure_ascii=False)}")
+        estilo = self.style.WARNING if resumen['total_errores'] else self.style.SUCCESS
+        self.stdout.write(estilo(
+            f"{resumen['filas']} filas: {resumen['productos_creados']} productos creados, "
+            f"{resumen['variantes_creadas']} variantes creadas, {resumen['variantes_actualizadas']} actualizadas, "
+            f"{resumen['inventarios']} inventarios, {resumen['total_errores']} filas con errores"
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from app_productos.cache import invalidar_catalogo
+from app_productos.catalogo import reconstruir_catalogo
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el modelo de lectura del catálogo (CatalogoProducto) por lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=500, help='Productos procesados por lote')
+
+    def handle(self, *args, **options):
+        total = reconstruir_catalogo(lote=options['lote'])
+        invalidar_catalogo()
+        self.stdout.write(self.style.SUCCESS(f'Catálogo reconstruido: {total} productos'))
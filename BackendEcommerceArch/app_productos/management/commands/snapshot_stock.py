@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from app_productos.stock import tomar_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        'Guarda el stock de las variantes con movimientos desde su último snapshot (SnapshotStock). '
+        'Pensado para ejecutarse periódicamente (cron, por ejemplo cada noche): el stock en una fecha '
+        'se calcula desde el snapshot anterior sin recorrer todo el libro de movimientos'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fecha', help='Fecha y hora ISO 8601 del snapshot (por defecto, hace unos minutos)')
+        parser.add_argument('--lote', type=int, default=2000, help='Variantes procesadas por lote')
+
+    def handle(self, *args, **options):
+        fecha = None
+        if options['fecha']:
+            fecha = parse_datetime(options['fecha'])
+            if fecha is None:
+                raise CommandError('Fecha no válida (usar ISO 8601, por ejemplo 2026-01-31T23:59:59)')
+            if timezone.is_naive(fecha):
+                fecha = timezone.make_aware(fecha)
+        fecha, creados = tomar_snapshots(fecha, tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'Snapshots de stock al {fecha.isoformat()}: {creados} variantes'))
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_Cliente', '0005_remove_metodo_pago_cliente_and_more'),
+        ('app_productos', '0007_inventario'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['fecha_creacion', 'id'], name='app_product_fecha_c_b0a945_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productocategoria',
+            index=models.Index(fields=['fecha_creacion', 'id'], name='app_product_fecha_c_2c6352_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reseña',
+            index=models.Index(fields=['fecha_reseña', 'id'], name='app_product_fecha_r_6c3797_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:33
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_productos', '0008_indices_paginacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogoProducto',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='catalogo', serialize=False, to='app_productos.producto')),
+                ('nombre', models.CharField(max_length=100)),
+                ('descripcion', models.TextField()),
+                ('activo', models.BooleanField(default=True)),
+                ('fecha_creacion', models.DateTimeField()),
+                ('peso', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('variantes', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('categorias', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('imagen_principal', models.CharField(blank=True, max_length=500, null=True)),
+                ('precio_min', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('precio_max', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('stock_total', models.IntegerField(default=0)),
+                ('calificacion_promedio', models.DecimalField(decimal_places=2, default=0, max_digits=3)),
+                ('total_reseñas', models.IntegerField(default=0)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['activo', 'fecha_creacion', 'producto'], name='app_product_activo_344c40_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_productos', '0010_busqueda_texto_completo'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productocategoria',
+            index=models.Index(fields=['categoria', 'precio_unitario'], name='app_product_categor_84137d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productocategoria',
+            index=models.Index(fields=['color', 'talla'], name='app_product_color_89ac66_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productocategoria',
+            index=models.Index(fields=['precio_unitario'], name='app_product_precio__175faf_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:37
+
+from django.db import migrations, models
+
+
+def calcular_rutas(apps, schema_editor):
+    """Rellenar la ruta materializada de las categorías existentes recorriendo el árbol por niveles"""
+    Categoria = apps.get_model('app_productos', 'Categoria')
+    hijos = {}
+    for categoria in Categoria.objects.all():
+        hijos.setdefault(categoria.id_padre_id, []).append(categoria)
+
+    pendientes = [(categoria, '/') for categoria in hijos.get(None, [])]
+    actualizadas = []
+    while pendientes:
+        categoria, ruta_padre = pendientes.pop()
+        categoria.ruta = f'{ruta_padre}{categoria.id}/'
+        actualizadas.append(categoria)
+        pendientes.extend((hijo, categoria.ruta) for hijo in hijos.get(categoria.id, []))
+    Categoria.objects.bulk_update(actualizadas, ['ruta'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_productos', '0011_indices_facetas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categoria',
+            name='ruta',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(calcular_rutas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def acumular_calificaciones(apps, schema_editor):
+    """Rellenar los resúmenes con las reseñas existentes"""
+    reseña = apps.get_model('app_productos', 'reseña')
+    CalificacionVariante = apps.get_model('app_productos', 'CalificacionVariante')
+    CalificacionProducto = apps.get_model('app_productos', 'CalificacionProducto')
+    CalificacionVariante.objects.bulk_create([
+        CalificacionVariante(variante_id=fila['Producto_categoria_id'], suma=fila['suma'], total=fila['total'])
+        for fila in reseña.objects.values('Producto_categoria_id').annotate(
+            suma=Sum('calificacion'), total=Count('id')
+        ).order_by()
+    ], batch_size=500)
+    CalificacionProducto.objects.bulk_create([
+        CalificacionProducto(producto_id=fila['Producto_categoria__producto_id'], suma=fila['suma'], total=fila['total'])
+        for fila in reseña.objects.values('Producto_categoria__producto_id').annotate(
+            suma=Sum('calificacion'), total=Count('id')
+        ).order_by()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_productos', '0013_fecha_actualizacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalificacionProducto',
+            fields=[
+                ('suma', models.IntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='calificacion', serialize=False, to='app_productos.producto')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='CalificacionVariante',
+            fields=[
+                ('suma', models.IntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+                ('variante', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='calificacion', serialize=False, to='app_productos.productocategoria')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(acumular_calificaciones, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_productos', '0014_calificaciones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PuntajeProducto',
+            fields=[
+                ('producto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='puntaje', serialize=False, to='app_productos.producto')),
+                ('ventas_recientes', models.IntegerField(default=0)),
+                ('calificacion', models.DecimalField(decimal_places=2, default=0, max_digits=3)),
+                ('puntaje', models.FloatField(default=0)),
+                ('actualizado', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-puntaje', 'producto'], name='puntaje_destacados')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_productos', '0015_puntaje_producto'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagen_producto',
+            name='alto',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='imagen_producto',
+            name='ancho',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='imagen_producto',
+            name='versiones',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_productos', '0016_imagen_versiones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagen_producto',
+            name='content_type',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='imagen_producto',
+            name='sha256',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='imagen_producto',
+            name='tamano',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
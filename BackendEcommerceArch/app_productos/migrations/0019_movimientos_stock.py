@@ -0,0 +1,61 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def saldos_iniciales(apps, schema_editor):
+    """Un ajuste por variante con el stock actual: desde aquí el stock es la suma del libro"""
+    ProductoCategoria = apps.get_model('app_productos', 'ProductoCategoria')
+    MovimientoStock = apps.get_model('app_productos', 'MovimientoStock')
+    ahora = timezone.now()
+    MovimientoStock.objects.bulk_create((
+        MovimientoStock(
+            variante_id=variante_id, tipo='ajuste', cantidad=stock, stock_resultante=stock,
+            motivo='Saldo inicial', fecha=ahora
+        )
+        for variante_id, stock in ProductoCategoria.objects.exclude(stock=0).values_list('id', 'stock').iterator()
+    ), batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_productos', '0018_imagen_blob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('entrada', 'Entrada'), ('venta', 'Venta'), ('ajuste', 'Ajuste'), ('devolucion', 'Devolución')], max_length=20)),
+                ('cantidad', models.IntegerField()),
+                ('stock_resultante', models.IntegerField()),
+                ('motivo', models.CharField(blank=True, default='', max_length=200)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('variante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='app_productos.productocategoria')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['variante', 'fecha'], name='app_product_variant_4ab4b8_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SnapshotStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField()),
+                ('stock', models.IntegerField()),
+                ('variante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots_stock', to='app_productos.productocategoria')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('variante', 'fecha'), name='snapshot_stock_unico')],
+            },
+        ),
+        migrations.RunPython(saldos_iniciales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def saldos_iniciales(apps, schema_editor):
+    """Un ajuste por inventario con la cantidad actual: desde aquí es la suma del libro"""
+    Inventario = apps.get_model('app_productos', 'Inventario')
+    MovimientoInventario = apps.get_model('app_productos', 'MovimientoInventario')
+    ahora = timezone.now()
+    MovimientoInventario.objects.bulk_create((
+        MovimientoInventario(
+            inventario_id=inventario_id, tipo='ajuste', cantidad=cantidad, cantidad_resultante=cantidad,
+            motivo='Saldo inicial', fecha=ahora
+        )
+        for inventario_id, cantidad in Inventario.objects.exclude(cantidad_entradas=0).values_list(
+            'id', 'cantidad_entradas'
+        ).iterator()
+    ), batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_productos', '0019_movimientos_stock'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('entrada', 'Entrada'), ('ajuste', 'Ajuste')], max_length=20)),
+                ('cantidad', models.IntegerField()),
+                ('cantidad_resultante', models.IntegerField()),
+                ('motivo', models.CharField(blank=True, default='', max_length=200)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('inventario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='app_productos.inventario')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['inventario', 'fecha'], name='app_product_inventa_32f997_idx')],
+            },
+        ),
+        migrations.RunPython(saldos_iniciales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_productos', '0020_movimientos_inventario'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='snapshotstock',
+            index=models.Index(fields=['fecha'], name='app_product_fecha_d1b402_idx'),
+        ),
+    ]
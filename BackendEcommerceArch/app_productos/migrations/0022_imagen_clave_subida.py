@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app_productos', '0021_snapshot_stock_fecha'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagen_producto',
+            name='clave_subida',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True, unique=True),
+        ),
+    ]
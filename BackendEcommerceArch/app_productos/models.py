@@ -1,4 +1,13 @@
-from django.db import models
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import models, transaction
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr, Upper
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 from app_Cliente.models import Cliente
 from app_compras.models import compra
 
@@ -8,7 +17,24 @@ class Producto(models.Model):
     descripcion = models.TextField()
     activo = models.BooleanField(default=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
     peso = models.DecimalField(max_digits=10, decimal_places=2)
+    # tsvector almacenado para la búsqueda de texto completo (nombre pesa más que descripción)
+    busqueda = models.GeneratedField(
+        expression=(
+            SearchVector('nombre', weight='A', config='spanish') +
+            SearchVector('descripcion', weight='B', config='spanish')
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha_creacion', 'id']),
+            GinIndex(fields=['busqueda'], name='producto_busqueda_gin'),
+            GinIndex(fields=['nombre'], opclasses=['gin_trgm_ops'], name='producto_nombre_trgm'),
+        ]
 
 class Categoria(models.Model):
     nombre = models.CharField(max_length=100)
@@ -16,6 +42,35 @@ class Categoria(models.Model):
     activo = models.BooleanField(default=True)
     id_padre = models.ForeignKey('self', null=True, blank=True, on_delete=models.CASCADE, related_name='subcategorias')
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    # Ruta materializada con los ids de los ancestros y el propio: "/1/4/9/".
+    # Los descendientes de una categoría son las filas con ruta__startswith=ruta
+    ruta = models.CharField(max_length=255, default='', editable=False, db_index=True)
+
+    def calcular_ruta(self):
+        """Ruta a partir de la ruta guardada del padre"""
+        if self.id_padre_id is None:
+            return f'/{self.pk}/'
+        ruta_padre = Categoria.objects.filter(pk=self.id_padre_id).values_list('ruta', flat=True).first()
+        return f'{ruta_padre}{self.pk}/'
+
+    def es_descendiente_de(self, otra):
+        """True si esta categoría está dentro del subárbol de `otra` (incluida ella misma)"""
+        return bool(otra.ruta) and self.ruta.startswith(otra.ruta)
+
+    def save(self, *args, **kwargs):
+        ruta_anterior = self.ruta
+        super().save(*args, **kwargs)
+        ruta = self.calcular_ruta()
+        if ruta == ruta_anterior:
+            return
+        Categoria.objects.filter(pk=self.pk).update(ruta=ruta)
+        self.ruta = ruta
+        if ruta_anterior:
+            # Categoría movida: se reescribe el prefijo de todo el subárbol en un solo UPDATE
+            Categoria.objects.filter(ruta__startswith=ruta_anterior).exclude(pk=self.pk).update(
+                ruta=Concat(Value(ruta), Substr('ruta', len(ruta_anterior) + 1), output_field=models.CharField())
+            )
 
 class ProductoCategoria(models.Model):
     producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
@@ -27,6 +82,70 @@ class ProductoCategoria(models.Model):
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.IntegerField()
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha_creacion', 'id']),
+            # Filtros y facetas de la tienda
+            models.Index(fields=['categoria', 'precio_unitario']),
+            models.Index(fields=['color', 'talla']),
+            models.Index(fields=['precio_unitario']),
+        ]
+
+class MovimientoStock(models.Model):
+    """
+    Libro de movimientos de stock de una variante: solo se insertan filas. Cada
+    movimiento se escribe en la misma transacción que el UPDATE del stock
+    (app_productos/stock.py), así el stock es siempre la suma de sus movimientos.
+    """
+    ENTRADA = 'entrada'
+    VENTA = 'venta'
+    AJUSTE = 'ajuste'
+    DEVOLUCION = 'devolucion'
+    TIPOS = [
+        (ENTRADA, 'Entrada'),
+        (VENTA, 'Venta'),
+        (AJUSTE, 'Ajuste'),
+        (DEVOLUCION, 'Devolución'),
+    ]
+
+    variante = models.ForeignKey(ProductoCategoria, on_delete=models.CASCADE, related_name='movimientos')
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    cantidad = models.IntegerField()  # con signo: negativa en ventas y ajustes a la baja
+    stock_resultante = models.IntegerField()
+    motivo = models.CharField(max_length=200, blank=True, default='')
+    usuario = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['variante', 'fecha']),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Los movimientos de stock no se modifican: registrar un ajuste')
+        super().save(*args, **kwargs)
+
+class SnapshotStock(models.Model):
+    """
+    Stock de una variante en un instante (`python manage.py snapshot_stock`):
+    el stock en una fecha es el último snapshot anterior más los movimientos
+    posteriores, sin recorrer todo el libro.
+    """
+    variante = models.ForeignKey(ProductoCategoria, on_delete=models.CASCADE, related_name='snapshots_stock')
+    fecha = models.DateTimeField()
+    stock = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['variante', 'fecha'], name='snapshot_stock_unico'),
+        ]
+        indexes = [
+            # Fecha de la última ejecución de snapshot_stock
+            models.Index(fields=['fecha']),
+        ]
 
 class reseña(models.Model):
     calificacion = models.IntegerField()
@@ -35,11 +154,108 @@ class reseña(models.Model):
     Producto_categoria = models.ForeignKey(ProductoCategoria, on_delete=models.CASCADE)
     Cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['fecha_reseña', 'id']),
+        ]
+
+class CalificacionResumen(models.Model):
+    """
+    Suma y número de calificaciones ya acumulados, para leer el promedio sin
+    recorrer las reseñas. Las señales de `reseña` los actualizan con F()
+    (app_productos/signals.py).
+    """
+    suma = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    # Último cambio (las señales lo fijan en el UPDATE): entra en el ETag del detalle
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def promedio(self):
+        return round(Decimal(self.suma) / self.total, 2) if self.total else Decimal('0.00')
+
+class CalificacionVariante(CalificacionResumen):
+    variante = models.OneToOneField(
+        ProductoCategoria, primary_key=True, on_delete=models.CASCADE, related_name='calificacion'
+    )
+
+class CalificacionProducto(CalificacionResumen):
+    producto = models.OneToOneField(
+        Producto, primary_key=True, on_delete=models.CASCADE, related_name='calificacion'
+    )
+
+class PuntajeProducto(models.Model):
+    """
+    Puntaje de popularidad para los destacados (ventas recientes, calificación
+    y antigüedad). Lo recalcula `python manage.py actualizar_destacados`; la
+    portada solo lee los primeros por el índice de `puntaje`.
+    """
+    producto = models.OneToOneField(Producto, primary_key=True, on_delete=models.CASCADE, related_name='puntaje')
+    ventas_recientes = models.IntegerField(default=0)
+    calificacion = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    puntaje = models.FloatField(default=0)
+    # Inicio del cálculo que escribió la fila: el siguiente cálculo incremental parte de aquí
+    actualizado = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-puntaje', 'producto'], name='puntaje_destacados'),
+        ]
+
+class ImagenBlob(models.Model):
+    """
+    Contenido de imagen guardado una sola vez en el storage, identificado por su
+    SHA-256 (app_productos/blobs.py). Las Imagen_Producto con el mismo archivo
+    apuntan aquí y comparten sus versiones; `referencias` cuenta cuántas lo usan
+    y al llegar a 0 se borran la fila y los archivos.
+    """
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    nombre = models.CharField(max_length=255)  # clave del original en el storage
+    tamano = models.PositiveBigIntegerField()
+    versiones = models.JSONField(default=dict, blank=True)
+    referencias = models.IntegerField(default=0)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
 class Imagen_Producto(models.Model):
     imagen = models.ImageField(upload_to='productos/' , null=True, blank=True)
     texto = models.CharField(max_length=200)
     es_principal = models.BooleanField(default=False)
     Producto_categoria = models.ForeignKey(ProductoCategoria, on_delete=models.CASCADE)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    # Tamaño del original y versiones redimensionadas (app_productos/imagenes.py):
+    # {"thumb": {"webp": clave, "jpeg": clave, "ancho": 160, "alto": 120}, "card": {...}, "detail": {...}}
+    ancho = models.PositiveIntegerField(null=True, blank=True)
+    alto = models.PositiveIntegerField(null=True, blank=True)
+    versiones = models.JSONField(default=dict, blank=True)
+    # Metadatos del original, guardados al subirlo para no consultar el storage al mostrarlo
+    tamano = models.PositiveBigIntegerField(null=True, blank=True)  # bytes
+    content_type = models.CharField(max_length=100, blank=True, default='')
+    sha256 = models.CharField(max_length=64, blank=True, default='')
+    # Contenido deduplicado; nulo en imágenes que aún no se registraron (subida directa o anteriores)
+    blob = models.ForeignKey(ImagenBlob, null=True, blank=True, on_delete=models.PROTECT, related_name='imagenes')
+    # Clave firmada de la subida directa que la registró: confirmar otra vez devuelve esta fila
+    # aunque `imagen` ya apunte al blob deduplicado
+    clave_subida = models.CharField(max_length=255, null=True, blank=True, unique=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        """
+        El blob se adquiere en pre_save (signals.imagen_por_guardar): si el guardado
+        falla, la referencia sumada se deshace con la transacción y el archivo que
+        se acaba de subir se borra del storage
+        """
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+        except Exception:
+            subido = getattr(self, '_archivo_subido', None)
+            if subido:
+                self._archivo_subido = None
+                self.imagen.storage.delete(subido)
+            raise
+        self._archivo_subido = None
 
 class item_pedido(models.Model):
     Producto_variante = models.ForeignKey(ProductoCategoria, on_delete=models.CASCADE)
@@ -57,6 +273,62 @@ class Inventario (models.Model):
     stock_maximo = models.IntegerField()
     ubicacion_almacen = models.CharField(max_length=100)
     ultima_actualizacion = models.DateTimeField(auto_now=True)
-    Producto_id = models.ForeignKey(Producto, on_delete=models.CASCADE) 
+    Producto_id = models.ForeignKey(Producto, on_delete=models.CASCADE)
+
+class MovimientoInventario(models.Model):
+    """
+    Libro de cambios de Inventario.cantidad_entradas: solo se insertan filas, en
+    la misma transacción que el UPDATE (app_productos/stock.py), como MovimientoStock.
+    """
+    TIPOS = [
+        (MovimientoStock.ENTRADA, 'Entrada'),
+        (MovimientoStock.AJUSTE, 'Ajuste'),
+    ]
+
+    inventario = models.ForeignKey(Inventario, on_delete=models.CASCADE, related_name='movimientos')
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    cantidad = models.IntegerField()  # con signo: negativa en ajustes a la baja
+    cantidad_resultante = models.IntegerField()
+    motivo = models.CharField(max_length=200, blank=True, default='')
+    usuario = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    fecha = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['inventario', 'fecha']),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Los movimientos de inventario no se modifican: registrar un ajuste')
+        super().save(*args, **kwargs)
+
+class CatalogoProducto(models.Model):
+    """
+    Modelo de lectura del catálogo: una fila por producto con variantes,
+    categorías, precios, stock y calificación ya calculados.
+    Se mantiene con señales (app_productos/signals.py) y se reconstruye
+    con `python manage.py reconstruir_catalogo`.
+    """
+    producto = models.OneToOneField(Producto, primary_key=True, on_delete=models.CASCADE, related_name='catalogo')
+    nombre = models.CharField(max_length=100)
+    descripcion = models.TextField()
+    activo = models.BooleanField(default=True)
+    fecha_creacion = models.DateTimeField()
+    peso = models.DecimalField(max_digits=10, decimal_places=2)
+    variantes = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    categorias = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    imagen_principal = models.CharField(max_length=500, null=True, blank=True)
+    precio_min = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    precio_max = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    stock_total = models.IntegerField(default=0)
+    calificacion_promedio = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    total_reseñas = models.IntegerField(default=0)
+    actualizado = models.DateTimeField(auto_now=True)
 
-    
\ No newline at end of file
+    class Meta:
+        indexes = [
+            models.Index(fields=['activo', 'fecha_creacion', 'producto']),
+            # Cubre el filtro ?nombre= (icontains se traduce a UPPER(nombre) LIKE ...)
+            GinIndex(OpClass(Upper('nombre'), name='gin_trgm_ops'), name='catalogo_nombre_trgm'),
+        ]
@@ -0,0 +1,134 @@
+"""
+Paginación por cursor (keyset) para los listados del catálogo
+"""
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+from rest_framework.response import Response
+
+
+class CatalogoCursorPagination(CursorPagination):
+    """
+    Paginación por cursor sobre todas las columnas del orden, por defecto
+    (fecha_creacion, id).
+
+    El cursor guarda los valores de esas columnas en la última fila de la página
+    y la siguiente se pide con un WHERE (fecha_creacion < x OR (fecha_creacion = x
+    AND id < y)) en lugar de un OFFSET, así la página 500 cuesta lo mismo que la
+    primera. CursorPagination de DRF solo compara la primera columna y resuelve
+    los empates con un OFFSET; aquí el orden termina en una columna única y no
+    hay empates. La vista puede cambiar el orden con el atributo `cursor_ordering`.
+    """
+    ordering = ('-fecha_creacion', '-id')
+    page_size = getattr(settings, 'CATALOGO_PAGE_SIZE', 24)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'CATALOGO_MAX_PAGE_SIZE', 100)
+
+    def get_ordering(self, request, queryset, view):
+        """Usar el orden declarado en la vista o el orden por defecto"""
+        return tuple(getattr(view, 'cursor_ordering', self.ordering))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Como CursorPagination.paginate_queryset, filtrando por todas las columnas del cursor"""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.total = queryset  # se cuenta al armar la respuesta, solo en la primera página
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if current_position is not None:
+            queryset = self.filtrar_posicion(queryset, current_position, reverse)
+
+        # Una fila de más para saber si hay página siguiente
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = list(results[:self.page_size])
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def filtrar_posicion(self, queryset, posicion, reverse):
+        """Filas que van después de `posicion` (valores de las columnas del orden) en el sentido pedido"""
+        try:
+            valores = json.loads(posicion)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(valores, list) or len(valores) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        condicion = Q()
+        iguales = {}
+        for orden, valor in zip(self.ordering, valores):
+            campo = orden.lstrip('-')
+            operador = 'lt' if orden.startswith('-') != reverse else 'gt'
+            condicion |= Q(**iguales, **{f'{campo}__{operador}': valor})
+            iguales[campo] = valor
+        # La primera columna también acotada sola: el índice recorre solo ese rango
+        primera = self.ordering[0]
+        operador = 'lte' if primera.startswith('-') != reverse else 'gte'
+        try:
+            return queryset.filter(condicion, **{f'{primera.lstrip("-")}__{operador}': valores[0]})
+        except (ValidationError, ValueError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _get_position_from_instance(self, instance, ordering):
+        """Valores de todas las columnas del orden (las FK por su id), como JSON"""
+        valores = [
+            instance[orden.lstrip('-')] if isinstance(instance, dict)
+            else instance.serializable_value(orden.lstrip('-'))
+            for orden in ordering
+        ]
+        return json.dumps([None if valor is None else str(valor) for valor in valores])
+
+    def get_paginated_response(self, data, clave='results'):
+        """
+        Respuesta con el formato {'success', 'count', ...} del resto de la API.
+        count es el total y solo se calcula en la primera página (sin cursor): en las
+        siguientes es None, para no repetir un COUNT(*) del listado completo por página.
+        """
+        return Response({
+            'success': True,
+            'count': self.total.count() if self.cursor is None else None,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            clave: data
+        })
@@ -1,10 +1,20 @@
+import logging
+
 from rest_framework import serializers
+from django.db.models import Prefetch
 from .models import (
     Producto, Categoria, ProductoCategoria, reseña, 
-    Imagen_Producto, item_pedido, item_compras, Inventario
+    Imagen_Producto, item_pedido, item_compras, Inventario, CatalogoProducto, MovimientoStock,
+    MovimientoInventario
 )
 from app_Cliente.serializers import ClienteSerializer
 from app_compras.serializers import CompraSerializer
+from project_ecommerce.media import url_archivo
+from project_ecommerce.serializers import (
+    CamposDinamicosMixin, Seleccion, formato_decimal, formato_fecha_hora
+)
+
+logger = logging.getLogger(__name__)
 
 class CategoriaSerializer(serializers.ModelSerializer):
     """Serializer para categorías con subcategorías"""
@@ -16,8 +26,26 @@ class CategoriaSerializer(serializers.ModelSerializer):
     
     def get_subcategorias(self, obj):
         """Obtener subcategorías hijas"""
+        # Con el árbol ya cargado (context['hijos']) se anidan todos los niveles sin consultas
+        if 'hijos' in self.context:
+            subcategorias = self.context['hijos'].get(obj.id, [])
+            return CategoriaSerializer(subcategorias, many=True, context=self.context).data
         subcategorias = obj.subcategorias.filter(activo=True)
         return CategoriaBasicaSerializer(subcategorias, many=True).data
+    
+    def validate_id_padre(self, value):
+        """Evitar ciclos: una categoría no puede colgar de sí misma ni de un descendiente"""
+        if value and self.instance and value.es_descendiente_de(self.instance):
+            raise serializers.ValidationError("La categoría padre no puede ser la misma categoría ni una subcategoría suya")
+        return value
+    
+    @staticmethod
+    def agrupar_hijos(categorias):
+        """Agrupar por padre una lista de categorías (p. ej. un subárbol cargado por ruta)"""
+        hijos = {}
+        for categoria in sorted(categorias, key=lambda categoria: categoria.id):
+            hijos.setdefault(categoria.id_padre_id, []).append(categoria)
+        return hijos
 
 class CategoriaBasicaSerializer(serializers.ModelSerializer):
     """Serializer básico para categorías (evitar recursión infinita)"""
@@ -25,19 +53,45 @@ class CategoriaBasicaSerializer(serializers.ModelSerializer):
         model = Categoria
         fields = ['id', 'nombre', 'descripcion', 'activo']
 
+def urls_versiones(imagen):
+    """Versiones redimensionadas con URLs en lugar de claves del storage"""
+    return {
+        version: {clave: url_archivo(valor) if isinstance(valor, str) else valor for clave, valor in datos.items()}
+        for version, datos in imagen.versiones.items()
+    }
+
+class ImagenUrlField(serializers.ImageField):
+    """ImageField que arma la URL con url_archivo en lugar de pedírsela al storage"""
+    def to_representation(self, value):
+        if not value:
+            return None
+        url = url_archivo(value.name)
+        request = self.context.get('request', None)
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
 class ImagenProductoSerializer(serializers.ModelSerializer):
     """Serializer para imágenes de productos"""
+    imagen = ImagenUrlField(max_length=100, required=False, allow_null=True)
     imagen_url = serializers.SerializerMethodField()
+    versiones = serializers.SerializerMethodField()
     
     class Meta:
         model = Imagen_Producto
-        fields = ['id', 'imagen', 'imagen_url', 'texto', 'es_principal', 'Producto_categoria']
+        fields = [
+            'id', 'imagen', 'imagen_url', 'texto', 'es_principal', 'Producto_categoria',
+            'ancho', 'alto', 'versiones'
+        ]
+        read_only_fields = ['ancho', 'alto']
     
     def get_imagen_url(self, obj):
         """Obtener URL completa de la imagen en S3"""
-        if obj.imagen:
-            return obj.imagen.url
-        return None
+        return url_archivo(obj.imagen.name)
+    
+    def get_versiones(self, obj):
+        """thumb / card / detail en WebP y JPEG; vacío hasta que se generen (app_productos/imagenes.py)"""
+        return urls_versiones(obj)
 
 class ProductoBasicoSerializer(serializers.ModelSerializer):
     """Serializer básico para productos"""
@@ -45,8 +99,8 @@ class ProductoBasicoSerializer(serializers.ModelSerializer):
         model = Producto
         fields = ['id', 'nombre', 'descripcion', 'activo', 'fecha_creacion', 'peso']
 
-class ProductoCategoriaSerializer(serializers.ModelSerializer):
-    """Serializer completo para variantes de productos"""
+class ProductoCategoriaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    """Serializer completo para variantes de productos (admite ?fields= y ?expand=)"""
     producto_info = ProductoBasicoSerializer(source='producto', read_only=True)
     categoria_info = CategoriaBasicaSerializer(source='categoria', read_only=True)
     imagenes = serializers.SerializerMethodField()
@@ -59,30 +113,109 @@ class ProductoCategoriaSerializer(serializers.ModelSerializer):
             'precio_variante', 'precio_unitario', 'stock', 'fecha_creacion',
             'producto_info', 'categoria_info', 'imagenes', 'imagen_principal'
         ]
+        expandibles = ['producto_info', 'categoria_info', 'imagenes']
+    
+    @staticmethod
+    def preparar_queryset(queryset, seleccion=None):
+        """
+        Cargar producto, categoría e imágenes de todas las variantes en consultas fijas.
+        Con una selección (?fields= / ?expand=) solo se carga lo que se va a mostrar.
+        """
+        seleccion = seleccion or Seleccion()
+        relacionados = [
+            relacion for relacion, campo in (('producto', 'producto_info'), ('categoria', 'categoria_info'))
+            if seleccion.incluye(campo, expandible=True)
+        ]
+        if relacionados:
+            queryset = queryset.select_related(*relacionados)
+        if seleccion.incluye('imagenes', expandible=True) or seleccion.incluye('imagen_principal'):
+            queryset = queryset.prefetch_related(
+                Prefetch('imagen_producto_set', queryset=Imagen_Producto.objects.order_by('id'))
+            )
+        return queryset
     
     def get_imagenes(self, obj):
         """Obtener todas las imágenes del producto"""
-        imagenes = Imagen_Producto.objects.filter(Producto_categoria=obj)
+        imagenes = obj.imagen_producto_set.all()
         return ImagenProductoSerializer(imagenes, many=True).data
     
     def get_imagen_principal(self, obj):
         """Obtener la imagen principal del producto"""
-        imagen_principal = Imagen_Producto.objects.filter(
-            Producto_categoria=obj, 
-            es_principal=True
-        ).first()
+        # Se recorre la lista (prefetch) en lugar de lanzar otra consulta
+        principales = [imagen for imagen in obj.imagen_producto_set.all() if imagen.es_principal]
+        imagen_principal = min(principales, key=lambda imagen: imagen.id, default=None)
         if imagen_principal:
             return ImagenProductoSerializer(imagen_principal).data
         return None
 
-class ProductoCategoriaCreateSerializer(serializers.ModelSerializer):
-    """Serializer para crear/actualizar variantes de productos"""
-    class Meta:
-        model = ProductoCategoria
-        fields = [
-            'producto', 'categoria', 'color', 'talla', 'capacidad',
-            'precio_variante', 'precio_unitario', 'stock'
-        ]
+def _imagen_rapida(imagen):
+    """Mismo dict que ImagenProductoSerializer (la URL se calcula una sola vez)"""
+    url = url_archivo(imagen.imagen.name)
+    return {
+        'id': imagen.id,
+        'imagen': url,
+        'imagen_url': url,
+        'texto': imagen.texto,
+        'es_principal': imagen.es_principal,
+        'Producto_categoria': imagen.Producto_categoria_id,
+        'ancho': imagen.ancho,
+        'alto': imagen.alto,
+        'versiones': urls_versiones(imagen),
+    }
+
+def serializar_variantes(variantes):
+    """
+    Camino rápido de ProductoCategoriaSerializer(variantes, many=True).data para
+    listados de solo lectura: mismo JSON byte a byte, construido con dicts.
+    Las variantes deben venir de ProductoCategoriaSerializer.preparar_queryset.
+    """
+    productos = {}
+    categorias = {}
+    resultado = []
+    for variante in variantes:
+        producto = variante.producto
+        if producto.id not in productos:
+            productos[producto.id] = {
+                'id': producto.id,
+                'nombre': producto.nombre,
+                'descripcion': producto.descripcion,
+                'activo': producto.activo,
+                'fecha_creacion': formato_fecha_hora(producto.fecha_creacion),
+                'peso': formato_decimal(producto.peso),
+            }
+        categoria = variante.categoria
+        if categoria.id not in categorias:
+            categorias[categoria.id] = {
+                'id': categoria.id,
+                'nombre': categoria.nombre,
+                'descripcion': categoria.descripcion,
+                'activo': categoria.activo,
+            }
+        imagenes = list(variante.imagen_producto_set.all())
+        principal = min(
+            (imagen for imagen in imagenes if imagen.es_principal),
+            key=lambda imagen: imagen.id, default=None
+        )
+        resultado.append({
+            'id': variante.id,
+            'producto': variante.producto_id,
+            'categoria': variante.categoria_id,
+            'color': variante.color,
+            'talla': variante.talla,
+            'capacidad': variante.capacidad,
+            'precio_variante': formato_decimal(variante.precio_variante),
+            'precio_unitario': formato_decimal(variante.precio_unitario),
+            'stock': variante.stock,
+            'fecha_creacion': formato_fecha_hora(variante.fecha_creacion),
+            'producto_info': productos[producto.id],
+            'categoria_info': categorias[categoria.id],
+            'imagenes': [_imagen_rapida(imagen) for imagen in imagenes],
+            'imagen_principal': _imagen_rapida(principal) if principal else None,
+        })
+    return resultado
+
+class ReglasVarianteMixin:
+    """Validaciones de precio y stock de una variante (alta, edición, lote e importación)"""
     
     def validate_precio_variante(self, value):
         if value < 0:
@@ -99,6 +232,51 @@ class ProductoCategoriaCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("El stock no puede ser negativo")
         return value
 
+class ProductoCategoriaCreateSerializer(ReglasVarianteMixin, serializers.ModelSerializer):
+    """Serializer para crear/actualizar variantes de productos"""
+    class Meta:
+        model = ProductoCategoria
+        fields = [
+            'producto', 'categoria', 'color', 'talla', 'capacidad',
+            'precio_variante', 'precio_unitario', 'stock'
+        ]
+
+class RelacionPrecargada(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField que busca primero en `context['precargados'][modelo]`
+    (dict id -> objeto cargado de una vez para todo el lote). Si no está, valida
+    como siempre (consulta y mensajes de error de DRF).
+    """
+
+    def to_internal_value(self, data):
+        precargados = self.context.get('precargados', {}).get(self.queryset.model, {})
+        try:
+            return precargados[int(data)]
+        except (KeyError, TypeError, ValueError):
+            return super().to_internal_value(data)
+
+class ProductoCategoriaMasivoSerializer(ProductoCategoriaCreateSerializer):
+    """Mismas reglas que ProductoCategoriaCreateSerializer, para validar lotes de variantes"""
+    producto = RelacionPrecargada(queryset=Producto.objects.all())
+    categoria = RelacionPrecargada(queryset=Categoria.objects.all())
+
+    @staticmethod
+    def precargar(filas):
+        """Variantes a actualizar, productos y categorías del lote: una consulta por modelo"""
+        def ids(campo):
+            valores = set()
+            for fila in filas:
+                try:
+                    valores.add(int(fila[campo]))
+                except (KeyError, TypeError, ValueError):
+                    pass
+            return valores
+        return {
+            ProductoCategoria: ProductoCategoria.objects.in_bulk(ids('id')),
+            Producto: Producto.objects.in_bulk(ids('producto')),
+            Categoria: Categoria.objects.in_bulk(ids('categoria')),
+        }
+
 class ReseñaSerializer(serializers.ModelSerializer):
     """Serializer para reseñas de productos"""
     cliente_info = ClienteSerializer(source='Cliente', read_only=True)
@@ -127,8 +305,8 @@ class ReseñaCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("La calificación debe estar entre 1 y 5")
         return value
 
-class ProductoCompletoSerializer(serializers.ModelSerializer):
-    """Serializer completo para productos con todas sus variantes"""
+class ProductoCompletoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    """Serializer completo para productos con todas sus variantes (admite ?fields= y ?expand=)"""
     variantes = serializers.SerializerMethodField()
     categorias = serializers.SerializerMethodField()
     
@@ -138,30 +316,72 @@ class ProductoCompletoSerializer(serializers.ModelSerializer):
             'id', 'nombre', 'descripcion', 'activo', 'fecha_creacion', 
             'peso', 'variantes', 'categorias'
         ]
+        expandibles = ['variantes', 'categorias']
+    
+    @staticmethod
+    def preparar_queryset(queryset, seleccion=None):
+        """
+        Plan de consultas del catálogo: productos, variantes (con su categoría)
+        e imágenes en 3 consultas, sin importar el tamaño del catálogo.
+        Sin variantes ni categorías en la selección no se consulta nada más.
+        """
+        seleccion = seleccion or Seleccion()
+        con_variantes = seleccion.incluye('variantes', expandible=True)
+        con_categorias = seleccion.incluye('categorias', expandible=True)
+        if not (con_variantes or con_categorias):
+            return queryset
+        
+        variantes = ProductoCategoria.objects.order_by('id')
+        if con_variantes:
+            variantes = ProductoCategoriaSerializer.preparar_queryset(variantes, seleccion.hijo('variantes'))
+        if con_categorias:
+            variantes = variantes.select_related('categoria')
+        return queryset.prefetch_related(
+            Prefetch('productocategoria_set', queryset=variantes)
+        )
     
     def get_variantes(self, obj):
         """Obtener todas las variantes del producto"""
-        variantes = ProductoCategoria.objects.filter(producto=obj)
-        print(f"🎨 Serializando variantes para {obj.nombre}: {variantes.count()} variantes")
-        
-        serialized_data = ProductoCategoriaSerializer(variantes, many=True).data
+        variantes = obj.productocategoria_set.all()
+        seleccion = self.seleccion.hijo('variantes')
+        if seleccion.completa:
+            serialized_data = serializar_variantes(variantes)
+        else:
+            serialized_data = ProductoCategoriaSerializer(variantes, many=True, seleccion=seleccion).data
         
-        # Debug de imágenes
-        for i, variante_data in enumerate(serialized_data):
-            imagenes = variante_data.get('imagenes', [])
-            print(f"   Variante {i+1}: {len(imagenes)} imágenes")
-            for j, img in enumerate(imagenes):
-                print(f"     Imagen {j+1}: {img.get('imagen_url', 'Sin URL')}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Variantes serializadas', extra={
+                'producto': obj.id,
+                'variantes': len(serialized_data),
+            })
         
         return serialized_data
     
     def get_categorias(self, obj):
         """Obtener todas las categorías del producto"""
-        categorias = Categoria.objects.filter(
-            productocategoria__producto=obj
-        ).distinct()
+        # Las categorías salen de las variantes ya cargadas (select_related)
+        categorias = {
+            variante.categoria_id: variante.categoria
+            for variante in obj.productocategoria_set.all()
+        }
+        categorias = [categorias[categoria_id] for categoria_id in sorted(categorias)]
         return CategoriaBasicaSerializer(categorias, many=True).data
 
+class CatalogoProductoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    """Serializer de lectura del catálogo desnormalizado (una fila por producto, admite ?fields= y ?expand=)"""
+    id = serializers.IntegerField(source='producto_id', read_only=True)
+    
+    class Meta:
+        model = CatalogoProducto
+        fields = [
+            'id', 'nombre', 'descripcion', 'activo', 'fecha_creacion', 'peso',
+            'variantes', 'categorias', 'imagen_principal', 'precio_min', 'precio_max',
+            'stock_total', 'calificacion_promedio', 'total_reseñas'
+        ]
+        expandibles = ['variantes', 'categorias']
+        # Las variantes guardadas en JSON se podan con las mismas reglas que ProductoCategoriaSerializer
+        expandibles_anidados = {'variantes': ProductoCategoriaSerializer.Meta.expandibles}
+
 class ItemPedidoSerializer(serializers.ModelSerializer):
     """Serializer para items de pedido"""
     producto_info = ProductoCategoriaSerializer(source='Producto_variante', read_only=True)
@@ -189,17 +409,8 @@ class ItemComprasSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("La cantidad debe ser mayor a 0")
         return value
 
-class InventarioSerializer(serializers.ModelSerializer):
-    """Serializer para inventario de productos"""
-    producto_info = ProductoBasicoSerializer(source='Producto_id', read_only=True)
-    
-    class Meta:
-        model = Inventario
-        fields = [
-            'id', 'cantidad_entradas', 'stock_minimo', 'stock_maximo',
-            'ubicacion_almacen', 'ultima_actualizacion', 'Producto_id', 'producto_info'
-        ]
-        read_only_fields = ['ultima_actualizacion']
+class ReglasInventarioMixin:
+    """Validaciones del inventario (CRUD e importación)"""
     
     def validate_cantidad_entradas(self, value):
         if value < 0:
@@ -228,4 +439,69 @@ class InventarioSerializer(serializers.ModelSerializer):
         
         return data
 
+class InventarioSerializer(ReglasInventarioMixin, serializers.ModelSerializer):
+    """Serializer para inventario de productos"""
+    producto_info = ProductoBasicoSerializer(source='Producto_id', read_only=True)
+    
+    class Meta:
+        model = Inventario
+        fields = [
+            'id', 'cantidad_entradas', 'stock_minimo', 'stock_maximo',
+            'ubicacion_almacen', 'ultima_actualizacion', 'Producto_id', 'producto_info'
+        ]
+        read_only_fields = ['ultima_actualizacion']
+
+class MovimientoStockSerializer(serializers.ModelSerializer):
+    """Movimiento del libro de stock; al registrar solo se envían tipo, cantidad y motivo"""
+    class Meta:
+        model = MovimientoStock
+        fields = ['id', 'variante', 'tipo', 'cantidad', 'stock_resultante', 'motivo', 'usuario', 'fecha']
+        read_only_fields = ['variante', 'stock_resultante', 'usuario', 'fecha']
+    
+    def validate(self, data):
+        """Entrada, venta y devolución llevan una cantidad positiva; el ajuste, con signo y distinta de 0"""
+        if data['tipo'] == MovimientoStock.AJUSTE:
+            if data['cantidad'] == 0:
+                raise serializers.ValidationError({'cantidad': 'El ajuste no puede ser 0'})
+        elif data['cantidad'] <= 0:
+            raise serializers.ValidationError({'cantidad': 'La cantidad debe ser mayor a 0'})
+        return data
+
+class MovimientoInventarioSerializer(serializers.ModelSerializer):
+    """Movimiento del libro de Inventario.cantidad_entradas; al registrar se envían tipo, cantidad y motivo"""
+    class Meta:
+        model = MovimientoInventario
+        fields = ['id', 'inventario', 'tipo', 'cantidad', 'cantidad_resultante', 'motivo', 'usuario', 'fecha']
+        read_only_fields = ['inventario', 'cantidad_resultante', 'usuario', 'fecha']
+    
+    def validate(self, data):
+        """La entrada lleva una cantidad positiva; el ajuste, con signo y distinta de 0"""
+        if data['tipo'] == MovimientoStock.AJUSTE:
+            if data['cantidad'] == 0:
+                raise serializers.ValidationError({'cantidad': 'El ajuste no puede ser 0'})
+        elif data['cantidad'] <= 0:
+            raise serializers.ValidationError({'cantidad': 'La cantidad debe ser mayor a 0'})
+        return data
+
+class FilaImportacionSerializer(ReglasVarianteMixin, ReglasInventarioMixin, serializers.Serializer):
+    """
+    Una fila del archivo de importación: producto + variante y, opcionalmente,
+    el inventario del producto (si trae `ubicacion_almacen`). Productos y
+    categorías se identifican por nombre.
+    """
+    producto = serializers.CharField(max_length=100)
+    descripcion = serializers.CharField(allow_blank=True, default='')
+    peso = serializers.DecimalField(max_digits=10, decimal_places=2)
+    categoria = serializers.CharField(max_length=100)
+    color = serializers.CharField(max_length=50)
+    talla = serializers.CharField(max_length=50)
+    capacidad = serializers.CharField(max_length=50, allow_blank=True, allow_null=True, default=None)
+    precio_variante = serializers.DecimalField(max_digits=10, decimal_places=2)
+    precio_unitario = serializers.DecimalField(max_digits=10, decimal_places=2)
+    stock = serializers.IntegerField()
+    ubicacion_almacen = serializers.CharField(max_length=100, required=False)
+    cantidad_entradas = serializers.IntegerField(default=0)
+    stock_minimo = serializers.IntegerField(default=0)
+    stock_maximo = serializers.IntegerField(default=0)
+
 
@@ -0,0 +1,203 @@
+"""
+Señales que mantienen el catálogo desnormalizado (CatalogoProducto),
+los resúmenes de calificaciones y la versión de la caché de respuestas del catálogo
+"""
+import threading
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from PIL import UnidentifiedImageError
+
+from .blobs import adquirir_blob, liberar_blob
+from .cache import invalidar_catalogo
+from .catalogo import actualizar_catalogo
+from .imagenes import leer_metadatos, programar_versiones
+from .models import (
+    Producto, Categoria, ProductoCategoria, Imagen_Producto, ImagenBlob, reseña,
+    CalificacionVariante, CalificacionProducto
+)
+
+_pendientes = threading.local()
+
+
+def _estado():
+    if not hasattr(_pendientes, 'productos'):
+        _pendientes.productos = set()
+        _pendientes.variantes = set()
+        _pendientes.categorias = set()
+        _pendientes.invalidar = False
+    return _pendientes
+
+
+def programar_actualizacion(productos=(), variantes=(), categorias=()):
+    """
+    Acumular los productos afectados y recalcularlos al confirmar la transacción.
+    Varias escrituras sobre el mismo producto generan un solo recálculo.
+    Al final se invalida la caché de respuestas (después del recálculo, para
+    que ninguna petición guarde datos viejos con la versión nueva).
+    """
+    estado = _estado()
+    estado.invalidar = True
+    estado.productos.update(productos)
+    estado.variantes.update(variantes)
+    estado.categorias.update(categorias)
+    transaction.on_commit(_aplicar_pendientes)
+
+
+def _aplicar_pendientes():
+    estado = _estado()
+    if not estado.invalidar:
+        return
+    estado.invalidar = False
+    productos, variantes, categorias = estado.productos, estado.variantes, estado.categorias
+    estado.productos, estado.variantes, estado.categorias = set(), set(), set()
+
+    if variantes or categorias:
+        productos |= set(
+            ProductoCategoria.objects.filter(id__in=variantes).values_list('producto_id', flat=True)
+        )
+        productos |= set(
+            ProductoCategoria.objects.filter(categoria_id__in=categorias).values_list('producto_id', flat=True)
+        )
+    actualizar_catalogo(productos)
+    invalidar_catalogo()
+
+
+@receiver(post_save, sender=Producto)
+def producto_guardado(sender, instance, **kwargs):
+    programar_actualizacion(productos=[instance.pk])
+
+
+@receiver(post_delete, sender=Producto)
+def producto_eliminado(sender, instance, **kwargs):
+    # Su fila del catálogo se borra en cascada: solo falta invalidar la caché
+    programar_actualizacion()
+
+
+@receiver(post_save, sender=Categoria)
+def categoria_guardada(sender, instance, created, **kwargs):
+    # Una categoría nueva no tiene variantes: solo cambia el árbol de categorías
+    programar_actualizacion(categorias=[] if created else [instance.pk])
+
+
+@receiver(post_delete, sender=Categoria)
+def categoria_eliminada(sender, instance, **kwargs):
+    programar_actualizacion()
+
+
+@receiver([post_save, post_delete], sender=ProductoCategoria)
+def variante_modificada(sender, instance, **kwargs):
+    programar_actualizacion(productos=[instance.producto_id])
+
+
+@receiver([post_save, post_delete], sender=Imagen_Producto)
+def imagen_modificada(sender, instance, **kwargs):
+    programar_actualizacion(variantes=[instance.Producto_categoria_id])
+
+
+@receiver(pre_save, sender=Imagen_Producto)
+def imagen_por_guardar(sender, instance, **kwargs):
+    # Archivo y blob antes de editar: las versiones se regeneran solo si cambia
+    instance._imagen_anterior, instance._blob_anterior = (
+        Imagen_Producto.objects.filter(pk=instance.pk).values_list('imagen', 'blob_id').first()
+        if instance.pk else None
+    ) or (None, None)
+    if instance.imagen and not instance.imagen._committed:
+        # Archivo recién recibido: se leen sus metadatos en local y, si el contenido
+        # ya estaba guardado, se reutiliza en lugar de subirlo otra vez
+        try:
+            metadatos = leer_metadatos(instance.imagen.file)
+        except (UnidentifiedImageError, OSError):
+            return  # No es una imagen: los serializers con ImageField ya la rechazan
+        if metadatos['sha256'] == instance._blob_anterior:
+            # Mismo contenido que el actual: la imagen ya está contada en el blob
+            blob = ImagenBlob.objects.get(pk=instance._blob_anterior)
+        else:
+            blob = adquirir_blob(instance.imagen.file, metadatos)
+            if blob.referencias == 1:
+                # Blob creado por esta imagen: su archivo se borra si el guardado falla (Imagen_Producto.save)
+                instance._archivo_subido = blob.nombre
+        for campo, valor in metadatos.items():
+            setattr(instance, campo, valor)
+        instance.imagen = blob.nombre  # Ya está en el storage: FileField no lo vuelve a subir
+        instance.blob = blob
+        instance.versiones = blob.versiones
+
+
+@receiver(post_save, sender=Imagen_Producto)
+def imagen_guardada(sender, instance, **kwargs):
+    anterior = getattr(instance, '_blob_anterior', None)
+    if anterior and anterior != instance.blob_id:
+        liberar_blob(anterior)
+    cambio = instance.imagen and instance.imagen.name != getattr(instance, '_imagen_anterior', None)
+    if cambio and not instance.versiones:
+        programar_versiones(instance.pk)
+
+
+@receiver(post_delete, sender=ProductoCategoria)
+def variante_eliminada(sender, instance, **kwargs):
+    # Un hijo eliminado no deja fecha: se marca el padre para que cambie su ETag / Last-Modified
+    Producto.objects.filter(pk=instance.producto_id).update(fecha_actualizacion=timezone.now())
+
+
+@receiver(post_delete, sender=Imagen_Producto)
+def imagen_eliminada(sender, instance, **kwargs):
+    if instance.blob_id:
+        liberar_blob(instance.blob_id)
+    ProductoCategoria.objects.filter(pk=instance.Producto_categoria_id).update(fecha_actualizacion=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=reseña)
+def reseña_modificada(sender, instance, **kwargs):
+    programar_actualizacion(variantes=[instance.Producto_categoria_id])
+
+
+def acumular_calificacion(variante_id, suma, total):
+    """
+    Sumar `suma` y `total` a los resúmenes de la variante y de su producto con
+    UPDATE ... SET suma = suma + x (sin leer el valor anterior, así dos reseñas
+    simultáneas no se pisan). La fila se crea con la primera reseña.
+    """
+    producto_id = ProductoCategoria.objects.filter(pk=variante_id).values_list('producto_id', flat=True).first()
+    if producto_id is None:
+        # Variante ya eliminada (borrado en cascada): sus resúmenes se eliminan con ella
+        return
+    cambios = {'suma': F('suma') + suma, 'total': F('total') + total, 'actualizado': timezone.now()}
+    for modelo, filtro in (
+        (CalificacionVariante, {'variante_id': variante_id}),
+        (CalificacionProducto, {'producto_id': producto_id}),
+    ):
+        # Al restar no se crea la fila: si falta, es que se está borrando en cascada
+        if not modelo.objects.filter(**filtro).update(**cambios) and total >= 0:
+            modelo.objects.get_or_create(**filtro)
+            modelo.objects.filter(**filtro).update(**cambios)
+
+
+@receiver(pre_save, sender=reseña)
+def reseña_por_guardar(sender, instance, **kwargs):
+    # Valores guardados antes de editar, para restarlos del resumen
+    instance._calificacion_anterior = (
+        reseña.objects.filter(pk=instance.pk).values_list('Producto_categoria_id', 'calificacion').first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=reseña)
+def reseña_guardada(sender, instance, **kwargs):
+    anterior = getattr(instance, '_calificacion_anterior', None)
+    if anterior is None:
+        acumular_calificacion(instance.Producto_categoria_id, instance.calificacion, 1)
+    elif anterior[0] == instance.Producto_categoria_id:
+        if anterior[1] != instance.calificacion:
+            acumular_calificacion(instance.Producto_categoria_id, instance.calificacion - anterior[1], 0)
+    else:
+        acumular_calificacion(anterior[0], -anterior[1], -1)
+        acumular_calificacion(instance.Producto_categoria_id, instance.calificacion, 1)
+
+
+@receiver(post_delete, sender=reseña)
+def reseña_eliminada(sender, instance, **kwargs):
+    acumular_calificacion(instance.Producto_categoria_id, -instance.calificacion, -1)
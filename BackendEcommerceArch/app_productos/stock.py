@@ -0,0 +1,266 @@
+"""
+Movimientos de stock de las variantes (ProductoCategoria.stock).
+
+Cada cambio de stock se guarda como un MovimientoStock en la misma transacción
+que el UPDATE de la variante:
+- movimientos relativos (entrada, venta, devolución): UPDATE ... SET stock = stock + n,
+  sin leer antes el valor, así dos peticiones simultáneas no se pisan;
+- ajustes a un valor absoluto (edición de la variante, lote, importación):
+  SELECT ... FOR UPDATE de las filas y se registra la diferencia.
+Los SnapshotStock guardan el stock cada cierto tiempo para calcular el de una
+fecha pasada sin recorrer todo el libro.
+
+Inventario.cantidad_entradas sigue las mismas reglas con su propio libro
+(MovimientoInventario).
+"""
+from collections import defaultdict
+from datetime import timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import F, Max, Q, Sum
+from django.utils import timezone
+
+from .models import Inventario, MovimientoInventario, MovimientoStock, ProductoCategoria, SnapshotStock
+from .signals import programar_actualizacion
+
+# Signo de la cantidad según el tipo (el ajuste lleva el signo en la cantidad)
+SIGNOS = {
+    MovimientoStock.ENTRADA: 1,
+    MovimientoStock.DEVOLUCION: 1,
+    MovimientoStock.VENTA: -1,
+    MovimientoStock.AJUSTE: 1,
+}
+# Un snapshot se toma unos minutos en el pasado: un movimiento de una transacción
+# que todavía no confirmó no puede quedar antes del snapshot sin estar incluido
+MARGEN_SNAPSHOT = timedelta(minutes=5)
+
+
+class StockInsuficiente(Exception):
+    pass
+
+
+def registrar_movimiento(variante_id, tipo, cantidad, motivo='', usuario=None):
+    """
+    Sumar (entrada, devolución) o restar (venta) `cantidad` unidades, o sumar un
+    ajuste con signo. Falla con StockInsuficiente si el stock quedaría negativo.
+    Devuelve el movimiento.
+    """
+    if tipo not in SIGNOS:
+        raise ValueError(f'Tipo de movimiento no válido: {tipo}')
+    if tipo == MovimientoStock.AJUSTE and not cantidad:
+        raise ValueError('El ajuste no puede ser 0')
+    if tipo != MovimientoStock.AJUSTE and cantidad <= 0:
+        raise ValueError('La cantidad debe ser mayor a 0')
+    delta = SIGNOS[tipo] * cantidad
+
+    with transaction.atomic():
+        variantes = ProductoCategoria.objects.filter(pk=variante_id)
+        # La condición va en el mismo UPDATE: sin leer el stock antes no hay carrera
+        if not variantes.filter(stock__gte=-delta).update(stock=F('stock') + delta, fecha_actualizacion=timezone.now()):
+            if variantes.exists():
+                raise StockInsuficiente(f'Stock insuficiente para la variante {variante_id}')
+            raise ProductoCategoria.DoesNotExist(f'No existe la variante {variante_id}')
+        # La fila quedó bloqueada por el UPDATE hasta el final de la transacción
+        stock = variantes.values_list('stock', flat=True).get()
+        movimiento = MovimientoStock.objects.create(
+            variante_id=variante_id, tipo=tipo, cantidad=delta, stock_resultante=stock,
+            motivo=motivo, usuario=usuario
+        )
+        # update() no emite señales: catálogo y caché a mano
+        programar_actualizacion(variantes=[variante_id])
+    return movimiento
+
+
+def ajustar_stocks(stocks, motivo='', usuario=None):
+    """
+    Llevar cada variante al stock indicado ({id: stock}) registrando la diferencia
+    como ajuste. Las filas se bloquean en orden de id (sin interbloqueos entre
+    lotes). Devuelve los movimientos creados (las variantes sin cambio no generan ninguno).
+    """
+    if not stocks:
+        return []
+    # Sin savepoint propio: se usa dentro de transacciones más grandes (lote, importación)
+    with transaction.atomic(savepoint=False):
+        variantes = list(
+            ProductoCategoria.objects.select_for_update().filter(pk__in=stocks).only('id', 'stock').order_by('id')
+        )
+        ahora = timezone.now()
+        cambiadas, movimientos = [], []
+        for variante in variantes:
+            delta = stocks[variante.id] - variante.stock
+            if not delta:
+                continue
+            variante.stock = stocks[variante.id]
+            variante.fecha_actualizacion = ahora
+            cambiadas.append(variante)
+            movimientos.append(MovimientoStock(
+                variante_id=variante.id, tipo=MovimientoStock.AJUSTE, cantidad=delta,
+                stock_resultante=variante.stock, motivo=motivo, usuario=usuario, fecha=ahora
+            ))
+        ProductoCategoria.objects.bulk_update(cambiadas, ['stock', 'fecha_actualizacion'], batch_size=500)
+        MovimientoStock.objects.bulk_create(movimientos, batch_size=500)
+        if cambiadas:
+            programar_actualizacion(variantes=[variante.id for variante in cambiadas])
+    return movimientos
+
+
+def ajustar_stock(variante, stock, motivo='', usuario=None):
+    """ajustar_stocks para una variante; deja en `variante.stock` el valor guardado"""
+    movimientos = ajustar_stocks({variante.id: stock}, motivo, usuario)
+    variante.stock = stock
+    return movimientos[0] if movimientos else None
+
+
+def registrar_altas(variantes, motivo='Alta de la variante', usuario=None):
+    """Entrada inicial de variantes recién creadas con stock (el INSERT ya lo guardó)"""
+    ahora = timezone.now()
+    return MovimientoStock.objects.bulk_create([
+        MovimientoStock(
+            variante_id=variante.id, tipo=MovimientoStock.ENTRADA, cantidad=variante.stock,
+            stock_resultante=variante.stock, motivo=motivo, usuario=usuario, fecha=ahora
+        )
+        for variante in variantes if variante.stock
+    ], batch_size=500)
+
+
+def registrar_movimiento_inventario(inventario_id, tipo, cantidad, motivo='', usuario=None):
+    """
+    Sumar una entrada (`cantidad` > 0) o un ajuste con signo a la cantidad de
+    entradas del inventario. Falla con StockInsuficiente si quedaría negativa.
+    Devuelve el movimiento.
+    """
+    if tipo not in (MovimientoStock.ENTRADA, MovimientoStock.AJUSTE):
+        raise ValueError(f'Tipo de movimiento no válido: {tipo}')
+    if tipo == MovimientoStock.AJUSTE and not cantidad:
+        raise ValueError('El ajuste no puede ser 0')
+    if tipo == MovimientoStock.ENTRADA and cantidad <= 0:
+        raise ValueError('La cantidad debe ser mayor a 0')
+
+    with transaction.atomic():
+        inventarios = Inventario.objects.filter(pk=inventario_id)
+        if not inventarios.filter(cantidad_entradas__gte=-cantidad).update(
+            cantidad_entradas=F('cantidad_entradas') + cantidad, ultima_actualizacion=timezone.now()
+        ):
+            if inventarios.exists():
+                raise StockInsuficiente(f'Cantidad de entradas insuficiente en el inventario {inventario_id}')
+            raise Inventario.DoesNotExist(f'No existe el inventario {inventario_id}')
+        resultante = inventarios.values_list('cantidad_entradas', flat=True).get()
+        return MovimientoInventario.objects.create(
+            inventario_id=inventario_id, tipo=tipo, cantidad=cantidad, cantidad_resultante=resultante,
+            motivo=motivo, usuario=usuario
+        )
+
+
+def ajustar_entradas(cantidades, motivo='', usuario=None):
+    """
+    ajustar_stocks para Inventario.cantidad_entradas ({id: cantidad}): filas
+    bloqueadas en orden de id y la diferencia registrada como ajuste.
+    """
+    if not cantidades:
+        return []
+    with transaction.atomic(savepoint=False):
+        inventarios = list(
+            Inventario.objects.select_for_update().filter(pk__in=cantidades)
+            .only('id', 'cantidad_entradas').order_by('id')
+        )
+        ahora = timezone.now()
+        cambiados, movimientos = [], []
+        for inventario in inventarios:
+            delta = cantidades[inventario.id] - inventario.cantidad_entradas
+            if not delta:
+                continue
+            inventario.cantidad_entradas = cantidades[inventario.id]
+            inventario.ultima_actualizacion = ahora
+            cambiados.append(inventario)
+            movimientos.append(MovimientoInventario(
+                inventario_id=inventario.id, tipo=MovimientoStock.AJUSTE, cantidad=delta,
+                cantidad_resultante=inventario.cantidad_entradas, motivo=motivo, usuario=usuario, fecha=ahora
+            ))
+        Inventario.objects.bulk_update(cambiados, ['cantidad_entradas', 'ultima_actualizacion'], batch_size=500)
+        MovimientoInventario.objects.bulk_create(movimientos, batch_size=500)
+    return movimientos
+
+
+def registrar_altas_inventario(inventarios, motivo='Alta del inventario', usuario=None):
+    """Entrada inicial de inventarios recién creados (el INSERT ya guardó la cantidad)"""
+    ahora = timezone.now()
+    return MovimientoInventario.objects.bulk_create([
+        MovimientoInventario(
+            inventario_id=inventario.id, tipo=MovimientoStock.ENTRADA, cantidad=inventario.cantidad_entradas,
+            cantidad_resultante=inventario.cantidad_entradas, motivo=motivo, usuario=usuario, fecha=ahora
+        )
+        for inventario in inventarios if inventario.cantidad_entradas
+    ], batch_size=500)
+
+
+def _saldos(variante_ids, fecha):
+    """
+    ({id: stock del último snapshot hasta `fecha`}, {id: suma de movimientos
+    posteriores a ese snapshot y hasta `fecha`}), en dos consultas.
+
+    Las variantes se agrupan por la fecha de su snapshot (una por ejecución de
+    snapshot_stock) y cada grupo suma solo el rango (snapshot, fecha] del índice
+    (variante, fecha): los movimientos anteriores al snapshot no se leen.
+    """
+    if not variante_ids:
+        return {}, {}
+    snapshots = {}
+    por_fecha = defaultdict(list)
+    for variante_id, desde, stock in (
+        SnapshotStock.objects.filter(variante_id__in=variante_ids, fecha__lte=fecha)
+        .order_by('variante_id', '-fecha').distinct('variante_id').values_list('variante_id', 'fecha', 'stock')
+    ):
+        snapshots[variante_id] = stock
+        por_fecha[desde].append(variante_id)
+
+    sin_snapshot = [variante_id for variante_id in variante_ids if variante_id not in snapshots]
+    rangos = Q(variante_id__in=sin_snapshot) if sin_snapshot else Q()
+    for desde, ids in por_fecha.items():
+        rangos |= Q(variante_id__in=ids, fecha__gt=desde)
+    deltas = dict(
+        MovimientoStock.objects.filter(rangos, fecha__lte=fecha)
+        .order_by().values('variante_id').annotate(total=Sum('cantidad')).values_list('variante_id', 'total')
+    )
+    return snapshots, deltas
+
+
+def stocks_en_fecha(variante_ids, fecha):
+    """{id: stock} de las variantes al final de `fecha` (0 antes de su primer movimiento)"""
+    snapshots, deltas = _saldos(variante_ids, fecha)
+    return {
+        variante_id: snapshots.get(variante_id, 0) + deltas.get(variante_id, 0)
+        for variante_id in variante_ids
+    }
+
+
+def stock_en_fecha(variante_id, fecha):
+    return stocks_en_fecha([variante_id], fecha)[variante_id]
+
+
+def tomar_snapshots(fecha=None, tamano_lote=2000):
+    """
+    Guardar el stock en `fecha` (por defecto ahora menos MARGEN_SNAPSHOT) de las
+    variantes que tuvieron movimientos desde su último snapshot. Devuelve
+    (fecha, cantidad de snapshots creados).
+
+    Cada ejecución deja al día todas las variantes con movimientos hasta su
+    fecha, así que solo se leen los movimientos posteriores a la ejecución
+    anterior (la fecha de snapshot más reciente), por lotes.
+    """
+    fecha = fecha or timezone.now() - MARGEN_SNAPSHOT
+    con_movimientos = MovimientoStock.objects.filter(fecha__lte=fecha)
+    anterior = SnapshotStock.objects.filter(fecha__lte=fecha).aggregate(ultima=Max('fecha'))['ultima']
+    if anterior is not None:
+        con_movimientos = con_movimientos.filter(fecha__gt=anterior)
+    ids = con_movimientos.order_by('variante_id').values_list('variante_id', flat=True).distinct().iterator(
+        chunk_size=tamano_lote
+    )
+    creados = 0
+    while lote := list(islice(ids, tamano_lote)):
+        snapshots, deltas = _saldos(lote, fecha)
+        creados += len(SnapshotStock.objects.bulk_create([
+            SnapshotStock(variante_id=variante_id, fecha=fecha, stock=snapshots.get(variante_id, 0) + delta)
+            for variante_id, delta in deltas.items()
+        ], batch_size=500, ignore_conflicts=True))
+    return fecha, creados
@@ -0,0 +1,179 @@
+"""
+Subidas de imágenes al storage:
+- directa al bucket: el cliente pide un POST firmado, sube el archivo a S3
+  (o MinIO) sin pasar por Django y luego confirma la subida;
+- en lote: varios archivos de una petición se guardan en paralelo; los
+  contenidos repetidos se suben una sola vez (ver blobs.py).
+"""
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import UnidentifiedImageError
+
+from .blobs import registrar_archivo, subir_contenido, sumar_referencias
+from .imagenes import leer_metadatos
+from .models import ImagenBlob
+
+SALT = 'app_productos.subidas'
+TIPOS_PERMITIDOS = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/webp': 'webp',
+    'image/gif': 'gif',
+}
+# La URL firmada vence a los IMAGENES_SUBIDA_EXPIRA segundos; la confirmación admite
+# este margen extra para archivos grandes o conexiones lentas
+MARGEN_CONFIRMACION = 3600
+
+
+class SubidaInvalida(Exception):
+    pass
+
+
+def subida_directa_disponible():
+    """Solo los storages de S3 (django-storages) pueden firmar subidas"""
+    return hasattr(default_storage, 'bucket_name') and hasattr(default_storage, 'connection')
+
+
+def nueva_clave(content_type):
+    """Nombre del archivo en el storage (relativo a AWS_LOCATION, como los de ImageField)"""
+    return f'productos/{uuid.uuid4().hex}.{TIPOS_PERMITIDOS[content_type]}'
+
+
+def post_firmado(clave, content_type):
+    """
+    URL y campos del formulario para subir `clave` con un POST multipart.
+    S3 rechaza archivos de otro tipo o de más de IMAGENES_TAMANO_MAXIMO bytes.
+    Se calcula localmente (no consulta al bucket).
+    """
+    campos = {'Content-Type': content_type}
+    cache_control = getattr(settings, 'AWS_S3_OBJECT_PARAMETERS', {}).get('CacheControl')
+    if cache_control:
+        campos['Cache-Control'] = cache_control
+    condiciones = [{clave_campo: valor} for clave_campo, valor in campos.items()]
+    condiciones.append(['content-length-range', 1, settings.IMAGENES_TAMANO_MAXIMO])
+
+    return default_storage.connection.meta.client.generate_presigned_post(
+        Bucket=default_storage.bucket_name,
+        Key=default_storage._normalize_name(clave),  # antepone AWS_LOCATION
+        Fields=campos,
+        Conditions=condiciones,
+        ExpiresIn=settings.IMAGENES_SUBIDA_EXPIRA,
+    )
+
+
+def crear_token(clave, variante_id, usuario_id):
+    """Token firmado que autoriza a confirmar esa clave para esa variante y ese usuario"""
+    return signing.dumps({'clave': clave, 'variante': variante_id, 'usuario': usuario_id}, salt=SALT)
+
+
+def leer_token(token, usuario_id):
+    """Datos del token; SubidaInvalida si está alterado, vencido o es de otro usuario"""
+    try:
+        datos = signing.loads(token, salt=SALT, max_age=settings.IMAGENES_SUBIDA_EXPIRA + MARGEN_CONFIRMACION)
+    except signing.SignatureExpired:
+        raise SubidaInvalida('El token de subida venció')
+    except signing.BadSignature:
+        raise SubidaInvalida('Token de subida inválido')
+    if datos['usuario'] != usuario_id:
+        raise SubidaInvalida('Token de subida inválido')
+    return datos
+
+
+def verificar_archivo(clave):
+    """
+    Comprobar que el cliente subió el archivo (HEAD al bucket) y que respeta el
+    tamaño máximo; devuelve los metadatos que se conocen sin descargarlo
+    (dimensiones y SHA-256 los completa la generación de versiones)
+    """
+    if not default_storage.exists(clave):
+        raise SubidaInvalida('El archivo todavía no se subió al storage')
+    tamano = default_storage.size(clave)
+    if tamano > settings.IMAGENES_TAMANO_MAXIMO:
+        raise SubidaInvalida('El archivo supera el tamaño máximo')
+    extension = clave.rsplit('.', 1)[-1]
+    content_type = next((tipo for tipo, ext in TIPOS_PERMITIDOS.items() if ext == extension), '')
+    return {'tamano': tamano, 'content_type': content_type}
+
+
+def _hilos(total):
+    return max(1, min(settings.IMAGENES_SUBIDA_HILOS, total))
+
+
+def _metadatos_o_nada(archivo):
+    try:
+        return leer_metadatos(archivo)
+    except (UnidentifiedImageError, OSError):
+        return None
+
+
+def leer_metadatos_en_paralelo(archivos):
+    """Metadatos de cada archivo subido (None si no es una imagen); el SHA-256 libera el GIL"""
+    with ThreadPoolExecutor(max_workers=_hilos(len(archivos))) as ejecutor:
+        return list(ejecutor.map(_metadatos_o_nada, archivos))
+
+
+def subir_en_paralelo(archivos, metadatos):
+    """
+    Subir una vez cada contenido que todavía no está guardado (las imágenes
+    repetidas, en la petición o en el storage, no se suben) usando hasta
+    IMAGENES_SUBIDA_HILOS subidas simultáneas; devuelve {sha256: nombre}.
+    Si alguna falla se borran las que ya se guardaron y se relanza el error.
+    """
+    unicos = {}
+    for archivo, datos in zip(archivos, metadatos):
+        unicos.setdefault(datos['sha256'], (archivo, datos))
+    existentes = set(ImagenBlob.objects.filter(pk__in=unicos).values_list('pk', flat=True))
+    nuevos = [sha256 for sha256 in unicos if sha256 not in existentes]
+    if not nuevos:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=_hilos(len(nuevos))) as ejecutor:
+        futuros = {sha256: ejecutor.submit(subir_contenido, *unicos[sha256]) for sha256 in nuevos}
+
+    nombres = {}
+    error = None
+    for sha256, futuro in futuros.items():
+        try:
+            nombres[sha256] = futuro.result()
+        except Exception as e:
+            error = error or e
+    if error is not None:
+        borrar_subidos(nombres)
+        raise error
+    return nombres
+
+
+def registrar_lote(metadatos, nombres):
+    """
+    Blob de cada imagen del lote (en el mismo orden): los contenidos nuevos se
+    registran con el nombre subido y los existentes solo suman referencias, un
+    UPDATE por contenido distinto. Va dentro de la transacción del lote.
+    """
+    referencias = Counter(datos['sha256'] for datos in metadatos)
+    blobs = {}
+    for datos in metadatos:
+        sha256 = datos['sha256']
+        if sha256 in blobs:
+            continue
+        if sha256 in nombres:
+            blobs[sha256] = registrar_archivo(nombres[sha256], datos, referencias[sha256])
+            if blobs[sha256].nombre != nombres[sha256]:
+                # Otra subida lo registró antes: se usa su archivo
+                nombre = nombres.pop(sha256)
+                transaction.on_commit(lambda nombre=nombre: default_storage.delete(nombre))
+        elif sumar_referencias(sha256, referencias[sha256]):
+            blobs[sha256] = ImagenBlob.objects.get(pk=sha256)
+        else:
+            raise SubidaInvalida('La imagen se eliminó mientras se subía el lote; reintentar')
+    return [blobs[datos['sha256']] for datos in metadatos]
+
+
+def borrar_subidos(nombres):
+    for nombre in nombres.values():
+        default_storage.delete(nombre)
@@ -1,3 +1,1378 @@
-from django.test import TestCase
+import base64
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, DataError, connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+
+from app_Cliente.models import Cliente
+from app_compras.models import compra
+from .models import (
+    Producto, Categoria, ProductoCategoria, Imagen_Producto, ImagenBlob, CatalogoProducto, reseña,
+    CalificacionVariante, CalificacionProducto, PuntajeProducto, item_pedido, Inventario, MovimientoStock,
+    SnapshotStock, MovimientoInventario
+)
+from .api import InventarioViewSet
+from .destacados import actualizar_destacados
+from .importacion import ImportacionCatalogo, importar_catalogo
+from .serializers import ProductoCompletoSerializer, ProductoCategoriaSerializer, serializar_variantes
+from .stock import registrar_movimiento, stock_en_fecha, tomar_snapshots
+from .subidas import crear_token
+from project_ecommerce.media import url_archivo
+
+
+class CatalogoTestCase(TestCase):
+    """Base de las pruebas: caché vacía, la categoría Ropa y una camiseta"""
+
+    # None: sin producto inicial
+    nombre_producto = 'Camiseta'
+
+    def setUp(self):
+        cache.clear()
+        self.categoria = Categoria.objects.create(nombre='Ropa', descripcion='')
+        if self.nombre_producto:
+            self.producto = self.crear_producto(self.nombre_producto)
+
+    def crear_producto(self, nombre, **datos):
+        return Producto.objects.create(nombre=nombre, **{'descripcion': '', 'peso': 1, **datos})
+
+    def crear_variante(self, producto=None, **datos):
+        return ProductoCategoria.objects.create(**{
+            'producto': producto or self.producto, 'categoria': self.categoria, 'color': 'Rojo', 'talla': 'M',
+            'precio_variante': 0, 'precio_unitario': 10, 'stock': 1, **datos
+        })
+
+    def crear_usuario(self, username='vendedor', **datos):
+        """Usuario y cabecera con su token"""
+        usuario = User.objects.create_user(username=username, password='clave-segura-123', **datos)
+        return usuario, {'HTTP_AUTHORIZATION': f'Token {Token.objects.create(user=usuario).key}'}
+
+
+class CatalogoConsultasTest(TestCase):
+    """El catálogo completo debe cargarse en un número fijo de consultas"""
+
+    def setUp(self):
+        cache.clear()
+
+    def crear_catalogo(self, productos, variantes_por_producto):
+        categorias = [
+            Categoria.objects.create(nombre=f'Categoria {i}', descripcion='')
+            for i in range(2)
+        ]
+        for i in range(productos):
+            producto = Producto.objects.create(nombre=f'Producto {i}', descripcion='', peso=1)
+            for j in range(variantes_por_producto):
+                variante = ProductoCategoria.objects.create(
+                    producto=producto,
+                    categoria=categorias[j % 2],
+                    color=f'Color {j}',
+                    talla='M',
+                    precio_variante=10,
+                    precio_unitario=10,
+                    stock=5
+                )
+                Imagen_Producto.objects.create(
+                    imagen=f'productos/{variante.id}.jpg',
+                    texto='',
+                    es_principal=True,
+                    Producto_categoria=variante
+                )
+                Imagen_Producto.objects.create(
+                    imagen=f'productos/{variante.id}_b.jpg',
+                    texto='',
+                    Producto_categoria=variante
+                )
+
+    def serializar_catalogo(self):
+        queryset = ProductoCompletoSerializer.preparar_queryset(Producto.objects.filter(activo=True))
+        return ProductoCompletoSerializer(queryset, many=True).data
+
+    def test_consultas_constantes(self):
+        self.crear_catalogo(productos=2, variantes_por_producto=2)
+        with self.assertNumQueries(3):
+            self.serializar_catalogo()
+
+        self.crear_catalogo(productos=10, variantes_por_producto=5)
+        with self.assertNumQueries(3):
+            data = self.serializar_catalogo()
+
+        self.assertEqual(len(data), 12)
+        variante = data[-1]['variantes'][0]
+        self.assertEqual(len(variante['imagenes']), 2)
+        self.assertTrue(variante['imagen_principal']['es_principal'])
+        self.assertEqual(len(data[-1]['categorias']), 2)
+
+    def test_listado_consultas_constantes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.crear_catalogo(productos=3, variantes_por_producto=2)
+        with CaptureQueriesContext(connection) as inicial:
+            self.client.get('/api/productos/productos/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.crear_catalogo(productos=20, variantes_por_producto=4)
+        with self.assertNumQueries(len(inicial)):
+            respuesta = self.client.get('/api/productos/productos/')
+
+        self.assertEqual(respuesta.json()['count'], 23)
+
+
+class CatalogoDesnormalizadoTest(CatalogoTestCase):
+    """Las filas de CatalogoProducto se mantienen con cada escritura"""
+
+    def setUp(self):
+        super().setUp()
+        usuario, _ = self.crear_usuario('cliente')
+        self.cliente = Cliente.objects.create(telefono='1', fecha_nacimiento=date(2000, 1, 1), usuario=usuario)
+
+    def test_señales_actualizan_fila(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            variante = self.crear_variante(precio_unitario=10, stock=3)
+            self.crear_variante(precio_unitario=25, stock=4)
+            Imagen_Producto.objects.create(
+                imagen='productos/a.jpg', texto='', es_principal=True, Producto_categoria=variante
+            )
+            reseña.objects.create(calificacion=4, comentario='', Producto_categoria=variante, Cliente=self.cliente)
+            reseña.objects.create(calificacion=5, comentario='', Producto_categoria=variante, Cliente=self.cliente)
+
+        fila = CatalogoProducto.objects.get(producto=self.producto)
+        self.assertEqual(len(fila.variantes), 2)
+        self.assertEqual(fila.categorias, [{'id': self.categoria.id, 'nombre': 'Ropa', 'descripcion': '', 'activo': True}])
+        self.assertEqual((fila.precio_min, fila.precio_max), (10, 25))
+        self.assertEqual(fila.stock_total, 7)
+        self.assertEqual(float(fila.calificacion_promedio), 4.5)
+        self.assertEqual(fila.total_reseñas, 2)
+        self.assertTrue(fila.imagen_principal.endswith('/productos/a.jpg'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            variante.delete()
+        fila.refresh_from_db()
+        self.assertEqual((fila.stock_total, fila.total_reseñas, fila.imagen_principal), (4, 0, None))
+
+    def test_reconstruir_catalogo(self):
+        self.crear_variante(stock=3)
+        self.assertFalse(CatalogoProducto.objects.exists())
+
+        call_command('reconstruir_catalogo', stdout=StringIO())
+
+        fila = CatalogoProducto.objects.get(producto=self.producto)
+        self.assertEqual(fila.stock_total, 3)
+        respuesta = self.client.get(f'/api/productos/productos/?categoria={self.categoria.id}')
+        self.assertEqual([p['id'] for p in respuesta.json()['productos']], [self.producto.id])
+
+
+class PaginacionCursorTest(CatalogoTestCase):
+    """Los listados paginan por cursor sobre todas las columnas del orden"""
+
+    nombre_producto = None
+
+    def recorrer(self, url):
+        """(elementos de todas las páginas siguiendo `next`, última respuesta)"""
+        elementos = []
+        while url:
+            datos = self.client.get(url).json()
+            elementos += datos.get('productos', datos.get('results'))
+            url = datos['next']
+        return elementos, datos
+
+    def test_recorrer_con_fechas_repetidas(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(7):
+                self.crear_variante(self.crear_producto(f'Producto {i}'))
+        # Misma fecha de creación en todos: solo el id los ordena
+        CatalogoProducto.objects.update(fecha_creacion=timezone.now())
+
+        productos, ultima = self.recorrer('/api/productos/productos/?page_size=3&fields=id')
+        ids = list(Producto.objects.order_by('-id').values_list('id', flat=True))
+        self.assertEqual([producto['id'] for producto in productos], ids)
+        # El total solo se cuenta en la primera página
+        self.assertIsNone(ultima['count'])
+
+        # previous vuelve a la página anterior
+        datos = self.client.get('/api/productos/productos/?page_size=3&fields=id').json()
+        self.assertEqual(datos['count'], 7)
+        with CaptureQueriesContext(connection) as consultas:
+            siguiente = self.client.get(datos['next']).json()
+        self.assertFalse([q for q in consultas.captured_queries if 'COUNT(' in q['sql'].upper()])
+        # La posición lleva fecha e id: ningún OFFSET para desempatar
+        cursor = parse_qs(urlparse(siguiente['next']).query)['cursor'][0]
+        self.assertNotIn('o=', base64.b64decode(cursor).decode())
+        self.assertEqual(self.client.get(siguiente['previous']).json()['productos'], datos['productos'])
+        self.assertEqual(self.client.get('/api/productos/productos/?cursor=x').status_code, 404)
+
+    def test_imagenes_principal_primero_y_tope_de_page_size(self):
+        variante = self.crear_variante(self.crear_producto('Camiseta'))
+        Imagen_Producto.objects.bulk_create([
+            Imagen_Producto(imagen=f'productos/{i}.jpg', texto='', es_principal=(i == 104), Producto_categoria=variante)
+            for i in range(105)
+        ])
+        datos = self.client.get('/api/productos/imagenes/?page_size=500').json()
+        self.assertEqual((len(datos['results']), datos['count']), (100, 105))
+        self.assertTrue(datos['results'][0]['es_principal'])
+
+        imagenes, _ = self.recorrer('/api/productos/imagenes/?page_size=40')
+        esperado = list(Imagen_Producto.objects.order_by('-es_principal', 'id').values_list('id', flat=True))
+        self.assertEqual([imagen['id'] for imagen in imagenes], esperado)
+
+
+class BusquedaTest(CatalogoTestCase):
+    """Búsqueda por texto completo con tolerancia a errores de escritura"""
+
+    nombre_producto = None
+    url = '/api/productos/productos/buscar/'
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            super().setUp()
+            for nombre, descripcion in [
+                ('Pantalon', 'Tela de algodon'),
+                ('Camiseta de algodon', 'Manga corta'),
+                ('Taza', 'Ceramica blanca'),
+            ]:
+                self.crear_variante(self.crear_producto(nombre, descripcion=descripcion))
+
+    def nombres(self, parametros):
+        respuesta = self.client.get(self.url, parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return [producto['nombre'] for producto in respuesta.json()['productos']]
+
+    def test_q_requerido(self):
+        for parametros in [{}, {'q': '  '}]:
+            self.assertEqual(self.client.get(self.url, parametros).status_code, 400)
+
+    def test_relevancia(self):
+        # El nombre pesa más que la descripción; sin coincidencia no aparece
+        self.assertEqual(self.nombres({'q': 'algodon'}), ['Camiseta de algodon', 'Pantalon'])
+        self.assertEqual(self.nombres({'q': 'algodones'}), ['Camiseta de algodon', 'Pantalon'])
+
+    def test_errores_de_escritura(self):
+        self.assertEqual(self.nombres({'q': 'camisetta'}), ['Camiseta de algodon'])
+        self.assertEqual(self.nombres({'q': 'pantalom'}), ['Pantalon'])
+
+    def test_limite(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for color in ['Azul', 'Verde']:
+                self.crear_variante(self.crear_producto(f'Camiseta {color}'))
+        self.assertEqual(len(self.nombres({'q': 'camiseta'})), 3)
+        self.assertEqual(len(self.nombres({'q': 'camiseta', 'limite': 2})), 2)
+        self.assertEqual(len(self.nombres({'q': 'camiseta', 'limite': 'x'})), 3)
+
+
+class ArbolCategoriasTest(CatalogoTestCase):
+    """Árbol de categorías con ruta materializada"""
+
+    url = '/api/productos/categorias/'
+
+    def setUp(self):
+        super().setUp()
+        self.hombre = Categoria.objects.create(nombre='Hombre', descripcion='', id_padre=self.categoria)
+        self.camisas = Categoria.objects.create(nombre='Camisas', descripcion='', id_padre=self.hombre)
+        self.lino = Categoria.objects.create(nombre='Lino', descripcion='', id_padre=self.camisas)
+        self.mujer = Categoria.objects.create(nombre='Mujer', descripcion='', id_padre=self.categoria)
+
+    def rutas(self):
+        return dict(Categoria.objects.values_list('nombre', 'ruta'))
+
+    def test_mover_reescribe_subarbol(self):
+        respuesta = self.client.patch(
+            f'{self.url}{self.hombre.id}/', {'id_padre': self.mujer.id}, content_type='application/json'
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        ids = {categoria: getattr(self, categoria).id for categoria in ['categoria', 'mujer', 'hombre', 'camisas', 'lino']}
+        self.assertEqual(self.rutas(), {
+            'Ropa': '/{categoria}/'.format(**ids),
+            'Mujer': '/{categoria}/{mujer}/'.format(**ids),
+            'Hombre': '/{categoria}/{mujer}/{hombre}/'.format(**ids),
+            'Camisas': '/{categoria}/{mujer}/{hombre}/{camisas}/'.format(**ids),
+            'Lino': '/{categoria}/{mujer}/{hombre}/{camisas}/{lino}/'.format(**ids),
+        })
+
+        # A la raíz: el subárbol pierde el prefijo de Ropa
+        self.client.patch(f'{self.url}{self.hombre.id}/', {'id_padre': None}, content_type='application/json')
+        self.lino.refresh_from_db()
+        self.assertEqual(self.lino.ruta, '/{hombre}/{camisas}/{lino}/'.format(**ids))
+
+    def test_rechazar_ciclo(self):
+        for padre in [self.lino, self.categoria]:
+            respuesta = self.client.patch(
+                f'{self.url}{self.categoria.id}/', {'id_padre': padre.id}, content_type='application/json'
+            )
+            self.assertEqual(respuesta.status_code, 400)
+            self.assertIn('id_padre', respuesta.json())
+        self.categoria.refresh_from_db()
+        self.assertIsNone(self.categoria.id_padre_id)
+
+    def test_productos_de_subcategorias(self):
+        self.crear_variante(categoria=self.lino)
+        self.crear_variante(self.crear_producto('Blusa'), categoria=self.mujer)
+        self.crear_variante(self.crear_producto('Oculto', activo=False), categoria=self.lino)
+
+        datos = self.client.get(f'{self.url}{self.categoria.id}/productos/').json()
+        self.assertEqual(sorted(producto['nombre'] for producto in datos['productos']), ['Blusa', 'Camiseta'])
+        self.assertEqual(datos['count'], 2)
+        datos = self.client.get(f'{self.url}{self.hombre.id}/productos/').json()
+        self.assertEqual([producto['nombre'] for producto in datos['productos']], ['Camiseta'])
+
+    def test_listado_anidado_en_una_consulta(self):
+        with self.assertNumQueries(1):
+            datos = self.client.get(self.url).json()
+
+        def nombres(categorias):
+            return [(categoria['nombre'], nombres(categoria['subcategorias'])) for categoria in categorias]
+
+        self.assertEqual(nombres(datos['categorias']), [
+            ('Ropa', [('Hombre', [('Camisas', [('Lino', [])])]), ('Mujer', [])])
+        ])
+
+
+class FacetasTest(CatalogoTestCase):
+    """Conteos por faceta sobre los filtros activos, en una sola consulta"""
+
+    def setUp(self):
+        super().setUp()
+        hogar = Categoria.objects.create(nombre='Hogar', descripcion='')
+        taza = self.crear_producto('Taza')
+        self.crear_variante(precio_unitario=10)
+        self.crear_variante(color='Azul', precio_unitario=30)
+        self.crear_variante(talla='L', precio_unitario=60)
+        self.crear_variante(taza, categoria=hogar, color='Blanco', capacidad='350ml', precio_unitario=55)
+        self.crear_variante(taza, categoria=hogar, color='Negro', talla='L', precio_unitario=20)
+        self.hogar = hogar
+
+    def test_conteos_con_filtro(self):
+        with self.assertNumQueries(1):
+            datos = self.client.get('/api/productos/variantes/facetas/?talla=M').json()
+
+        self.assertEqual(
+            (datos['total_productos'], datos['precio_min'], datos['precio_max']), (2, '10.00', '55.00')
+        )
+        facetas = datos['facetas']
+        self.assertEqual(facetas['color'], [
+            {'valor': 'Azul', 'count': 1}, {'valor': 'Blanco', 'count': 1}, {'valor': 'Rojo', 'count': 1}
+        ])
+        self.assertEqual(facetas['talla'], [{'valor': 'M', 'count': 2}])
+        self.assertEqual(facetas['capacidad'], [{'valor': '350ml', 'count': 1}])
+        self.assertEqual(facetas['categoria'], [
+            {'id': self.hogar.id, 'nombre': 'Hogar', 'count': 1},
+            {'id': self.categoria.id, 'nombre': 'Ropa', 'count': 1},
+        ])
+        # La camiseta cuenta una vez en su rango aunque tenga dos variantes en él
+        self.assertEqual(
+            [(bucket['desde'], bucket['hasta'], bucket['count']) for bucket in facetas['precio']],
+            [('0', '50', 1), ('50', '100', 1)]
+        )
+
+    def test_intervalo_y_sin_resultados(self):
+        datos = self.client.get('/api/productos/variantes/facetas/?intervalo=25&color=Rojo').json()
+        self.assertEqual(
+            [(bucket['desde'], bucket['count']) for bucket in datos['facetas']['precio']], [('0', 1), ('50', 1)]
+        )
+        datos = self.client.get('/api/productos/variantes/facetas/?color=Verde').json()
+        self.assertEqual((datos['total_productos'], datos['precio_min']), (0, None))
+        self.assertEqual(datos['facetas']['color'], [])
+        respuesta = self.client.get('/api/productos/variantes/facetas/?intervalo=0')
+        self.assertEqual(respuesta.status_code, 400)
+
+
+class StreamingTest(CatalogoTestCase):
+    """Listados en streaming (?stream=true): mismo JSON que el listado normal"""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            super().setUp()
+            self.crear_variante()
+            self.crear_variante(self.crear_producto('Taza'))
+        for producto, cantidad in [(self.producto, 5), (Producto.objects.get(nombre='Taza'), 2)]:
+            Inventario.objects.create(
+                Producto_id=producto, cantidad_entradas=cantidad, stock_minimo=1, stock_maximo=10, ubicacion_almacen='A-1'
+            )
+
+    def test_inventario_igual_al_listado(self):
+        _, auth = self.crear_usuario()
+        normal = self.client.get('/api/productos/inventario/', **auth)
+        streaming = self.client.get('/api/productos/inventario/?stream=true', **auth)
+        self.assertTrue(streaming.streaming)
+        self.assertEqual(b''.join(streaming.streaming_content), normal.content)
+
+    def test_productos_solo_staff(self):
+        url = '/api/productos/productos/?stream=true&page_size=1'
+        _, auth = self.crear_usuario()
+        for cabeceras in [{}, auth]:
+            respuesta = self.client.get(url, **cabeceras)
+            self.assertFalse(respuesta.streaming)
+            self.assertEqual(len(respuesta.json()['productos']), 1)
+            self.assertIsNotNone(respuesta.json()['next'])
+
+        _, auth = self.crear_usuario('admin', is_staff=True)
+        respuesta = self.client.get(url, **auth)
+        self.assertTrue(respuesta.streaming)
+        datos = json.loads(b''.join(respuesta.streaming_content))
+        self.assertEqual((datos['count'], len(datos['productos'])), (2, 2))
+
+
+class CatalogoCacheTest(CatalogoTestCase):
+    """Las respuestas del catálogo se cachean hasta la próxima escritura"""
+
+    url = '/api/productos/productos/'
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            super().setUp()
+            self.crear_variante()
+
+    def nombres(self, url=None):
+        return [producto['nombre'] for producto in self.client.get(url or self.url).json()['productos']]
+
+    def test_segunda_peticion_sin_consultas(self):
+        self.assertEqual(self.nombres(), ['Camiseta'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.nombres(), ['Camiseta'])
+
+    def test_parametros_en_otro_orden_misma_clave(self):
+        self.nombres(f'{self.url}?categoria={self.categoria.id}&fields=id,nombre')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.nombres(f'{self.url}?fields=id,nombre&categoria={self.categoria.id}'), ['Camiseta'])
+
+    def test_invalidar_al_guardar_y_eliminar(self):
+        self.assertEqual(self.nombres(), ['Camiseta'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.nombre = 'Remera'
+            self.producto.save()
+        self.assertEqual(self.nombres(), ['Remera'])
+
+        # Un producto sin variantes no dispara ninguna otra señal al eliminarse
+        with self.captureOnCommitCallbacks(execute=True):
+            taza = self.crear_producto('Taza')
+        self.assertEqual(self.nombres(), ['Taza', 'Remera'])
+        with self.captureOnCommitCallbacks(execute=True):
+            taza.delete()
+        self.assertEqual(self.nombres(), ['Remera'])
+
+
+class CatalogoCondicionalTest(CatalogoTestCase):
+    """Los detalles de producto y variante responden 304 si no cambiaron"""
+
+    def setUp(self):
+        super().setUp()
+        self.variante = self.crear_variante(stock=3)
+        self.imagen = Imagen_Producto.objects.create(
+            imagen='productos/a.jpg', texto='', Producto_categoria=self.variante
+        )
+
+    def test_etag_producto(self):
+        url = f'/api/productos/productos/{self.producto.id}/'
+        respuesta = self.client.get(url)
+        etag = respuesta['ETag']
+
+        with self.assertNumQueries(1):
+            respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+
+        self.imagen.delete()
+        respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+
+    def test_etag_depende_de_la_query_string(self):
+        url = f'/api/productos/productos/{self.producto.id}/'
+        completo = self.client.get(url)
+        recortado = self.client.get(f'{url}?fields=id,nombre')
+        self.assertNotEqual(completo['ETag'], recortado['ETag'])
+        self.assertIn('Accept', completo['Vary'])
+
+        # El ETag de la respuesta completa no valida la recortada
+        respuesta = self.client.get(f'{url}?fields=id,nombre', HTTP_IF_NONE_MATCH=completo['ETag'])
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['producto'], {'id': self.producto.id, 'nombre': 'Camiseta'})
+        # El orden de los parámetros no cambia el ETag
+        self.assertEqual(
+            self.client.get(f'{url}?expand=variantes&fields=id')['ETag'],
+            self.client.get(f'{url}?fields=id&expand=variantes')['ETag']
+        )
+
+    def test_etag_cambia_con_una_resena(self):
+        usuario, _ = self.crear_usuario('cliente')
+        cliente = Cliente.objects.create(telefono='1', fecha_nacimiento=date(2000, 1, 1), usuario=usuario)
+        urls = [f'/api/productos/productos/{self.producto.id}/', f'/api/productos/variantes/{self.variante.id}/']
+        etags = [self.client.get(url)['ETag'] for url in urls]
+
+        reseña.objects.create(calificacion=5, comentario='', Producto_categoria=self.variante, Cliente=cliente)
+        for url, etag in zip(urls, etags):
+            respuesta = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(respuesta.status_code, 200)
+            self.assertNotEqual(respuesta['ETag'], etag)
+
+    def test_last_modified_variante(self):
+        url = f'/api/productos/variantes/{self.variante.id}/'
+        respuesta = self.client.get(url)
+        respuesta = self.client.get(url, HTTP_IF_MODIFIED_SINCE=respuesta['Last-Modified'])
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(self.client.get('/api/productos/variantes/999999/').status_code, 404)
+
+
+class CamposDinamicosTest(CatalogoTestCase):
+    """?fields= y ?expand= recortan la respuesta y las consultas"""
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            super().setUp()
+            for color in ['Rojo', 'Azul']:
+                variante = self.crear_variante(color=color, stock=3)
+                Imagen_Producto.objects.create(imagen=f'productos/{color}.jpg', texto='', Producto_categoria=variante)
+
+    def test_fields_anidados(self):
+        url = f'/api/productos/productos/{self.producto.id}/?fields=id,nombre,variantes.color'
+        with self.assertNumQueries(3):  # validador ETag, producto, variantes (sin imágenes)
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.json()['producto'], {
+            'id': self.producto.id, 'nombre': 'Camiseta',
+            'variantes': [{'color': 'Rojo'}, {'color': 'Azul'}]
+        })
+
+    def test_expand(self):
+        respuesta = self.client.get('/api/productos/variantes/?expand=categoria_info')
+        variante = respuesta.json()['results'][0]
+        self.assertIn('categoria_info', variante)
+        self.assertNotIn('imagenes', variante)
+        self.assertNotIn('producto_info', variante)
+        self.assertIn('imagen_principal', variante)
+
+    def test_listado_catalogo(self):
+        respuesta = self.client.get('/api/productos/productos/?fields=id,precio_min,variantes.color')
+        self.assertEqual(respuesta.json()['productos'], [{
+            'id': self.producto.id, 'precio_min': '10.00',
+            'variantes': [{'color': 'Rojo'}, {'color': 'Azul'}]
+        }])
+
+
+class SerializadorRapidoTest(TestCase):
+    """serializar_variantes debe producir exactamente el mismo JSON que el serializer DRF"""
+
+    def test_mismo_json(self):
+        categoria = Categoria.objects.create(nombre='Ropa', descripcion='')
+        producto = Producto.objects.create(nombre='Camiseta', descripcion='Algodón', peso='0.25')
+        con_imagenes = ProductoCategoria.objects.create(
+            producto=producto, categoria=categoria, color='Rojo', talla='M',
+            precio_variante='5.50', precio_unitario='19.99', stock=3
+        )
+        ProductoCategoria.objects.create(
+            producto=producto, categoria=categoria, color='Azul', capacidad='1L',
+            precio_variante=0, precio_unitario=12, stock=0
+        )
+        Imagen_Producto.objects.create(imagen='productos/b.jpg', texto='', Producto_categoria=con_imagenes)
+        Imagen_Producto.objects.create(
+            imagen='productos/a.jpg', texto='frente', es_principal=True, Producto_categoria=con_imagenes
+        )
+
+        variantes = list(ProductoCategoriaSerializer.preparar_queryset(ProductoCategoria.objects.order_by('id')))
+        renderer = JSONRenderer()
+        self.assertEqual(
+            renderer.render(serializar_variantes(variantes)),
+            renderer.render(ProductoCategoriaSerializer(variantes, many=True).data)
+        )
+
+        with self.assertNumQueries(0):
+            serializar_variantes(variantes)
+
+
+class CalificacionesTest(CatalogoTestCase):
+    """Los resúmenes de calificaciones siguen a las reseñas al crear, editar y eliminar"""
+
+    def setUp(self):
+        super().setUp()
+        usuario, _ = self.crear_usuario('cliente')
+        self.cliente = Cliente.objects.create(telefono='123', fecha_nacimiento=date(1990, 1, 1), usuario=usuario)
+        self.rojo, self.azul = [self.crear_variante(color=color) for color in ['Rojo', 'Azul']]
+
+    def resenar(self, variante, calificacion):
+        return reseña.objects.create(
+            calificacion=calificacion, comentario='', Producto_categoria=variante, Cliente=self.cliente
+        )
+
+    def resumenes(self):
+        variante = CalificacionVariante.objects.get(variante=self.rojo)
+        producto = CalificacionProducto.objects.get(producto=self.producto)
+        return (variante.suma, variante.total), (producto.suma, producto.total)
+
+    def test_crear_editar_eliminar(self):
+        primera = self.resenar(self.rojo, 4)
+        self.resenar(self.rojo, 5)
+        self.resenar(self.azul, 1)
+        self.assertEqual(self.resumenes(), ((9, 2), (10, 3)))
+
+        primera.calificacion = 2
+        primera.save()
+        self.assertEqual(self.resumenes(), ((7, 2), (8, 3)))
+
+        primera.Producto_categoria = self.azul
+        primera.save()
+        self.assertEqual(self.resumenes(), ((5, 1), (8, 3)))
+
+        primera.delete()
+        self.assertEqual(self.resumenes(), ((5, 1), (6, 2)))
+
+        self.azul.delete()
+        self.assertEqual(self.resumenes(), ((5, 1), (5, 1)))
+
+    def test_por_producto(self):
+        for calificacion in [5, 4, 4]:
+            self.resenar(self.rojo, calificacion)
+        self.resenar(self.azul, 1)
+
+        with self.assertNumQueries(2):  # resumen y página de reseñas (con su cliente)
+            datos = self.client.get(
+                f'/api/productos/reseñas/por_producto/?producto_variante_id={self.rojo.id}&page_size=2'
+            ).json()
+        self.assertEqual((datos['total_reseñas'], datos['calificacion_promedio']), (3, 4.33))
+        self.assertEqual(len(datos['reseñas']), 2)
+        self.assertIsNotNone(datos['next'])
+
+        datos = self.client.get(f'/api/productos/reseñas/por_producto/?producto_id={self.producto.id}').json()
+        self.assertEqual((datos['total_reseñas'], datos['calificacion_promedio'], datos['count']), (4, 3.5, 4))
+
+
+class DestacadosTest(CatalogoTestCase):
+    """Los destacados salen del puntaje precalculado y el cálculo incremental solo toca lo pendiente"""
+
+    nombre_producto = None
+
+    def setUp(self):
+        super().setUp()
+        self.variantes = {}
+        with self.captureOnCommitCallbacks(execute=True):
+            for nombre in ['Antiguo', 'Vendido', 'Nuevo']:
+                self.variantes[nombre] = self.crear_variante(self.crear_producto(nombre), stock=100)
+
+    def vender(self, nombre, cantidad):
+        venta = compra.objects.create(monto_total=10 * cantidad)
+        item_pedido.objects.create(Producto_variante=self.variantes[nombre], pedido=venta, cantidad=cantidad)
+
+    def destacados(self):
+        cache.clear()
+        datos = self.client.get('/api/productos/productos/destacados/?limite=3').json()
+        return [producto['nombre'] for producto in datos['productos_destacados']]
+
+    def test_orden_por_puntaje(self):
+        # Sin puntajes calculados: los más recientes
+        self.assertEqual(self.destacados(), ['Nuevo', 'Vendido', 'Antiguo'])
+
+        self.vender('Vendido', 50)
+        self.assertEqual(actualizar_destacados(), 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.destacados()[0], 'Vendido')
+        self.assertEqual(PuntajeProducto.objects.get(producto=self.variantes['Vendido'].producto).ventas_recientes, 50)
+
+        # Incremental: solo productos con ventas del día (las compras se fechan por día)
+        self.vender('Antiguo', 500)
+        self.assertEqual(actualizar_destacados(), 2)
+        self.assertEqual(self.destacados()[0], 'Antiguo')
+
+        Producto.objects.filter(nombre='Antiguo').update(activo=False)
+        self.assertNotIn('Antiguo', self.destacados())
+
+
+class VariantesMasivoTest(CatalogoTestCase):
+    """Alta y edición de variantes en lote: todo o nada, con errores por fila"""
+
+    url = '/api/productos/variantes/masivo/'
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            super().setUp()
+            self.existente = self.crear_variante()
+        _, self.auth = self.crear_usuario('admin', is_staff=True)
+
+    def enviar(self, variantes, auth=None):
+        return self.client.post(
+            self.url, {'variantes': variantes}, content_type='application/json', **(auth or self.auth)
+        )
+
+    def fila(self, **datos):
+        return {
+            'producto': self.producto.id, 'categoria': self.categoria.id, 'color': 'Azul', 'talla': 'S',
+            'precio_variante': '0.00', 'precio_unitario': '12.50', 'stock': 3, **datos
+        }
+
+    def test_crear_y_actualizar(self):
+        filas = [self.fila(talla=talla) for talla in ['S', 'M', 'L', 'XL']]
+        filas.append({'id': self.existente.id, 'stock': 9})
+        with self.captureOnCommitCallbacks(execute=True):
+            # token, precarga x3, insert + altas en el libro, update, ajuste de stock (bloqueo, update, movimiento)
+            # y el savepoint
+            with self.assertNumQueries(12):
+                respuesta = self.enviar(filas)
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(len(respuesta.json()['creadas']), 4)
+
+        self.existente.refresh_from_db()
+        self.assertEqual(self.existente.stock, 9)
+        self.assertEqual(
+            list(self.existente.movimientos.values_list('tipo', 'cantidad', 'stock_resultante')),
+            [('ajuste', 9 - 1, 9)]
+        )
+        self.assertEqual(MovimientoStock.objects.filter(tipo='entrada', cantidad=3).count(), 4)
+        fila = CatalogoProducto.objects.get(producto=self.producto)
+        self.assertEqual((len(fila.variantes), fila.stock_total), (5, 9 + 4 * 3))
+
+    def test_errores_por_fila(self):
+        respuesta = self.enviar([
+            self.fila(),
+            self.fila(precio_unitario='0'),
+            self.fila(categoria=999999),
+            {'id': 999999, 'stock': 1},
+        ])
+        self.assertEqual(respuesta.status_code, 400)
+        errores = respuesta.json()['errores']
+        self.assertEqual([error['fila'] for error in errores], [1, 2, 3])
+        self.assertIn('precio_unitario', errores[0]['errores'])
+        self.assertIn('categoria', errores[1]['errores'])
+        self.assertEqual(ProductoCategoria.objects.count(), 1)
+
+    def test_solo_admin(self):
+        _, auth = self.crear_usuario('cliente')
+        self.assertEqual(self.enviar([self.fila()], auth).status_code, 403)
+        self.assertEqual(self.client.post(self.url, {}, content_type='application/json').status_code, 401)
+
+
+class MovimientosStockTest(CatalogoTestCase):
+    """Libro de movimientos de stock: UPDATE atómico, ajustes y stock en una fecha"""
+
+    def setUp(self):
+        super().setUp()
+        _, self.auth = self.crear_usuario('admin', is_staff=True)
+        self.client.post('/api/productos/variantes/', {
+            'producto': self.producto.id, 'categoria': self.categoria.id, 'color': 'Rojo', 'talla': 'M',
+            'precio_variante': '0.00', 'precio_unitario': '10.00', 'stock': 4
+        }, content_type='application/json', **self.auth)
+        self.variante = ProductoCategoria.objects.get()
+        self.url = f'/api/productos/variantes/{self.variante.id}/'
+
+    def movimiento(self, tipo, cantidad):
+        return self.client.post(
+            self.url + 'movimientos/', {'tipo': tipo, 'cantidad': cantidad, 'motivo': 'Prueba'},
+            content_type='application/json', **self.auth
+        )
+
+    def test_movimientos(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.movimiento('entrada', 6).status_code, 201)
+            self.assertEqual(self.movimiento('venta', 3).json()['movimiento']['stock_resultante'], 7)
+            self.assertEqual(self.movimiento('devolucion', 1).status_code, 201)
+        self.assertEqual(self.movimiento('venta', 50).status_code, 409)
+        self.assertEqual(self.movimiento('venta', -2).status_code, 400)
+
+        # La edición de la variante registra la diferencia como ajuste
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.patch(self.url, {'stock': 2}, content_type='application/json', **self.auth)
+        self.assertEqual(respuesta.json()['stock'], 2)
+
+        self.variante.refresh_from_db()
+        self.assertEqual(self.variante.stock, 2)
+        datos = self.client.get(self.url + 'movimientos/', **self.auth).json()
+        self.assertEqual(
+            [(fila['tipo'], fila['cantidad'], fila['stock_resultante']) for fila in reversed(datos['movimientos'])],
+            [('entrada', 4, 4), ('entrada', 6, 10), ('venta', -3, 7), ('devolucion', 1, 8), ('ajuste', -6, 2)]
+        )
+        self.assertEqual(sum(fila['cantidad'] for fila in datos['movimientos']), self.variante.stock)
+        self.assertEqual(CatalogoProducto.objects.get(producto=self.producto).stock_total, 2)
+
+    def test_stock_en_fecha(self):
+        def en(dia, hora=12):
+            return timezone.make_aware(datetime(2026, 1, dia, hora))
+
+        for dia, tipo, cantidad in [(2, 'entrada', 10), (3, 'venta', 4), (5, 'entrada', 1), (8, 'venta', 2)]:
+            movimiento = registrar_movimiento(self.variante.id, tipo, cantidad)
+            MovimientoStock.objects.filter(pk=movimiento.pk).update(fecha=en(dia))
+        MovimientoStock.objects.filter(motivo='Alta de la variante').update(fecha=en(1))
+        esperado = {1: 4, 2: 14, 3: 10, 4: 10, 5: 11, 8: 9, 9: 9}
+
+        self.assertEqual({dia: stock_en_fecha(self.variante.id, en(dia, 23)) for dia in esperado}, esperado)
+        self.assertEqual(tomar_snapshots(en(4)), (en(4), 1))
+        self.assertEqual(tomar_snapshots(en(4)), (en(4), 0))  # sin movimientos nuevos
+        self.assertEqual(SnapshotStock.objects.get().stock, 10)
+        # Con el snapshot se suman solo los movimientos posteriores: mismos resultados
+        self.assertEqual({dia: stock_en_fecha(self.variante.id, en(dia, 23)) for dia in esperado}, esperado)
+
+        datos = self.client.get(self.url + 'stock_en_fecha/?fecha=2026-01-05', **self.auth).json()
+        self.assertEqual(datos['stock'], 11)
+        self.assertEqual(self.client.get(self.url + 'stock_en_fecha/?fecha=ayer', **self.auth).status_code, 400)
+
+    def filas_leidas(self, sql, tabla):
+        """Filas que el plan real (EXPLAIN ANALYZE, sin seq scan) lee de `tabla`, filtradas o no"""
+        def nodos(plan):
+            yield plan
+            for hijo in plan.get('Plans', []):
+                yield from nodos(hijo)
+
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN (ANALYZE, FORMAT JSON) {sql}')
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return sum(
+            nodo['Actual Rows'] + nodo.get('Rows Removed by Filter', 0) + nodo.get('Rows Removed by Index Recheck', 0)
+            for nodo in nodos(plan[0]['Plan']) if nodo.get('Relation Name') == tabla
+        )
+
+    def test_snapshot_acota_lectura_del_libro(self):
+        def en(dia):
+            return timezone.make_aware(datetime(2026, 1, dia, 12))
+
+        otra = self.crear_variante(color='Azul')
+        for variante in [self.variante, otra]:
+            for indice in range(30):
+                movimiento = registrar_movimiento(variante.id, 'entrada', 1)
+                MovimientoStock.objects.filter(pk=movimiento.pk).update(fecha=en(2) + timedelta(minutes=indice))
+        MovimientoStock.objects.filter(motivo__startswith='Alta').update(fecha=en(1))
+        self.assertEqual(tomar_snapshots(en(10)), (en(10), 2))
+        for dia in [12, 14]:
+            movimiento = registrar_movimiento(self.variante.id, 'venta', 1)
+            MovimientoStock.objects.filter(pk=movimiento.pk).update(fecha=en(dia))
+
+        tabla = MovimientoStock._meta.db_table
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(stock_en_fecha(self.variante.id, en(20)), 32)
+        sql = next(consulta['sql'] for consulta in consultas if f'FROM "{tabla}"' in consulta['sql'])
+        # Solo las 2 ventas posteriores al snapshot, no las 31 filas anteriores
+        self.assertEqual(self.filas_leidas(sql, tabla), 2)
+
+        # La siguiente ejecución solo mira los movimientos posteriores a la anterior
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(tomar_snapshots(en(20)), (en(20), 1))
+        sql = next(consulta['sql'] for consulta in consultas if 'DISTINCT' in consulta['sql'] and f'FROM "{tabla}"' in consulta['sql'])
+        self.assertEqual(self.filas_leidas(sql, tabla), 2)
+        self.assertEqual(SnapshotStock.objects.get(variante=self.variante, fecha=en(20)).stock, 32)
+
+    def test_movimientos_paginados(self):
+        for _ in range(4):
+            registrar_movimiento(self.variante.id, 'entrada', 1)
+        url = self.url + 'movimientos/?page_size=2'
+        cantidades, paginas = [], 0
+        while url:
+            datos = self.client.get(url, **self.auth).json()
+            cantidades += [fila['stock_resultante'] for fila in datos['movimientos']]
+            url, paginas = datos['next'], paginas + 1
+        self.assertEqual((cantidades, paginas), ([8, 7, 6, 5, 4], 3))
+
+        manana = (timezone.localdate() + timedelta(days=1)).isoformat()
+        datos = self.client.get(f'{self.url}movimientos/?desde={manana}', **self.auth).json()
+        self.assertEqual(datos['movimientos'], [])
+        self.assertEqual(self.client.get(self.url + 'movimientos/?hasta=ayer', **self.auth).status_code, 400)
+
+    def test_inventario(self):
+        respuesta = self.client.post('/api/productos/inventario/', {
+            'Producto_id': self.producto.id, 'cantidad_entradas': 10, 'stock_minimo': 1,
+            'stock_maximo': 50, 'ubicacion_almacen': 'A-1'
+        }, content_type='application/json', **self.auth)
+        inventario = Inventario.objects.get(pk=respuesta.json()['inventario']['id'])
+        url = f'/api/productos/inventario/{inventario.id}/'
+
+        # Una edición que leyó la fila antes de una entrada no la pisa
+        leido = Inventario.objects.get(pk=inventario.pk)
+        respuesta = self.client.post(url + 'movimientos/', {'tipo': 'entrada', 'cantidad': 5}, content_type='application/json', **self.auth)
+        self.assertEqual(respuesta.json()['movimiento']['cantidad_resultante'], 15)
+        with mock.patch.object(InventarioViewSet, 'get_object', return_value=leido):
+            respuesta = self.client.patch(url, {'ubicacion_almacen': 'B-2'}, content_type='application/json', **self.auth)
+        self.assertEqual(respuesta.json()['inventario']['cantidad_entradas'], 15)
+
+        respuesta = self.client.patch(url, {'cantidad_entradas': 12}, content_type='application/json', **self.auth)
+        self.assertEqual(respuesta.json()['inventario']['cantidad_entradas'], 12)
+        respuesta = self.client.post(url + 'movimientos/', {'tipo': 'ajuste', 'cantidad': -20}, content_type='application/json', **self.auth)
+        self.assertEqual(respuesta.status_code, 409)
+        respuesta = self.client.post(url + 'movimientos/', {'tipo': 'venta', 'cantidad': 1}, content_type='application/json', **self.auth)
+        self.assertEqual(respuesta.status_code, 400)
+
+        # La importación también registra la diferencia
+        with self.captureOnCommitCallbacks(execute=True):
+            importar_catalogo(StringIO(
+                'producto,peso,categoria,color,talla,precio_variante,precio_unitario,stock,ubicacion_almacen,cantidad_entradas\n'
+                'Camiseta,1.00,Ropa,Rojo,M,0,10.00,4,B-2,20\n'
+            ), 'csv')
+
+        inventario.refresh_from_db()
+        self.assertEqual((inventario.cantidad_entradas, inventario.ubicacion_almacen), (20, 'B-2'))
+        datos = self.client.get(url + 'movimientos/', **self.auth).json()
+        self.assertEqual(
+            [(fila['tipo'], fila['cantidad'], fila['cantidad_resultante']) for fila in reversed(datos['movimientos'])],
+            [('entrada', 10, 10), ('entrada', 5, 15), ('ajuste', -3, 12), ('ajuste', 8, 20)]
+        )
+        self.assertEqual(
+            MovimientoInventario.objects.filter(inventario=inventario).latest('id').motivo, 'Importación de catálogo'
+        )
+
+
+class ImportacionCatalogoTest(CatalogoTestCase):
+    """Importación por lotes desde CSV / JSONL"""
+
+    CSV = (
+        'producto,descripcion,peso,categoria,color,talla,capacidad,precio_variante,precio_unitario,stock,ubicacion_almacen,stock_minimo,stock_maximo\n'
+        'Camiseta,,1.00,Ropa,Rojo,M,,0,15.00,7,,,\n'
+        'Camiseta,,1.00,Ropa,Azul,M,,0,15.00,4,A-1,2,50\n'
+        'Taza,Ceramica,0.40,Hogar,Blanco,Unica,350ml,0,8.00,12,,,\n'
+        'Taza,Ceramica,0.40,Hogar,Negro,Unica,350ml,0,-1,12,,,\n'
+        'Taza,Ceramica,0.40,Hogar,Negro,Unica,500ml,0,9.00,3,,,\n'
+    )
+
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            super().setUp()
+            Producto.objects.filter(pk=self.producto.pk).update(descripcion='Algodon')
+            self.roja = self.crear_variante(capacidad='')
+
+    def test_csv(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            resumen = importar_catalogo(StringIO(self.CSV), 'csv', tamano_lote=2)
+        self.assertEqual(
+            [resumen[clave] for clave in ['filas', 'productos_creados', 'variantes_creadas', 'variantes_actualizadas', 'inventarios']],
+            [5, 1, 3, 1, 1]
+        )
+        self.assertEqual(resumen['total_errores'], 1)
+        self.assertEqual(resumen['errores'][0]['linea'], 5)
+        self.assertIn('precio_unitario', resumen['errores'][0]['errores'])
+
+        self.roja.refresh_from_db()
+        self.assertEqual((self.roja.stock, str(self.roja.precio_unitario)), (7, '15.00'))
+        self.assertEqual(
+            list(self.roja.movimientos.values_list('tipo', 'cantidad', 'motivo')),
+            [('ajuste', 6, 'Importación de catálogo')]
+        )
+        self.assertEqual(Producto.objects.get(nombre='Camiseta').descripcion, 'Algodon')
+        self.assertEqual(Inventario.objects.get(Producto_id=self.producto).ubicacion_almacen, 'A-1')
+        self.assertTrue(Categoria.objects.filter(nombre='Hogar').exists())
+        taza = CatalogoProducto.objects.get(nombre='Taza')
+        self.assertEqual((len(taza.variantes), taza.stock_total), (2, 15))
+        self.assertEqual(CatalogoProducto.objects.get(producto=self.producto).stock_total, 11)
+
+    def test_corte_a_mitad_conserva_lotes_guardados(self):
+        def lineas():
+            yield from StringIO(self.CSV).readlines()[:4]  # cabecera y 3 filas
+            raise UnicodeDecodeError('utf-8', b'\xff', 0, 1, 'invalid start byte')
+
+        importacion = ImportacionCatalogo(tamano_lote=2)
+        with self.assertRaises(UnicodeDecodeError):
+            importacion.importar(lineas(), 'csv')
+        self.assertEqual((importacion.resumen['filas'], importacion.resumen['variantes_creadas']), (2, 1))
+        self.assertEqual(CatalogoProducto.objects.get(producto=self.producto).stock_total, 11)
+
+        # Un error de base de datos deshace solo su lote y el resumen no lo cuenta
+        importacion = ImportacionCatalogo(tamano_lote=2)
+        with mock.patch.object(ImportacionCatalogo, 'guardar_inventarios', side_effect=[None, DatabaseError('caída')]):
+            with self.assertRaises(DatabaseError):
+                importacion.importar(StringIO(self.CSV.replace(',7,', ',9,')), 'csv')
+        self.assertEqual((importacion.resumen['filas'], importacion.resumen['variantes_actualizadas']), (2, 2))
+        self.assertFalse(Producto.objects.filter(nombre='Taza').exists())
+        self.assertEqual(CatalogoProducto.objects.get(producto=self.producto).stock_total, 13)
+
+    def test_api_error_devuelve_resumen(self):
+        _, auth = self.crear_usuario('admin', is_staff=True)
+        with mock.patch.object(ImportacionCatalogo, 'guardar_inventarios', side_effect=DatabaseError('caída')):
+            respuesta = self.client.post(
+                '/api/productos/importar-catalogo/',
+                {'archivo': SimpleUploadedFile('catalogo.csv', self.CSV.encode())}, **auth
+            )
+        self.assertEqual(respuesta.status_code, 500)
+        self.assertEqual((respuesta.json()['success'], respuesta.json()['filas']), (False, 0))
+
+        respuesta = self.client.post(
+            '/api/productos/importar-catalogo/',
+            {'archivo': SimpleUploadedFile('catalogo.csv', b'producto,peso\n\xff\xfe,1\n')}, **auth
+        )
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('total_errores', respuesta.json())
+
+    def test_api_jsonl(self):
+        _, auth = self.crear_usuario('admin', is_staff=True)
+        lineas = (
+            '{"producto": "Gorra", "peso": "0.10", "categoria": "Ropa", "color": "Negro", "talla": "U", '
+            '"precio_variante": 0, "precio_unitario": "12.00", "stock": 5}\n'
+            'no es json\n'
+        )
+        respuesta = self.client.post(
+            '/api/productos/importar-catalogo/',
+            {'archivo': SimpleUploadedFile('catalogo.jsonl', lineas.encode())}, **auth
+        )
+        datos = respuesta.json()
+        self.assertEqual((datos['variantes_creadas'], datos['total_errores']), (1, 1))
+        self.assertEqual(datos['errores'][0]['linea'], 2)
+        self.assertTrue(ProductoCategoria.objects.filter(producto__nombre='Gorra').exists())
+
+
+def media_temporal(test):
+    """Storage en disco en un directorio temporal y versiones generadas en el mismo hilo"""
+    media = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media)
+    ajustes = override_settings(
+        STORAGES={'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'}},
+        MEDIA_ROOT=media, MEDIA_URL='/media/', IMAGENES_VERSIONES_SINCRONAS=True,
+    )
+    ajustes.enable()
+    test.addCleanup(ajustes.disable)
+    return media
+
+
+def png(ancho, alto, nombre='foto.png'):
+    salida = BytesIO()
+    Image.new('RGBA', (ancho, alto), (255, 0, 0, 128)).save(salida, 'PNG')
+    return SimpleUploadedFile(nombre, salida.getvalue(), content_type='image/png')
+
+
+class VersionesImagenTest(CatalogoTestCase):
+    """Versiones redimensionadas generadas al subir una imagen"""
+
+    def setUp(self):
+        super().setUp()
+        self.media = media_temporal(self)
+        self.variante = self.crear_variante()
+        _, self.auth = self.crear_usuario()
+
+    def test_subida_genera_versiones(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.post('/api/productos/upload-imagen/', {
+                'imagen': png(2000, 1000), 'Producto_categoria': self.variante.id, 'es_principal': 'true'
+            }, **self.auth)
+        self.assertEqual(respuesta.status_code, 201)
+
+        imagen = Imagen_Producto.objects.get()
+        self.assertEqual((imagen.ancho, imagen.alto), (2000, 1000))
+        self.assertEqual(
+            {version: (datos['ancho'], datos['alto']) for version, datos in imagen.versiones.items()},
+            {'thumb': (160, 80), 'card': (480, 240), 'detail': (1200, 600)}
+        )
+        with imagen.imagen.storage.open(imagen.versiones['card']['jpeg']) as archivo:
+            self.assertEqual(Image.open(archivo).format, 'JPEG')
+
+        data = self.client.get(f'/api/productos/imagenes/{imagen.id}/').json()
+        self.assertTrue(data['versiones']['thumb']['webp'].startswith('/media/productos/versiones/'))
+        catalogo = CatalogoProducto.objects.get(producto=self.variante.producto)
+        self.assertEqual(catalogo.imagen_principal, data['versiones']['card']['webp'])
+
+    def test_metadatos_sin_consultar_storage(self):
+        archivo = png(300, 200)
+        contenido = archivo.read()
+        imagen = Imagen_Producto.objects.create(imagen=archivo, texto='', Producto_categoria=self.variante)
+        imagen.refresh_from_db()
+        self.assertEqual(
+            (imagen.tamano, imagen.content_type, imagen.ancho, imagen.alto, imagen.sha256),
+            (len(contenido), 'image/png', 300, 200, hashlib.sha256(contenido).hexdigest())
+        )
+
+        # Sin el archivo en el storage la respuesta sale igual: solo se leen las columnas
+        os.remove(os.path.join(self.media, imagen.imagen.name))
+        datos = self.client.get(f'/api/productos/mostrar-imagenes/?imagen_id={imagen.id}').json()['imagen']
+        self.assertEqual(datos['s3_info']['file_size'], len(contenido))
+        self.assertEqual(datos['s3_info']['content_type'], 'image/png')
+        self.assertEqual(
+            self.client.get('/api/productos/estadisticas-imagenes/').json()['estadisticas']['espacio_total_bytes'],
+            len(contenido)
+        )
+
+    def test_editar_texto_no_regenera(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            imagen = Imagen_Producto.objects.create(imagen=png(100, 50), texto='', Producto_categoria=self.variante)
+        versiones = Imagen_Producto.objects.get(pk=imagen.pk).versiones
+        # Una imagen chica no se amplía
+        self.assertEqual((versiones['detail']['ancho'], versiones['detail']['alto']), (100, 50))
+
+        imagen.refresh_from_db()
+        imagen.texto = 'Frente'
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            imagen.save()
+        self.assertEqual(Imagen_Producto.objects.get(pk=imagen.pk).versiones, versiones)
+        self.assertEqual(len(callbacks), 1)  # solo el recálculo del catálogo
+
+
+class DeduplicacionImagenTest(CatalogoTestCase):
+    """El mismo contenido se guarda una vez y se comparte entre imágenes"""
+
+    def setUp(self):
+        super().setUp()
+        self.media = media_temporal(self)
+        self.variante = self.crear_variante()
+        _, self.auth = self.crear_usuario()
+
+    def originales(self):
+        return sorted(
+            nombre for _, _, nombres in os.walk(os.path.join(self.media, 'productos'))
+            for nombre in nombres if '_' not in nombre
+        )
+
+    def test_subida_repetida_solo_suma_referencia(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/productos/upload-imagen/', {
+                'imagen': png(300, 200, 'a.png'), 'Producto_categoria': self.variante.id
+            }, **self.auth)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            respuesta = self.client.post('/api/productos/upload-imagen/lote/', {
+                'imagenes': [png(300, 200, 'b.png'), png(300, 200, 'c.png')],
+                'Producto_categoria': self.variante.id,
+            }, **self.auth)
+        self.assertEqual(respuesta.status_code, 201)
+
+        blob = ImagenBlob.objects.get()
+        primera, *copias = Imagen_Producto.objects.order_by('id')
+        self.assertEqual(blob.referencias, 3)
+        self.assertEqual({imagen.imagen.name for imagen in [primera, *copias]}, {blob.nombre})
+        # Las copias reutilizan las versiones: no se programa ninguna generación
+        self.assertTrue(all(imagen.versiones == primera.versiones for imagen in copias))
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.originales(), [os.path.basename(blob.nombre)])
+        estadisticas = self.client.get('/api/productos/estadisticas-imagenes/').json()['estadisticas']
+        self.assertEqual(estadisticas['espacio_total_bytes'], 3 * blob.tamano)
+        self.assertEqual(estadisticas['espacio_almacenado_bytes'], blob.tamano)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            primera.delete()
+        self.assertEqual(ImagenBlob.objects.get().referencias, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            for imagen in copias:
+                imagen.delete()
+        self.assertFalse(ImagenBlob.objects.exists())
+        self.assertEqual(
+            [nombre for _, _, nombres in os.walk(os.path.join(self.media, 'productos')) for nombre in nombres], []
+        )
+
+    def test_guardado_fallido_no_suma_referencia(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Imagen_Producto.objects.create(imagen=png(300, 200, 'a.png'), texto='', Producto_categoria=self.variante)
+        blob = ImagenBlob.objects.get()
+
+        # El INSERT falla (texto demasiado largo) después de adquirir el blob en pre_save
+        for archivo in [png(300, 200, 'b.png'), png(10, 10, 'nueva.png')]:
+            with self.assertRaises(DataError):
+                Imagen_Producto.objects.create(imagen=archivo, texto='x' * 300, Producto_categoria=self.variante)
+
+        self.assertEqual(list(ImagenBlob.objects.values_list('pk', 'referencias')), [(blob.pk, 1)])
+        self.assertEqual(Imagen_Producto.objects.count(), 1)
+        # El archivo del contenido nuevo no queda huérfano en el storage
+        self.assertEqual(self.originales(), [os.path.basename(blob.nombre)])
+
+    def test_estadisticas_una_consulta_y_cacheadas(self):
+        url = '/api/productos/estadisticas-imagenes/'
+        with self.captureOnCommitCallbacks(execute=True):
+            Imagen_Producto.objects.create(
+                imagen=png(30, 30), texto='', es_principal=True, Producto_categoria=self.variante
+            )
+            Imagen_Producto.objects.create(imagen=png(30, 30), texto='', Producto_categoria=self.variante)
+        with CaptureQueriesContext(connection) as consultas:
+            estadisticas = self.client.get(url).json()['estadisticas']
+        self.assertEqual(len(consultas), 1)
+        tamano = ImagenBlob.objects.get().tamano
+        self.assertEqual(
+            {clave: valor for clave, valor in estadisticas.items() if clave != 'storage_backend'},
+            {
+                'total_imagenes': 2, 'espacio_total_bytes': 2 * tamano, 'espacio_almacenado_bytes': tamano,
+                'imagenes_principales': 1, 'imagenes_secundarias': 1,
+                'productos_con_imagenes': 1, 'categorias_con_imagenes': 1,
+            }
+        )
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        # Una imagen nueva invalida la caché al confirmar
+        with self.captureOnCommitCallbacks(execute=True):
+            Imagen_Producto.objects.create(imagen=png(60, 30), texto='', Producto_categoria=self.variante)
+        self.assertEqual(self.client.get(url).json()['estadisticas']['total_imagenes'], 3)
+
+    def test_reemplazar_archivo_libera_el_anterior(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            imagen = Imagen_Producto.objects.create(imagen=png(30, 30), texto='', Producto_categoria=self.variante)
+        anterior = imagen.blob_id
+        with self.captureOnCommitCallbacks(execute=True):
+            imagen.imagen = png(60, 30)
+            imagen.save()
+        self.assertEqual(list(ImagenBlob.objects.values_list('pk', flat=True)), [imagen.blob_id])
+        self.assertNotEqual(imagen.blob_id, anterior)
+        self.assertEqual(len(self.originales()), 1)
+
+    def test_resubir_mismo_contenido_no_suma_referencia(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            imagen = Imagen_Producto.objects.create(imagen=png(30, 30), texto='', Producto_categoria=self.variante)
+        with self.captureOnCommitCallbacks(execute=True):
+            imagen.imagen = png(30, 30, 'otra.png')
+            imagen.save()
+        self.assertEqual(ImagenBlob.objects.get().referencias, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            imagen.delete()
+        self.assertFalse(ImagenBlob.objects.exists())
+        self.assertEqual(self.originales(), [])
+
+
+class UrlArchivoTest(TestCase):
+    """url_archivo arma la misma URL que el storage sin consultarlo"""
+
+    nombres = ['productos/ab/abc.png', 'productos/versiones/ab/abc_card.webp', 'productos/foto con ñ (1).jpg']
+    minio = {
+        'BACKEND': 'storages.backends.s3boto3.S3Boto3Storage',
+        'OPTIONS': {
+            'access_key': 'minioadmin', 'secret_key': 'minioadmin', 'bucket_name': 'ecommerce',
+            'endpoint_url': 'http://localhost:9000', 'addressing_style': 'path', 'custom_domain': None,
+            'location': 'media', 'querystring_auth': False,
+        },
+    }
+
+    def assertMismasUrls(self):
+        for nombre in self.nombres:
+            self.assertEqual(url_archivo(nombre), default_storage.url(nombre))
+
+    def test_storage_configurado(self):
+        self.assertMismasUrls()
+
+    def test_disco(self):
+        media_temporal(self)
+        self.assertMismasUrls()
+
+    def test_minio(self):
+        with override_settings(STORAGES={'default': self.minio}, MEDIA_URL='http://localhost:9000/ecommerce/media/'):
+            self.assertMismasUrls()
+
+    def test_urls_firmadas_usan_el_storage(self):
+        opciones = {**self.minio['OPTIONS'], 'querystring_auth': True}
+        with override_settings(STORAGES={'default': {**self.minio, 'OPTIONS': opciones}}):
+            self.assertIn('Signature', url_archivo(self.nombres[0]))
+        self.assertIsNone(url_archivo(''))
+
+
+class SubidaDirectaTest(CatalogoTestCase):
+    """Subida de imágenes en dos pasos: POST firmado al bucket y confirmación"""
+
+    def setUp(self):
+        super().setUp()
+        self.variante = self.crear_variante()
+        self.usuario, self.auth = self.crear_usuario()
+
+    @override_settings(STORAGES={'default': {
+        'BACKEND': 'storages.backends.s3boto3.S3Boto3Storage',
+        'OPTIONS': {
+            'access_key': 'minioadmin', 'secret_key': 'minioadmin', 'bucket_name': 'ecommerce',
+            'endpoint_url': 'http://localhost:9000', 'addressing_style': 'path', 'custom_domain': None,
+        },
+    }}, IMAGENES_TAMANO_MAXIMO=1000)
+    def test_firmar(self):
+        # La firma se calcula localmente: no hace falta que MinIO esté levantado
+        respuesta = self.client.post('/api/productos/upload-imagen/firmar/', {
+            'Producto_categoria': self.variante.id, 'content_type': 'image/png'
+        }, **self.auth)
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.json()
+        self.assertEqual(datos['subida']['url'], 'http://localhost:9000/ecommerce')
+        campos = datos['subida']['campos']
+        self.assertEqual(campos['key'], f"media/{datos['clave']}")
+        self.assertEqual(campos['Content-Type'], 'image/png')
+        politica = json.loads(base64.b64decode(campos['policy']))
+        self.assertIn(['content-length-range', 1, 1000], politica['conditions'])
+
+        respuesta = self.client.post('/api/productos/upload-imagen/firmar/', {
+            'Producto_categoria': self.variante.id, 'content_type': 'application/pdf'
+        }, **self.auth)
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_confirmar(self):
+        media_temporal(self)
+
+        clave = 'productos/subida.png'
+        token = crear_token(clave, self.variante.id, self.usuario.id)
+        url = '/api/productos/upload-imagen/confirmar/'
+        # Sin archivo en el storage no se registra nada
+        self.assertEqual(self.client.post(url, {'token': token}, **self.auth).status_code, 400)
+
+        salida = BytesIO()
+        Image.new('RGB', (300, 200), 'blue').save(salida, 'PNG')
+        default_storage.save(clave, ContentFile(salida.getvalue()))  # lo que hace el cliente con el POST firmado
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.post(url, {'token': token, 'es_principal': 'true'}, **self.auth)
+        self.assertEqual(respuesta.status_code, 201)
+        imagen = Imagen_Producto.objects.get()
+        self.assertEqual((imagen.imagen.name, imagen.es_principal, imagen.ancho), (clave, True, 300))
+
+        # Confirmar de nuevo es idempotente, también después de que la deduplicación
+        # mueva el archivo al nombre del blob; otro usuario o un token alterado no sirven
+        self.assertEqual(self.client.post(url, {'token': token}, **self.auth).json()['imagen']['id'], imagen.id)
+        Imagen_Producto.objects.filter(pk=imagen.pk).update(imagen='blobs/contenido.png')
+        self.assertEqual(self.client.post(url, {'token': token}, **self.auth).json()['imagen']['id'], imagen.id)
+        _, otro_auth = self.crear_usuario('otro')
+        self.assertEqual(self.client.post(url, {'token': token}, **otro_auth).status_code, 400)
+        self.assertEqual(self.client.post(url, {'token': token + 'x'}, **self.auth).status_code, 400)
+        self.assertEqual(Imagen_Producto.objects.count(), 1)
+
+        # Una nueva principal desmarca la anterior en la misma transacción
+        segunda = 'productos/segunda.png'
+        default_storage.save(segunda, ContentFile(salida.getvalue()))
+        token = crear_token(segunda, self.variante.id, self.usuario.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.post(url, {'token': token, 'es_principal': 'true'}, **self.auth)
+        self.assertEqual(
+            list(Imagen_Producto.objects.filter(es_principal=True).values_list('id', flat=True)),
+            [respuesta.json()['imagen']['id']]
+        )
+
+
+class SubidaLoteTest(CatalogoTestCase):
+    """Varias imágenes en una petición: subidas en paralelo y un solo bulk_create"""
+
+    url = '/api/productos/upload-imagen/lote/'
+
+    def setUp(self):
+        super().setUp()
+        self.media = media_temporal(self)
+        self.roja, self.azul = [self.crear_variante(color=color) for color in ('Rojo', 'Azul')]
+        self.anterior = Imagen_Producto.objects.create(
+            imagen='productos/anterior.png', texto='', es_principal=True, Producto_categoria=self.roja
+        )
+        _, self.auth = self.crear_usuario()
+
+    def test_lote(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.post(self.url, {
+                'imagenes': [png(40, 20, f'foto{i}.png') for i in range(4)],
+                'Producto_categoria': [self.roja.id, self.roja.id, self.azul.id, self.azul.id],
+                'es_principal': ['false', 'true', 'true', 'false'],
+                'texto': 'Sesion de fotos',
+            }, **self.auth)
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(respuesta.json()['count'], 4)
+
+        nuevas = Imagen_Producto.objects.exclude(pk=self.anterior.pk).order_by('id')
+        self.assertEqual(
+            [(imagen.Producto_categoria_id, imagen.es_principal, imagen.texto) for imagen in nuevas],
+            [(self.roja.id, False, 'Sesion de fotos'), (self.roja.id, True, 'Sesion de fotos'),
+             (self.azul.id, True, 'Sesion de fotos'), (self.azul.id, False, 'Sesion de fotos')]
+        )
+        self.anterior.refresh_from_db()
+        self.assertFalse(self.anterior.es_principal)
+        self.assertTrue(all(imagen.versiones and imagen.tamano and imagen.sha256 for imagen in nuevas))
+        catalogo = CatalogoProducto.objects.get(producto=self.roja.producto)
+        self.assertEqual(sum(len(variante['imagenes']) for variante in catalogo.variantes), 5)
+
+    def test_errores_no_suben_nada(self):
+        respuesta = self.client.post(self.url, {
+            'imagenes': [
+                png(10, 10), png(10, 10),
+                SimpleUploadedFile('a.txt', b'hola', content_type='text/plain'),
+                SimpleUploadedFile('b.png', b'no es una imagen', content_type='image/png'),
+            ],
+            'Producto_categoria': self.roja.id,
+            'es_principal': ['true', 'true', 'false', 'false'],
+        }, **self.auth)
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual([error['fila'] for error in respuesta.json()['errores']], [1, 2, 3])
+        self.assertEqual(Imagen_Producto.objects.count(), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.media, 'productos')))
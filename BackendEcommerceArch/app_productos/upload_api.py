@@ -5,11 +5,54 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from rest_framework.parsers import MultiPartParser, FormParser
+from django.conf import settings
 from django.core.files.storage import default_storage
-from app_productos.models import Imagen_Producto, ProductoCategoria
-from app_productos.serializers import ImagenProductoSerializer
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Func, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from app_productos.models import ImagenBlob, Imagen_Producto, ProductoCategoria
+from app_productos.serializers import ImagenProductoSerializer, urls_versiones
+from app_productos.cache import cachear_catalogo
+from app_productos.imagenes import programar_versiones
+from app_productos.signals import programar_actualizacion
+from project_ecommerce.media import url_archivo
+from app_productos.subidas import (
+    TIPOS_PERMITIDOS, SubidaInvalida, borrar_subidos, crear_token, leer_metadatos_en_paralelo,
+    leer_token, nueva_clave, post_firmado, registrar_lote, subida_directa_disponible, subir_en_paralelo,
+    verificar_archivo
+)
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
+def crear_imagen(request, producto_categoria, imagen, **metadatos):
+    """
+    Registrar la imagen de la variante con `texto` y `es_principal` de la petición.
+    `imagen` es un archivo subido (sus metadatos se leen al guardar) o la clave
+    de uno que ya está en el storage junto con los `metadatos` conocidos.
+    """
+    texto = request.data.get('texto', '')
+    es_principal = str(request.data.get('es_principal', 'false')).lower() == 'true'
+    
+    with transaction.atomic():
+        if es_principal:
+            # Con la variante bloqueada, dos subidas simultáneas no dejan dos principales
+            ProductoCategoria.objects.select_for_update().filter(pk=producto_categoria.pk).exists()
+            Imagen_Producto.objects.filter(
+                Producto_categoria=producto_categoria,
+                es_principal=True
+            ).update(es_principal=False)
+        
+        return Imagen_Producto.objects.create(
+            imagen=imagen,
+            texto=texto,
+            es_principal=es_principal,
+            Producto_categoria=producto_categoria,
+            **metadatos
+        )
+
+
 class ImageUploadAPIView(APIView):
     """
     API específica para subir imágenes directamente a S3
@@ -54,24 +97,8 @@ class ImageUploadAPIView(APIView):
                     'error': f'No existe producto_categoria con ID {producto_categoria_id}'
                 }, status=status.HTTP_404_NOT_FOUND)
             
-            # Obtener datos opcionales
-            texto = request.data.get('texto', '')
-            es_principal = request.data.get('es_principal', 'false').lower() == 'true'
-            
-            # Si es principal, desmarcar otras imágenes principales
-            if es_principal:
-                Imagen_Producto.objects.filter(
-                    Producto_categoria=producto_categoria,
-                    es_principal=True
-                ).update(es_principal=False)
-            
             # Crear registro de imagen (esto automáticamente sube a S3)
-            imagen_producto = Imagen_Producto.objects.create(
-                imagen=imagen_file,
-                texto=texto,
-                es_principal=es_principal,
-                Producto_categoria=producto_categoria
-            )
+            imagen_producto = crear_imagen(request, producto_categoria, imagen_file)
             
             # Serializar respuesta
             serializer = ImagenProductoSerializer(imagen_producto)
@@ -80,12 +107,12 @@ class ImageUploadAPIView(APIView):
             debug_info = {
                 'storage_backend': default_storage.__class__.__name__,
                 'archivo_guardado_en': imagen_producto.imagen.name,
-                'url_completa': imagen_producto.imagen.url,
+                'url_completa': url_archivo(imagen_producto.imagen.name),
             }
             
             return Response({
                 'success': True,
-                'message': 'Imagen subida exitosamente a S3',
+                'message': 'Imagen subida exitosamente a S3 (las versiones thumb/card/detail se generan en segundo plano)',
                 'imagen': serializer.data,
                 'debug': debug_info
             }, status=status.HTTP_201_CREATED)
@@ -101,14 +128,237 @@ class ImageUploadAPIView(APIView):
         """
         Obtener información sobre la configuración de S3
         """
-        from django.conf import settings
-        
         return Response({
             'storage_backend': default_storage.__class__.__name__,
             'storage_module': default_storage.__class__.__module__,
             'bucket_name': getattr(settings, 'AWS_STORAGE_BUCKET_NAME', 'No configurado'),
             'media_url': getattr(settings, 'MEDIA_URL', 'No configurado'),
             's3_region': getattr(settings, 'AWS_S3_REGION_NAME', 'No configurado'),
+            's3_endpoint': getattr(settings, 'AWS_S3_ENDPOINT_URL', None) or 'AWS',
+        })
+
+
+class ImageBatchUploadAPIView(APIView):
+    """
+    Subida de muchas imágenes en una petición: los archivos se guardan en S3 en
+    paralelo y los registros se crean con un solo bulk_create
+    """
+    parser_classes = (MultiPartParser, FormParser)
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request, *args, **kwargs):
+        """
+        Parámetros esperados (multipart, campos repetidos en el mismo orden que los archivos):
+        - imagenes: los archivos (hasta IMAGENES_MAX_LOTE)
+        - Producto_categoria: un ID para todas las imágenes o uno por imagen
+        - texto: uno para todas o uno por imagen (opcional)
+        - es_principal: 'true' / 'false' por imagen (opcional); como máximo una por variante
+        """
+        archivos = request.FILES.getlist('imagenes')
+        if not archivos:
+            return Response({
+                'success': False,
+                'error': 'No se envió ningún archivo'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if len(archivos) > settings.IMAGENES_MAX_LOTE:
+            return Response({
+                'success': False,
+                'error': f'Máximo {settings.IMAGENES_MAX_LOTE} imágenes por petición'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            variantes_ids = self.por_imagen(request, 'Producto_categoria', len(archivos))
+            textos = self.por_imagen(request, 'texto', len(archivos), defecto='')
+            principales = [
+                valor.lower() == 'true'
+                for valor in self.por_imagen(request, 'es_principal', len(archivos), defecto='false')
+            ]
+        except ValueError as e:
+            return Response({'success': False, 'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        variantes = ProductoCategoria.objects.in_bulk(
+            {int(variante_id) for variante_id in variantes_ids if variante_id.isdigit()}
+        )
+        metadatos = leer_metadatos_en_paralelo(archivos)
+        errores = []
+        con_principal = set()
+        for fila, (archivo, variante_id, es_principal) in enumerate(zip(archivos, variantes_ids, principales)):
+            errores_fila = {}
+            if not variante_id.isdigit() or int(variante_id) not in variantes:
+                errores_fila['Producto_categoria'] = [f'No existe producto_categoria con ID {variante_id}']
+            elif es_principal:
+                if int(variante_id) in con_principal:
+                    errores_fila['es_principal'] = ['Solo puede haber una imagen principal por variante']
+                con_principal.add(int(variante_id))
+            if archivo.content_type not in TIPOS_PERMITIDOS:
+                errores_fila['imagenes'] = [f'Tipo no permitido: {archivo.content_type}']
+            elif archivo.size > settings.IMAGENES_TAMANO_MAXIMO:
+                errores_fila['imagenes'] = ['El archivo supera el tamaño máximo']
+            elif metadatos[fila] is None:
+                errores_fila['imagenes'] = ['El archivo no es una imagen válida']
+            if errores_fila:
+                errores.append({'fila': fila, 'archivo': archivo.name, 'errores': errores_fila})
+        if errores:
+            return Response({
+                'success': False,
+                'message': f'{len(errores)} imagen(es) con errores; no se subió ninguna',
+                'errores': errores
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            nombres = subir_en_paralelo(archivos, metadatos)
+        except Exception as e:
+            logger.exception('Error al subir imágenes en lote')
+            return Response({
+                'success': False,
+                'error': f'Error al subir imágenes: {str(e)}',
+                'tipo_error': type(e).__name__
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        try:
+            with transaction.atomic():
+                blobs = registrar_lote(metadatos, nombres)
+                # Un solo UPDATE desmarca las principales anteriores de todas las variantes
+                if con_principal:
+                    Imagen_Producto.objects.filter(
+                        Producto_categoria_id__in=con_principal, es_principal=True
+                    ).update(es_principal=False)
+                imagenes = Imagen_Producto.objects.bulk_create([
+                    Imagen_Producto(
+                        imagen=blob.nombre, blob=blob, versiones=blob.versiones, texto=texto,
+                        es_principal=es_principal, Producto_categoria_id=int(variante_id), **datos
+                    )
+                    for blob, texto, es_principal, variante_id, datos
+                    in zip(blobs, textos, principales, variantes_ids, metadatos)
+                ])
+                # bulk_create no emite señales: catálogo, caché y versiones se programan aquí
+                programar_actualizacion(variantes={imagen.Producto_categoria_id for imagen in imagenes})
+                sin_versiones = {imagen.blob_id: imagen.id for imagen in imagenes if not imagen.versiones}
+                for imagen_id in sin_versiones.values():
+                    programar_versiones(imagen_id)  # una por contenido: se copian a las demás
+        except SubidaInvalida as e:
+            borrar_subidos(nombres)
+            return Response({'success': False, 'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        except Exception:
+            borrar_subidos(nombres)
+            raise
+        
+        return Response({
+            'success': True,
+            'message': f'{len(imagenes)} imagen(es) subida(s) (las versiones se generan en segundo plano)',
+            'count': len(imagenes),
+            'imagenes': ImagenProductoSerializer(imagenes, many=True).data
+        }, status=status.HTTP_201_CREATED)
+    
+    @staticmethod
+    def por_imagen(request, campo, total, defecto=None):
+        """Valores de un campo repetido: uno por imagen, o uno solo que vale para todas"""
+        valores = request.data.getlist(campo)
+        if not valores and defecto is not None:
+            return [defecto] * total
+        if len(valores) == 1:
+            return valores * total
+        if len(valores) != total:
+            raise ValueError(f'Se esperaba un valor de {campo} o uno por imagen ({total}), llegaron {len(valores)}')
+        return valores
+
+
+class ImagePresignAPIView(APIView):
+    """
+    Paso 1 de la subida directa: devuelve un POST firmado para subir la imagen
+    al bucket sin pasar por Django, y el token para confirmarla
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request, *args, **kwargs):
+        """
+        Parámetros esperados:
+        - Producto_categoria: ID de la variante del producto
+        - content_type: image/jpeg, image/png, image/webp o image/gif
+        """
+        if not subida_directa_disponible():
+            return Response({
+                'success': False,
+                'error': 'La subida directa requiere un storage S3; usar /api/productos/upload-imagen/'
+            }, status=status.HTTP_501_NOT_IMPLEMENTED)
+        
+        content_type = request.data.get('content_type', '')
+        if content_type not in TIPOS_PERMITIDOS:
+            return Response({
+                'success': False,
+                'error': f'content_type debe ser uno de: {", ".join(TIPOS_PERMITIDOS)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        producto_categoria_id = request.data.get('Producto_categoria')
+        if not str(producto_categoria_id).isdigit() or not ProductoCategoria.objects.filter(id=producto_categoria_id).exists():
+            return Response({
+                'success': False,
+                'error': f'No existe producto_categoria con ID {producto_categoria_id}'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        clave = nueva_clave(content_type)
+        subida = post_firmado(clave, content_type)
+        return Response({
+            'success': True,
+            'subida': {'metodo': 'POST', 'url': subida['url'], 'campos': subida['fields']},
+            'clave': clave,
+            'token': crear_token(clave, int(producto_categoria_id), request.user.id),
+            'tamano_maximo': settings.IMAGENES_TAMANO_MAXIMO,
+            'expira_en': settings.IMAGENES_SUBIDA_EXPIRA,
+        })
+
+
+class ImageConfirmAPIView(APIView):
+    """
+    Paso 2 de la subida directa: comprueba que el archivo está en el bucket y
+    crea el registro de Imagen_Producto (las versiones se generan en segundo plano)
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request, *args, **kwargs):
+        """
+        Parámetros esperados:
+        - token: el devuelto por /upload-imagen/firmar/
+        - texto: descripción de la imagen (opcional)
+        - es_principal: si es la imagen principal (opcional, default: false)
+        """
+        try:
+            datos = leer_token(request.data.get('token', ''), request.user.id)
+            
+            # Confirmar dos veces la misma subida devuelve la imagen ya registrada
+            existente = Imagen_Producto.objects.filter(clave_subida=datos['clave']).first()
+            if existente:
+                return self.ya_registrada(existente)
+            
+            metadatos = verificar_archivo(datos['clave'])
+        except SubidaInvalida as e:
+            return Response({'success': False, 'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        producto_categoria = ProductoCategoria.objects.filter(id=datos['variante']).first()
+        if producto_categoria is None:
+            return Response({
+                'success': False,
+                'error': f'No existe producto_categoria con ID {datos["variante"]}'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            imagen_producto = crear_imagen(
+                request, producto_categoria, datos['clave'], clave_subida=datos['clave'], **metadatos
+            )
+        except IntegrityError:
+            # Otra confirmación del mismo token la registró al mismo tiempo
+            return self.ya_registrada(Imagen_Producto.objects.get(clave_subida=datos['clave']))
+        return Response({
+            'success': True,
+            'message': 'Imagen registrada (las versiones thumb/card/detail se generan en segundo plano)',
+            'imagen': ImagenProductoSerializer(imagen_producto).data
+        }, status=status.HTTP_201_CREATED)
+    
+    def ya_registrada(self, imagen_producto):
+        return Response({
+            'success': True,
+            'message': 'La imagen ya estaba registrada',
+            'imagen': ImagenProductoSerializer(imagen_producto).data
         })
 
 
@@ -118,6 +368,7 @@ class ImageDisplayAPIView(APIView):
     """
     permission_classes = [permissions.AllowAny]  # Público para ver imágenes
     
+    @cachear_catalogo
     def get(self, request, *args, **kwargs):
         """
         Obtener imágenes de productos con filtros opcionales
@@ -178,7 +429,7 @@ class ImageDisplayAPIView(APIView):
                 imagen_info = self._format_image_data(imagen)
                 imagenes_data.append(imagen_info)
             
-            print(f"🖼️ API Display: Devolviendo {len(imagenes_data)} imágenes")
+            logger.debug('Imágenes devueltas', extra={'imagenes': len(imagenes_data)})
             
             return Response({
                 'success': True,
@@ -187,6 +438,7 @@ class ImageDisplayAPIView(APIView):
             }, status=status.HTTP_200_OK)
             
         except Exception as e:
+            logger.exception('Error al obtener imágenes')
             return Response({
                 'success': False,
                 'error': f'Error al obtener imágenes: {str(e)}',
@@ -211,11 +463,14 @@ class ImageDisplayAPIView(APIView):
             
             return {
                 'id': imagen.id,
-                'imagen_url': imagen.imagen.url if imagen.imagen else None,
+                'imagen_url': url_archivo(imagen.imagen.name),
                 'imagen_name': imagen.imagen.name if imagen.imagen else None,
                 'texto': imagen.texto,
                 'es_principal': imagen.es_principal,
                 'producto_categoria_id': producto_categoria.id,
+                'ancho': imagen.ancho,
+                'alto': imagen.alto,
+                'versiones': urls_versiones(imagen) if imagen.imagen else {},
                 
                 # Información del producto
                 'producto_info': {
@@ -244,19 +499,21 @@ class ImageDisplayAPIView(APIView):
                     'fecha_creacion': producto_categoria.fecha_creacion.isoformat() if producto_categoria.fecha_creacion else None
                 },
                 
-                # Información de S3
+                # Información de S3 (metadatos guardados al subir: sin consultas al storage)
                 's3_info': {
                     'storage_backend': default_storage.__class__.__name__,
-                    'file_size': imagen.imagen.size if imagen.imagen else None,
-                    'content_type': self._get_content_type(imagen.imagen.name) if imagen.imagen else None
+                    'file_size': imagen.tamano,
+                    'content_type': imagen.content_type or (
+                        self._get_content_type(imagen.imagen.name) if imagen.imagen else None
+                    )
                 }
             }
         except Exception as e:
-            print(f"⚠️ Error formateando imagen {imagen.id}: {str(e)}")
+            logger.warning('Error formateando imagen', extra={'imagen': imagen.id, 'error': str(e)})
             return {
                 'id': imagen.id,
                 'error': f'Error al formatear imagen: {str(e)}',
-                'imagen_url': imagen.imagen.url if imagen.imagen else None,
+                'imagen_url': url_archivo(imagen.imagen.name),
                 'texto': imagen.texto,
                 'es_principal': imagen.es_principal,
                 'producto_categoria_id': imagen.Producto_categoria_id
@@ -286,30 +543,39 @@ class ImageStatsAPIView(APIView):
     """
     permission_classes = [permissions.AllowAny]
     
+    @cachear_catalogo
     def get(self, request, *args, **kwargs):
         """
-        Obtener estadísticas de las imágenes almacenadas
+        Obtener estadísticas de las imágenes almacenadas (una sola consulta; la
+        respuesta se cachea hasta que cambie una imagen o el catálogo)
         """
         try:
-            # Contar imágenes
-            total_imagenes = Imagen_Producto.objects.count()
-            imagenes_principales = Imagen_Producto.objects.filter(es_principal=True).count()
+            # Lo que ocupa de verdad: cada contenido repetido se guarda una sola vez (subconsulta a ImagenBlob)
+            espacio_blobs = Subquery(
+                ImagenBlob.objects.order_by().values(total=Func(F('tamano'), function='SUM')).values('total')
+            )
+            totales = Imagen_Producto.objects.aggregate(
+                total_imagenes=Count('id'),
+                imagenes_principales=Count('id', filter=Q(es_principal=True)),
+                espacio_total=Coalesce(Sum('tamano'), 0),
+                espacio_almacenado=Coalesce(espacio_blobs, 0) + Coalesce(Sum('tamano', filter=Q(blob=None)), 0),
+                productos_con_imagenes=Count('Producto_categoria__producto_id', distinct=True),
+                categorias_con_imagenes=Count('Producto_categoria__categoria_id', distinct=True),
+            )
+            total_imagenes = totales['total_imagenes']
+            espacio_total = totales['espacio_total']
+            espacio_almacenado = totales['espacio_almacenado']
+            imagenes_principales = totales['imagenes_principales']
             imagenes_secundarias = total_imagenes - imagenes_principales
-            
-            # Imágenes por producto
-            productos_con_imagenes = Imagen_Producto.objects.values(
-                'Producto_categoria__producto_id'
-            ).distinct().count()
-            
-            # Imágenes por categoría
-            categorias_con_imagenes = Imagen_Producto.objects.values(
-                'Producto_categoria__categoria_id'
-            ).distinct().count()
+            productos_con_imagenes = totales['productos_con_imagenes']
+            categorias_con_imagenes = totales['categorias_con_imagenes']
             
             return Response({
                 'success': True,
                 'estadisticas': {
                     'total_imagenes': total_imagenes,
+                    'espacio_total_bytes': espacio_total,
+                    'espacio_almacenado_bytes': espacio_almacenado,
                     'imagenes_principales': imagenes_principales,
                     'imagenes_secundarias': imagenes_secundarias,
                     'productos_con_imagenes': productos_con_imagenes,
@@ -5,7 +5,11 @@ from .api import (
     ReseñaViewSet, ImagenProductoViewSet, ItemPedidoViewSet, ItemComprasViewSet,
     InventarioViewSet
 )
-from .upload_api import ImageUploadAPIView, ImageDisplayAPIView, ImageStatsAPIView
+from .upload_api import (
+    ImageUploadAPIView, ImageBatchUploadAPIView, ImagePresignAPIView, ImageConfirmAPIView,
+    ImageDisplayAPIView, ImageStatsAPIView
+)
+from .importacion_api import ImportarCatalogoAPIView
 
 router = DefaultRouter()
 router.register(r'productos', ProductoViewSet, basename='producto')
@@ -20,6 +24,10 @@ router.register(r'inventario', InventarioViewSet, basename='inventario')
 urlpatterns = [
     path('', include(router.urls)),
     path('upload-imagen/', ImageUploadAPIView.as_view(), name='upload-imagen'),
+    path('upload-imagen/lote/', ImageBatchUploadAPIView.as_view(), name='upload-imagen-lote'),
+    path('upload-imagen/firmar/', ImagePresignAPIView.as_view(), name='upload-imagen-firmar'),
+    path('upload-imagen/confirmar/', ImageConfirmAPIView.as_view(), name='upload-imagen-confirmar'),
     path('mostrar-imagenes/', ImageDisplayAPIView.as_view(), name='mostrar-imagenes'),
     path('estadisticas-imagenes/', ImageStatsAPIView.as_view(), name='estadisticas-imagenes'),
+    path('importar-catalogo/', ImportarCatalogoAPIView.as_view(), name='importar-catalogo'),
 ]
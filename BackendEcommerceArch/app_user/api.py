@@ -10,6 +10,9 @@ from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
 from rest_framework.permissions import AllowAny, IsAuthenticated
+import logging
+
+logger = logging.getLogger(__name__)
 
 class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
@@ -217,20 +220,20 @@ def register_view(request):
                 if cliente_group in user.groups.all():
                     group_id = cliente_group.id
                     group_name = cliente_group.name
-                    print(f"✅ Usuario {user.username} agregado exitosamente al grupo {group_name}")
+                    logger.info("Usuario agregado al grupo", extra={"usuario": user.username, "grupo": group_name})
                 else:
-                    print(f"⚠️ ADVERTENCIA: No se pudo verificar que el usuario {user.username} fue agregado al grupo")
+                    logger.warning("No se pudo verificar que el usuario fue agregado al grupo", extra={"usuario": user.username})
             except Group.DoesNotExist:
                 # Si no existe el grupo con id=3, intentar crearlo
-                print("⚠️ ADVERTENCIA: Grupo 'cliente' (id=3) no existe en la base de datos")
+                logger.warning("Grupo 'cliente' (id=3) no existe en la base de datos")
                 cliente_group = Group.objects.create(id=3, name='cliente')
                 user.groups.add(cliente_group)
                 user.save()
                 group_id = cliente_group.id
                 group_name = cliente_group.name
-                print(f"✅ Grupo 'cliente' creado y usuario {user.username} agregado")
+                logger.info("Grupo 'cliente' creado y usuario agregado", extra={"usuario": user.username})
             except Exception as group_error:
-                print(f"❌ ERROR al agregar usuario al grupo: {str(group_error)}")
+                logger.exception("Error al agregar usuario al grupo")
             
             return Response({
                 'success': True,
@@ -246,7 +249,7 @@ def register_view(request):
             }, status=status.HTTP_201_CREATED)
             
         except Exception as e:
-            print(f"❌ ERROR al crear el usuario: {str(e)}")
+            logger.exception("Error al crear el usuario")
             return Response({
                 'success': False,
                 'message': 'Error al crear el usuario',
@@ -0,0 +1,44 @@
+"""
+URLs públicas de archivos subidos construidas como texto, sin pasar por el storage
+"""
+from functools import lru_cache, partial
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.encoding import filepath_to_uri
+
+
+@lru_cache(maxsize=None)
+def _prefijo():
+    """
+    (prefijo, codificación de la ruta). MEDIA_URL ya apunta al mismo sitio que el
+    storage (bucket + AWS_LOCATION, o /media/ en disco) y con AWS_QUERYSTRING_AUTH
+    = False las URLs no llevan firma: basta con concatenar. Con URLs firmadas
+    devuelve (None, None) y se usa el storage.
+    """
+    if hasattr(default_storage, 'bucket_name'):
+        if default_storage.querystring_auth:
+            return None, None
+        if not default_storage.custom_domain:
+            # Sin dominio propio (MinIO) la URL la arma boto, que codifica más caracteres
+            return settings.MEDIA_URL, partial(quote, safe='/~')
+    return settings.MEDIA_URL, filepath_to_uri
+
+
+@receiver(setting_changed)
+def _reiniciar_prefijo(setting, **kwargs):
+    if setting in ('MEDIA_URL', 'STORAGES') or setting.startswith('AWS_'):
+        _prefijo.cache_clear()
+
+
+def url_archivo(nombre):
+    """Mismo resultado que storage.url(nombre) (None si no hay archivo)"""
+    if not nombre:
+        return None
+    prefijo, codificar = _prefijo()
+    if prefijo is None:
+        return default_storage.url(nombre)
+    return prefijo + codificar(nombre)
@@ -0,0 +1,107 @@
+"""
+Logging estructurado: id de petición, formato JSON y muestreo de mensajes DEBUG
+"""
+import contextvars
+import json
+import logging
+import random
+import threading
+import time
+import uuid
+
+id_peticion = contextvars.ContextVar('id_peticion', default='-')
+
+# Atributos estándar de LogRecord; el resto viene de `extra=` y se añade al JSON
+_ATRIBUTOS_RECORD = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+
+class RequestIDMiddleware:
+    """
+    Asigna un id a cada petición (o reutiliza la cabecera X-Request-ID)
+    para poder seguir todos sus mensajes de log; lo devuelve en la respuesta.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        valor = (request.headers.get('X-Request-ID') or uuid.uuid4().hex)[:64]
+        request.id_peticion = valor
+        token = id_peticion.set(valor)
+        try:
+            response = self.get_response(request)
+        finally:
+            id_peticion.reset(token)
+        if response.streaming and not response.is_async:
+            # El cuerpo se genera al iterar la respuesta, ya fuera del middleware
+            response.streaming_content = _con_id_peticion(response.streaming_content, valor)
+        response['X-Request-ID'] = valor
+        return response
+
+
+def _con_id_peticion(contenido, valor):
+    """Iterar `contenido` con el id de la petición activo hasta que termina o se cierra"""
+    token = id_peticion.set(valor)
+    try:
+        yield from contenido
+    finally:
+        id_peticion.reset(token)
+
+
+class RequestIDFilter(logging.Filter):
+    """Añade `request_id` a cada registro"""
+
+    def filter(self, record):
+        # django.request registra después de salir del middleware, pero adjunta la petición
+        request = getattr(record, 'request', None)
+        record.request_id = getattr(request, 'id_peticion', None) or id_peticion.get()
+        return True
+
+
+class MuestreoFilter(logging.Filter):
+    """
+    Deja pasar todos los mensajes INFO o superiores. Los DEBUG se muestrean
+    (`tasa` entre 0 y 1) y se limitan a `max_por_segundo` por logger, para que
+    activar DEBUG en producción no sature la salida.
+    """
+
+    def __init__(self, tasa=1.0, max_por_segundo=20):
+        super().__init__()
+        self.tasa = float(tasa)
+        self.max_por_segundo = int(max_por_segundo)
+        self._ventanas = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        if self.tasa < 1 and random.random() >= self.tasa:
+            return False
+        segundo = int(time.monotonic())
+        with self._lock:
+            inicio, total = self._ventanas.get(record.name, (segundo, 0))
+            if inicio != segundo:
+                inicio, total = segundo, 0
+            if total >= self.max_por_segundo:
+                return False
+            self._ventanas[record.name] = (inicio, total + 1)
+        return True
+
+
+class FormatoJSON(logging.Formatter):
+    """Una línea JSON por registro, con los campos pasados en `extra=`"""
+
+    def format(self, record):
+        datos = {
+            'fecha': self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'mensaje': record.getMessage(),
+        }
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_RECORD:
+                datos[clave] = valor
+        if record.exc_info:
+            datos['excepcion'] = self.formatException(record.exc_info)
+        return json.dumps(datos, ensure_ascii=False, default=str)
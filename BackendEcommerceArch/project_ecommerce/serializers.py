@@ -0,0 +1,132 @@
+"""
+Selección de campos por petición (?fields= y ?expand=) y formato de valores
+para los serializers rápidos (dicts construidos a mano)
+"""
+from rest_framework import serializers
+
+# Mismo formato que los campos de DRF (respetan REST_FRAMEWORK y la zona horaria activa)
+formato_decimal = serializers.DecimalField(max_digits=10, decimal_places=2).to_representation
+formato_fecha_hora = serializers.DateTimeField().to_representation
+formato_fecha = serializers.DateField().to_representation
+
+
+def _arbol(valor):
+    """'id,variantes.color,variantes.imagenes' -> {'id': {}, 'variantes': {'color': {}, 'imagenes': {}}}"""
+    arbol = {}
+    for ruta in filter(None, (parte.strip() for parte in valor.split(','))):
+        nodo = arbol
+        for nombre in filter(None, ruta.split('.')):
+            nodo = nodo.setdefault(nombre, {})
+    return arbol
+
+
+class Seleccion:
+    """
+    Campos pedidos por el cliente en un nivel del árbol de serializers.
+
+    - `campos`: None = todos; si no, dict {campo: subcampos} (?fields=).
+    - `expandir`: None = todos los campos expandibles; si no, solo los del dict (?expand=).
+    """
+
+    def __init__(self, campos=None, expandir=None):
+        self.campos = campos
+        self.expandir = expandir
+
+    @classmethod
+    def desde_request(cls, request):
+        if request is None:
+            return cls()
+        params = request.query_params
+        return cls(
+            _arbol(params['fields']) if 'fields' in params else None,
+            _arbol(params['expand']) if 'expand' in params else None,
+        )
+
+    @property
+    def completa(self):
+        """Sin ?fields= ni ?expand=: se puede usar el serializer rápido"""
+        return self.campos is None and self.expandir is None
+
+    def incluye(self, nombre, expandible=False):
+        """Indica si el campo sale en la respuesta (y por tanto si hay que cargar sus datos)"""
+        if expandible and self.expandir is not None and nombre in self.expandir:
+            return True
+        if self.campos is not None:
+            return nombre in self.campos
+        if expandible and self.expandir is not None:
+            return False
+        return True
+
+    def hijo(self, nombre):
+        """Selección para el serializer anidado en `nombre` ('variantes.color' -> 'color')"""
+        campos = self.campos.get(nombre) if self.campos is not None else None
+        expandir = self.expandir.get(nombre, {}) if self.expandir is not None else None
+        return Seleccion(campos or None, expandir)
+
+    def podar(self, dato, expandibles=()):
+        """Aplicar la selección a datos ya construidos (dicts/listas, p. ej. columnas JSON)"""
+        if isinstance(dato, list):
+            return [self.podar(elemento, expandibles) for elemento in dato]
+        if not isinstance(dato, dict):
+            return dato
+        return {
+            clave: self.hijo(clave).podar(valor)
+            for clave, valor in dato.items()
+            if self.incluye(clave, clave in expandibles)
+        }
+
+
+class CamposDinamicosMixin:
+    """
+    Mixin para ModelSerializer de lectura:
+
+    - ?fields=id,nombre,variantes.color   solo esos campos (el punto baja a los anidados)
+    - ?expand=imagenes,producto_info      de los campos en `Meta.expandibles`, solo esos
+
+    Los campos no pedidos no se construyen, así que sus SerializerMethodField
+    (y sus consultas) no se ejecutan. Con datos de entrada (escritura) no se filtra nada.
+    """
+
+    def __init__(self, *args, seleccion=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._seleccion = seleccion
+
+    @property
+    def seleccion(self):
+        if self._seleccion is None:
+            # Solo el serializer raíz lee la petición; anidado en un serializer
+            # sin el mixin se muestra completo
+            lista = self.parent is not None and getattr(self.parent, 'child', None) is self
+            raiz = self.parent is None or (lista and self.parent.parent is None)
+            self._seleccion = Seleccion.desde_request(self.context.get('request')) if raiz else Seleccion()
+        return self._seleccion
+
+    def get_field_names(self, declared_fields, info):
+        nombres = super().get_field_names(declared_fields, info)
+        if hasattr(self, 'initial_data'):
+            return nombres
+        expandibles = getattr(self.Meta, 'expandibles', ())
+        return [nombre for nombre in nombres if self.seleccion.incluye(nombre, nombre in expandibles)]
+
+    def get_fields(self):
+        campos = super().get_fields()
+        # Los serializers anidados con este mixin reciben su parte de la selección
+        for nombre, campo in campos.items():
+            anidado = getattr(campo, 'child', campo)
+            if isinstance(anidado, CamposDinamicosMixin):
+                anidado._seleccion = self.seleccion.hijo(nombre)
+        return campos
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if hasattr(self, 'initial_data'):
+            return data
+        # Subcampos de anidados que no usan el mixin (serializers simples, métodos, JSON)
+        anidados = getattr(self.Meta, 'expandibles_anidados', {})
+        for nombre, campo in self.fields.items():
+            anidado = getattr(campo, 'child', campo)
+            if nombre in data and not isinstance(anidado, CamposDinamicosMixin):
+                hijo = self.seleccion.hijo(nombre)
+                if hijo.campos is not None or (hijo.expandir is not None and nombre in anidados):
+                    data[nombre] = hijo.podar(data[nombre], anidados.get(nombre, ()))
+        return data
@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'corsheaders',
@@ -58,7 +59,25 @@ REST_FRAMEWORK = {
     ]
 }
 
+# Paginación por cursor de los listados del catálogo (?page_size= para cambiarla)
+CATALOGO_PAGE_SIZE = 24
+CATALOGO_MAX_PAGE_SIZE = 100
+
+# Caché de respuestas del catálogo público. LocMemCache es por proceso: con
+# varios workers usar FileBasedCache (CACHE_BACKEND / CACHE_LOCATION) para que
+# todos compartan la versión del catálogo.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='ecommerce-catalogo'),
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+}
+CATALOGO_CACHE_TIMEOUT = config('CATALOGO_CACHE_TIMEOUT', default=300, cast=int)
+
 MIDDLEWARE = [
+    'project_ecommerce.registro.RequestIDMiddleware',  # Id de petición para los logs
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # ⬅️ Debe ir ANTES de CommonMiddleware
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -167,6 +186,44 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# ============================================================
+# LOGGING
+# ============================================================
+# Salida JSON (una línea por registro) con id de petición. Niveles por módulo
+# desde .env; los mensajes DEBUG se muestrean y limitan por segundo.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_id': {'()': 'project_ecommerce.registro.RequestIDFilter'},
+        'muestreo': {
+            '()': 'project_ecommerce.registro.MuestreoFilter',
+            'tasa': config('LOG_DEBUG_MUESTREO', default=1.0, cast=float),
+            'max_por_segundo': config('LOG_DEBUG_MAX_POR_SEGUNDO', default=20, cast=int),
+        },
+    },
+    'formatters': {
+        'json': {'()': 'project_ecommerce.registro.FormatoJSON'},
+    },
+    'handlers': {
+        'consola': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'json',
+            'filters': ['request_id', 'muestreo'],
+        },
+    },
+    'root': {
+        'handlers': ['consola'],
+        'level': config('LOG_LEVEL', default='INFO'),
+    },
+    'loggers': {
+        'django': {'handlers': ['consola'], 'level': 'INFO', 'propagate': False},
+        'django.db.backends': {'level': config('LOG_LEVEL_DB', default='WARNING')},
+        'app_productos': {'level': config('LOG_LEVEL_PRODUCTOS', default='INFO')},
+        'app_user': {'level': config('LOG_LEVEL_USER', default='INFO')},
+    },
+}
+
 # ============================================================
 # AWS S3 CONFIGURATION
 # ============================================================
@@ -181,7 +238,13 @@ AWS_S3_REGION_NAME = config('AWS_S3_REGION_NAME', default='us-east-1')
 # Configuración del bucket S3
 AWS_S3_FILE_OVERWRITE = False  # No sobrescribir archivos con el mismo nombre
 AWS_DEFAULT_ACL = None  # No establecer ACL por defecto (usar permisos del bucket)
-AWS_S3_CUSTOM_DOMAIN = f'{AWS_STORAGE_BUCKET_NAME}.s3.amazonaws.com'
+# Servicio compatible con S3 en lugar de AWS (MinIO en desarrollo: `docker compose up minio`)
+AWS_S3_ENDPOINT_URL = config('AWS_S3_ENDPOINT_URL', default='') or None
+if AWS_S3_ENDPOINT_URL:
+    AWS_S3_ADDRESSING_STYLE = 'path'  # http://endpoint/bucket/clave
+    AWS_S3_CUSTOM_DOMAIN = None
+else:
+    AWS_S3_CUSTOM_DOMAIN = f'{AWS_STORAGE_BUCKET_NAME}.s3.amazonaws.com'
 AWS_S3_OBJECT_PARAMETERS = {
     'CacheControl': 'max-age=86400',  # Cache de 24 horas
 }
@@ -192,7 +255,10 @@ AWS_QUERYSTRING_AUTH = False  # URLs públicas sin parámetros de autenticación
 AWS_S3_SIGNATURE_VERSION = 's3v4'  # Versión de firma requerida
 
 # URL base para acceder a archivos multimedia
-MEDIA_URL = f'https://{AWS_S3_CUSTOM_DOMAIN}/{AWS_LOCATION}/'
+if AWS_S3_ENDPOINT_URL:
+    MEDIA_URL = f"{AWS_S3_ENDPOINT_URL.rstrip('/')}/{AWS_STORAGE_BUCKET_NAME}/{AWS_LOCATION}/"
+else:
+    MEDIA_URL = f'https://{AWS_S3_CUSTOM_DOMAIN}/{AWS_LOCATION}/'
 
 # ============================================================
 # STORAGES CONFIGURATION (Django 4.2+)
@@ -207,3 +273,18 @@ STORAGES = {
     },
 }
 
+
+# Versiones redimensionadas de las imágenes (app_productos/imagenes.py): se generan
+# en un pool de hilos después de subir la imagen, sin demorar la respuesta
+IMAGENES_WORKERS = config('IMAGENES_WORKERS', default=2, cast=int)
+IMAGENES_VERSIONES_SINCRONAS = config('IMAGENES_VERSIONES_SINCRONAS', default=False, cast=bool)
+
+# Subida directa al bucket con POST firmado (app_productos/subidas.py)
+IMAGENES_TAMANO_MAXIMO = config('IMAGENES_TAMANO_MAXIMO', default=10 * 1024 * 1024, cast=int)  # bytes
+IMAGENES_SUBIDA_EXPIRA = config('IMAGENES_SUBIDA_EXPIRA', default=900, cast=int)  # segundos
+
+# Subida de imágenes en lote (/api/productos/upload-imagen/lote/): archivos por petición
+# y subidas simultáneas al storage. Django rechaza por defecto más de 100 archivos.
+IMAGENES_MAX_LOTE = config('IMAGENES_MAX_LOTE', default=200, cast=int)
+IMAGENES_SUBIDA_HILOS = config('IMAGENES_SUBIDA_HILOS', default=8, cast=int)
+DATA_UPLOAD_MAX_NUMBER_FILES = IMAGENES_MAX_LOTE
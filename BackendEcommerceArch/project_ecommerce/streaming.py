@@ -0,0 +1,115 @@
+"""
+Listados JSON en streaming (?stream=true) y exportaciones CSV / JSONL para tablas grandes
+"""
+import csv
+import io
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+
+TAMANO_LOTE = 500
+TAMANO_LOTE_EXPORTACION = 2000
+FORMATOS_EXPORTACION = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def _json(valor):
+    # Mismo formato que JSONRenderer de DRF (compacto, UTF-8 sin escapar)
+    return json.dumps(valor, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def pide_streaming(request):
+    return request.query_params.get('stream') == 'true'
+
+
+def respuesta_streaming(queryset, serializer, clave, tamano_lote=TAMANO_LOTE):
+    """
+    Responder {"success": true, "count": N, clave: [...]} sin construir la lista en memoria.
+
+    Las filas se leen con `.iterator(chunk_size=tamano_lote)` (cursor del servidor
+    en PostgreSQL) y se serializan de una en una con la misma instancia de
+    `serializer` (sus campos se construyen una sola vez); cada lote se envía
+    en cuanto está listo, así la memoria no crece con el número de filas.
+    """
+    total = queryset.count()
+
+    def generar():
+        yield f'{{"success":true,"count":{total},{_json(clave)}:['
+        partes = []
+        for indice, obj in enumerate(queryset.iterator(chunk_size=tamano_lote)):
+            partes.append(('' if indice == 0 else ',') + _json(serializer.to_representation(obj)))
+            if len(partes) >= tamano_lote:
+                yield ''.join(partes)
+                partes = []
+        partes.append(']}')
+        yield ''.join(partes)
+
+    return StreamingHttpResponse(generar(), content_type='application/json')
+
+
+def _lotes_csv(filas, encabezados, tamano_lote):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(encabezados)
+    for indice, fila in enumerate(filas, start=1):
+        escritor.writerow(fila)
+        if indice % tamano_lote == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _lotes_jsonl(filas, encabezados, tamano_lote):
+    partes = []
+    for fila in filas:
+        partes.append(json.dumps(dict(zip(encabezados, fila)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+        if len(partes) >= tamano_lote:
+            yield ''.join(partes)
+            partes = []
+    yield ''.join(partes)
+
+
+def _gzip(lotes):
+    # Cada lote se vacía del compresor (Z_SYNC_FLUSH) para que la descarga avance lote a lote
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for lote in lotes:
+        yield compresor.compress(lote) + compresor.flush(zlib.Z_SYNC_FLUSH)
+    yield compresor.flush()
+
+
+def respuesta_exportacion(request, queryset, columnas, nombre, tamano_lote=TAMANO_LOTE_EXPORTACION):
+    """
+    Descarga en CSV (por defecto) o JSONL (?formato=jsonl), opcionalmente
+    comprimida (?gzip=true).
+
+    `columnas` es un dict {encabezado: lookup del ORM} ('producto__nombre' vale).
+    Las filas se leen con `values_list(...).iterator()` (cursor del servidor en
+    PostgreSQL, sin construir modelos) y se envían por lotes: la descarga empieza
+    con el primer lote y la memoria no crece con el número de filas.
+    """
+    formato = request.query_params.get('formato', 'csv')
+    if formato not in FORMATOS_EXPORTACION:
+        raise ValidationError({'formato': f'Formatos permitidos: {", ".join(FORMATOS_EXPORTACION)}'})
+    comprimir = request.query_params.get('gzip') == 'true'
+
+    encabezados = list(columnas)
+    filas = queryset.values_list(*columnas.values()).iterator(chunk_size=tamano_lote)
+    generador = _lotes_csv if formato == 'csv' else _lotes_jsonl
+    lotes = (lote.encode('utf-8') for lote in generador(filas, encabezados, tamano_lote) if lote)
+
+    archivo = f'{nombre}-{timezone.localdate():%Y%m%d}.{formato}'
+    if comprimir:
+        response = StreamingHttpResponse(_gzip(lotes), content_type='application/gzip')
+        archivo += '.gz'
+    else:
+        response = StreamingHttpResponse(lotes, content_type=FORMATOS_EXPORTACION[formato])
+    response['Content-Disposition'] = f'attachment; filename="{archivo}"'
+    return response
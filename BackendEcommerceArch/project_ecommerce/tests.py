@@ -0,0 +1,108 @@
+import json
+import logging
+import sys
+from datetime import date
+from unittest import mock
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from .registro import FormatoJSON, MuestreoFilter, RequestIDFilter, RequestIDMiddleware, id_peticion
+
+
+def registro(nivel=logging.DEBUG, nombre='app', **extra):
+    record = logging.LogRecord(nombre, nivel, __file__, 1, 'Mensaje %s', ('uno',), None)
+    record.__dict__.update(extra)
+    return record
+
+
+class RequestIDMiddlewareTest(SimpleTestCase):
+    """Id de petición en los logs y en la cabecera X-Request-ID"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_reutilizar_y_devolver_cabecera(self):
+        vistos = []
+        middleware = RequestIDMiddleware(lambda request: vistos.append(id_peticion.get()) or HttpResponse())
+
+        respuesta = middleware(self.factory.get('/', HTTP_X_REQUEST_ID='abc123'))
+        self.assertEqual(respuesta['X-Request-ID'], 'abc123')
+        respuesta = middleware(self.factory.get('/', HTTP_X_REQUEST_ID='x' * 100))
+        self.assertEqual(respuesta['X-Request-ID'], 'x' * 64)
+        respuesta = middleware(self.factory.get('/'))
+        self.assertRegex(respuesta['X-Request-ID'], r'^[0-9a-f]{32}$')
+
+        self.assertEqual(vistos, ['abc123', 'x' * 64, respuesta['X-Request-ID']])
+        self.assertEqual(id_peticion.get(), '-')
+
+    def test_id_durante_el_cuerpo_en_streaming(self):
+        def cuerpo():
+            yield id_peticion.get()
+            yield ',' + id_peticion.get()
+
+        middleware = RequestIDMiddleware(lambda request: StreamingHttpResponse(cuerpo()))
+        respuesta = middleware(self.factory.get('/', HTTP_X_REQUEST_ID='abc123'))
+        self.assertEqual(id_peticion.get(), '-')
+        self.assertEqual(b''.join(respuesta.streaming_content), b'abc123,abc123')
+        self.assertEqual(id_peticion.get(), '-')
+
+    def test_filtro_usa_la_peticion_del_registro(self):
+        request = self.factory.get('/')
+        request.id_peticion = 'abc123'
+        record = registro(request=request)
+        RequestIDFilter().filter(record)
+        self.assertEqual(record.request_id, 'abc123')
+
+        record = registro()
+        RequestIDFilter().filter(record)
+        self.assertEqual(record.request_id, '-')
+
+
+class MuestreoFilterTest(SimpleTestCase):
+    """Los DEBUG se muestrean y limitan por segundo y por logger; INFO pasa siempre"""
+
+    def pasan(self, filtro, cantidad, **datos):
+        return sum(filtro.filter(registro(**datos)) for _ in range(cantidad))
+
+    @mock.patch('project_ecommerce.registro.time.monotonic')
+    def test_limite_por_segundo(self, monotonic):
+        filtro = MuestreoFilter(max_por_segundo=3)
+        monotonic.return_value = 100.2
+        self.assertEqual(self.pasan(filtro, 10), 3)
+        self.assertEqual(self.pasan(filtro, 10, nombre='otro'), 3)
+        self.assertEqual(self.pasan(filtro, 10, nivel=logging.INFO), 10)
+        monotonic.return_value = 101.0
+        self.assertEqual(self.pasan(filtro, 10), 3)
+
+    def test_tasa(self):
+        self.assertEqual(self.pasan(MuestreoFilter(tasa=0, max_por_segundo=100), 10), 0)
+        self.assertEqual(self.pasan(MuestreoFilter(tasa=0), 10, nivel=logging.WARNING), 10)
+        with mock.patch('project_ecommerce.registro.random.random', side_effect=[0.1, 0.9] * 5):
+            self.assertEqual(self.pasan(MuestreoFilter(tasa=0.5, max_por_segundo=100), 10), 5)
+
+
+class FormatoJSONTest(SimpleTestCase):
+    """Una línea JSON con los campos estándar y los de `extra=`"""
+
+    def test_campos_extra(self):
+        datos = json.loads(FormatoJSON().format(registro(
+            nivel=logging.INFO, request_id='abc123', imagen=7, fecha_pedido=date(2026, 1, 31), texto='Año'
+        )))
+        self.assertEqual(
+            {clave: datos[clave] for clave in ['nivel', 'logger', 'request_id', 'mensaje']},
+            {'nivel': 'INFO', 'logger': 'app', 'request_id': 'abc123', 'mensaje': 'Mensaje uno'}
+        )
+        self.assertEqual((datos['imagen'], datos['fecha_pedido'], datos['texto']), (7, '2026-01-31', 'Año'))
+        for clave in ['msg', 'args', 'levelno', 'pathname', 'lineno', 'message']:
+            self.assertNotIn(clave, datos)
+
+    def test_excepcion(self):
+        try:
+            raise ValueError('fallo')
+        except ValueError:
+            record = registro(nivel=logging.ERROR)
+            record.exc_info = sys.exc_info()
+        datos = json.loads(FormatoJSON().format(record))
+        self.assertEqual(datos['request_id'], '-')
+        self.assertIn('ValueError: fallo', datos['excepcion'])
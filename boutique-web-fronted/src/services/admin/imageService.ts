@@ -3,6 +3,8 @@
  * Conectado con Backend Django y S3
  */
 
+import { fetchAllPages } from '../pagination';
+
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 
 export interface ProductImage {
@@ -33,21 +35,14 @@ const getAuthToken = (): string | null => {
  */
 export const getAllImages = async (): Promise<ProductImage[]> => {
   try {
-    const response = await fetch(`${API_URL}/api/productos/imagenes/`, {
-      method: 'GET',
+    // La API pagina por cursor: { count: X, next, results: [...] }
+    const imagenes = await fetchAllPages<ProductImage>(`${API_URL}/api/productos/imagenes/`, 'results', {
       headers: {
         'Content-Type': 'application/json',
       },
     });
-
-    if (!response.ok) {
-      throw new Error('Error al obtener imágenes');
-    }
-
-    const data = await response.json();
-    console.log('🖼️ Imágenes obtenidas:', data);
-    
-    return data.results || data;
+    console.log('🖼️ Imágenes obtenidas:', imagenes.length);
+    return imagenes;
   } catch (error) {
     console.error('❌ Error al obtener imágenes:', error);
     throw error;
@@ -59,19 +54,11 @@ export const getAllImages = async (): Promise<ProductImage[]> => {
  */
 export const getImagesByVariant = async (variantId: number): Promise<ProductImage[]> => {
   try {
-    const response = await fetch(`${API_URL}/api/productos/imagenes/?producto_categoria=${variantId}`, {
-      method: 'GET',
+    return await fetchAllPages<ProductImage>(`${API_URL}/api/productos/imagenes/?producto_categoria=${variantId}`, 'results', {
       headers: {
         'Content-Type': 'application/json',
       },
     });
-
-    if (!response.ok) {
-      throw new Error('Error al obtener imágenes de la variante');
-    }
-
-    const data = await response.json();
-    return data.results || data;
   } catch (error) {
     console.error('❌ Error al obtener imágenes de la variante:', error);
     throw error;
@@ -3,6 +3,8 @@
  * Conectado con Backend Django - Solo productos base (no variantes)
  */
 
+import { fetchAllPages } from '../pagination';
+
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 
 export interface AdminProduct {
@@ -34,22 +36,14 @@ const getAuthToken = (): string | null => {
  */
 export const getAllProducts = async (): Promise<AdminProduct[]> => {
   try {
-    const response = await fetch(`${API_URL}/api/productos/productos/`, {
-      method: 'GET',
+    // La API pagina por cursor: { success: true, count: X, next, productos: [...] }
+    const productos = await fetchAllPages<AdminProduct>(`${API_URL}/api/productos/productos/`, 'productos', {
       headers: {
         'Content-Type': 'application/json',
       },
     });
-
-    if (!response.ok) {
-      throw new Error('Error al obtener productos');
-    }
-
-    const data = await response.json();
-    console.log('📦 Productos obtenidos:', data);
-    
-    // La API retorna { success: true, count: X, productos: [...] }
-    return data.productos || data.results || [];
+    console.log('📦 Productos obtenidos:', productos.length);
+    return productos;
   } catch (error) {
     console.error('❌ Error al obtener productos:', error);
     throw error;
@@ -3,6 +3,8 @@
  * Conectado con Backend Django
  */
 
+import { fetchAllPages } from '../pagination';
+
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 
 export interface ProductVariant {
@@ -57,22 +59,14 @@ const getAuthToken = (): string | null => {
  */
 export const getAllVariants = async (): Promise<ProductVariant[]> => {
   try {
-    const response = await fetch(`${API_URL}/api/productos/variantes/`, {
-      method: 'GET',
+    // La API pagina por cursor: { count: X, next, results: [...] }
+    const variantes = await fetchAllPages<ProductVariant>(`${API_URL}/api/productos/variantes/`, 'results', {
       headers: {
         'Content-Type': 'application/json',
       },
     });
-
-    if (!response.ok) {
-      throw new Error('Error al obtener variantes');
-    }
-
-    const data = await response.json();
-    console.log('🎨 Variantes obtenidas:', data);
-    
-    // La API puede retornar { count: X, results: [...] } o directamente el array
-    return data.results || data;
+    console.log('🎨 Variantes obtenidas:', variantes.length);
+    return variantes;
   } catch (error) {
     console.error('❌ Error al obtener variantes:', error);
     throw error;
@@ -84,19 +78,11 @@ export const getAllVariants = async (): Promise<ProductVariant[]> => {
  */
 export const getVariantsByProduct = async (productId: number): Promise<ProductVariant[]> => {
   try {
-    const response = await fetch(`${API_URL}/api/productos/variantes/?producto=${productId}`, {
-      method: 'GET',
+    return await fetchAllPages<ProductVariant>(`${API_URL}/api/productos/variantes/?producto=${productId}`, 'results', {
       headers: {
         'Content-Type': 'application/json',
       },
     });
-
-    if (!response.ok) {
-      throw new Error('Error al obtener variantes del producto');
-    }
-
-    const data = await response.json();
-    return data.results || data;
   } catch (error) {
     console.error('❌ Error al obtener variantes del producto:', error);
     throw error;
@@ -3,6 +3,8 @@
  * Usa directamente el endpoint /api/productos/imagenes/
  */
 
+import { fetchAllPages } from './pagination';
+
 const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 
 export interface ImageInfo {
@@ -16,6 +18,7 @@ export interface ImageInfo {
 
 export interface ImageResponse {
   count?: number;
+  next?: string | null;
   results?: ImageInfo[];
 }
 
@@ -45,22 +48,8 @@ class ImageService {
       
       console.log('🖼️ ImageService: Fetching images from:', url);
       
-      const response = await fetch(url);
-      
-      if (!response.ok) {
-        throw new Error(`HTTP error! status: ${response.status}`);
-      }
-      
-      const data: ImageResponse | ImageInfo[] = await response.json();
-      
-      // El endpoint puede devolver { results: [...] } o directamente [...]
-      let images: ImageInfo[] = [];
-      
-      if (Array.isArray(data)) {
-        images = data;
-      } else if (data.results) {
-        images = data.results;
-      }
+      // El endpoint pagina por cursor ({ results: [...], next }): se leen todas las páginas
+      const images = await fetchAllPages<ImageInfo>(url);
       
       console.log('✅ ImageService: Images loaded successfully:', images);
       
@@ -0,0 +1,38 @@
+/**
+ * Listados paginados por cursor del backend
+ * ({ success, count, next, previous, <clave>: [...] })
+ */
+
+// Máximo que acepta el backend por página (CATALOGO_MAX_PAGE_SIZE)
+const PAGE_SIZE = 100;
+
+/**
+ * Recorre todas las páginas de un listado siguiendo la URL de `next`
+ * y devuelve los elementos de todas ellas
+ */
+export const fetchAllPages = async <T>(
+  url: string,
+  key: string = 'results',
+  init?: RequestInit
+): Promise<T[]> => {
+  const firstPage = new URL(url, window.location.origin);
+  firstPage.searchParams.set('page_size', String(PAGE_SIZE));
+
+  const items: T[] = [];
+  let next: string | null = firstPage.toString();
+  while (next) {
+    const response: Response = await fetch(next, init);
+    if (!response.ok) {
+      throw new Error(`Error ${response.status}: ${response.statusText}`);
+    }
+
+    const data = await response.json();
+    if (Array.isArray(data)) {
+      // Endpoint sin paginar
+      return data;
+    }
+    items.push(...(data[key] || []));
+    next = data.next || null;
+  }
+  return items;
+};
@@ -1,5 +1,7 @@
 // Service para productos - Conectado al backend Django
 
+import { fetchAllPages } from './pagination';
+
 // Interfaces para los datos que vienen del backend
 export interface BackendImage {
   id: number;
@@ -60,6 +62,8 @@ export interface BackendProduct {
 export interface BackendResponse {
   success: boolean;
   count: number;
+  next: string | null;
+  previous: string | null;
   productos: BackendProduct[];
 }
 
@@ -116,43 +120,11 @@ export const productService = {
       console.log('🔗 URL completa:', `${API_URL}/api/productos/productos`);
       console.log('📊 Filtros aplicados:', filters);
       
-      const response = await fetch(`${API_URL}/api/productos/productos`, {
+      // El backend retorna { success: true, count: X, next, productos: [...] } por páginas: se leen todas
+      const productosBackend = await fetchAllPages<BackendProduct>(`${API_URL}/api/productos/productos/`, 'productos', {
         headers: { 'Content-Type': 'application/json' },
       });
-      
-      console.log('📡 Respuesta del servidor:', {
-        RESPONSE:response,
-        status: response.status,
-        statusText: response.statusText,
-        ok: response.ok,
-        url: response.url
-      });
-      
-      if (!response.ok) {
-        console.error('❌ Error en respuesta del servidor:', {
-          status: response.status,
-          statusText: response.statusText,
-          url: response.url
-        });
-        throw new Error(`Error ${response.status}: ${response.statusText}`);
-      }
-      
-      let data;
-      try {
-        data = await response.json();
-        console.log('📦 Datos recibidos del backend:', data);
-        console.log('📋 Tipo de datos:', typeof data);
-        console.log('🔑 Propiedades disponibles:', Object.keys(data));
-      } catch (jsonError) {
-        console.error('❌ Error al parsear JSON:', jsonError);
-        const text = await response.text();
-        console.error('📄 Contenido de respuesta:', text);
-        throw new Error('Respuesta del servidor no es JSON válido');
-      }
-      
-      // El backend retorna { success: true, count: X, productos: [...] }
-      const backendData = data as BackendResponse;
-      const productosBackend = backendData.productos || [];
+      console.log('📦 Productos recibidos del backend:', productosBackend.length);
       
       // Mapear productos del backend al formato del frontend
       const products: Product[] = productosBackend.map((prod: BackendProduct) => {